@@ -44,13 +44,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'project.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
 
 ROOT_URLCONF = 'cs412.urls'
@@ -75,6 +75,11 @@ TEMPLATES = [
 WSGI_APPLICATION = 'cs412.wsgi.application'
 
 
+# Serve the home, search, detail and charts pages from their async versions
+# (project/async_views.py). Only worth it under ASGI, e.g. uvicorn workers;
+# see the Procfile
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "").lower() in ("1", "true", "yes")
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -93,12 +98,35 @@ else:
     DATABASES = {
     'default': dj_database_url.config(
         default='sqlite:///' + str(BASE_DIR / 'db.sqlite3'),
-        conn_max_age=600
+        # Async views query from a fresh thread per request, which would strand
+        # persistent connections, so they're only kept for the sync views
+        conn_max_age=0 if ASYNC_VIEWS else 600
     )
 }
     INSTALLED_APPS += ["project"]
 
 
+# How chart data is computed: 'sql' runs one aggregate query per chart, 'snapshot'
+# loads the service data into NumPy/pandas columns once per data version (per
+# process) and computes every chart and filter combination in memory
+CHART_ENGINE = os.getenv("CHART_ENGINE", "sql")
+
+# Threads (each with its own database connection) the chart dashboard computes
+# its charts on; 1 computes them one after another
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", "4"))
+
+# Keep cached charts and home page statistics in this database table (create
+# it with `manage.py createcachetable`) so every worker process, and the
+# warm_caches command, share one cache. Unset, each process has its own
+# in-memory cache, and the home page statistics aren't cached at all.
+CACHE_TABLE = os.getenv("CACHE_TABLE")
+if CACHE_TABLE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': CACHE_TABLE,
+        }
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -138,6 +166,22 @@ STATIC_URL = '/static/'
 import os
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    # plotly.js from the installed plotly package, as plotly/plotly.min.<hash>.js
+    'project.staticfiles.PlotlyFinder',
+]
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedStaticFilesStorage",
+    },
+}
+# Content-hashed files never change, so WhiteNoise can let browsers cache them forever
+WHITENOISE_IMMUTABLE_FILE_TEST = r'\.[0-9a-f]{12}\.js$'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -8,8 +8,9 @@ from django.contrib import admin
 # Register your models here.
 
 # Register your models here.
-from .models import Student, Parent, TutoringService, AdvocacyService
+from .models import Student, Parent, Subject, TutoringService, AdvocacyService
 admin.site.register(Student)
 admin.site.register(Parent)
 admin.site.register(TutoringService)
-admin.site.register(AdvocacyService)
\ No newline at end of file
+admin.site.register(AdvocacyService)
+admin.site.register(Subject)
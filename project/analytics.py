@@ -0,0 +1,293 @@
+# File: analytics.py
+# Description: Per-process columnar snapshot of the service ledger, for computing every chart in memory
+
+import threading
+import time
+import numpy as np
+import pandas as pd
+from .caching import data_version
+from .charts import UNKNOWN, label_order, series, time_window
+from .models import Student, Parent, Subject, TutoringService, ServiceEvent
+from .subjects import SubjectLink
+
+# School level codes, in the bands ChartScope uses (grade >= 9, 4-8, < 4, no grade)
+ELEMENTARY, MIDDLE_SCHOOL, HIGH_SCHOOL, NO_LEVEL = range(4)
+LEVEL_NAMES = ['Elementary', 'Middle School', 'High School', UNKNOWN]
+
+SNAPSHOT_CHUNK_SIZE = 5000
+
+# Seconds a snapshot is used before it is rebuilt even though the data
+# version hasn't moved, so writes that skip the signals (raw SQL, queryset
+# updates) show up eventually
+SNAPSHOT_MAX_AGE = 15 * 60
+
+
+def _codes(values):
+    """(int codes, labels) for a column of strings; None gets code -1."""
+    codes, labels = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    return codes.astype(np.int64), [str(label) for label in labels]
+
+
+def _rows(queryset, *fields):
+    return list(queryset.values_list(*fields).iterator(chunk_size=SNAPSHOT_CHUNK_SIZE))
+
+
+def _lookup(sorted_ids, ids):
+    """(positions, found) of each of ids in the sorted array sorted_ids; positions only mean something where found."""
+    if not len(sorted_ids):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return positions, sorted_ids[positions] == ids
+
+
+def _labelled_totals(values, labels, present, missing=UNKNOWN):
+    """
+    {label: total} for the slots of a _by_code result where present is set.
+
+    Slot 0 (no value) is labelled `missing`; like charts._summed, it merges
+    with a real value of the same name.
+    """
+    totals = {}
+    for slot in np.flatnonzero(present):
+        label = labels[slot - 1] if slot > 0 else missing
+        totals[label] = totals.get(label, 0) + values[slot]
+    return totals
+
+
+def _by_code(codes, weights, size):
+    """Per-code (count, total) for codes in -1 .. size - 1, shifted up by one so -1 lands in slot 0."""
+    counts = np.bincount(codes + 1, minlength=size + 1)
+    totals = np.bincount(codes + 1, weights=weights, minlength=size + 1) if weights is not None else counts
+    return counts, totals
+
+
+class Snapshot:
+    """
+    Students, parents and every tutoring/advocacy session as NumPy columns.
+
+    Strings (districts, countries, subjects) are stored as integer codes into
+    label lists, hours as integer hundredths so sums are exact, dates as
+    ordinals. Built from one query per table, for one data version.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.built_at = time.monotonic()
+
+        students = _rows(Student.objects.order_by('id'),
+                         'id', 'parent_id', 'town_village', 'country_of_origin', 'current_grade')
+        parents = _rows(Parent.objects.order_by('id'), 'id', 'country_of_origin')
+        events = _rows(ServiceEvent.objects.order_by('service_type', 'service_id'),
+                       'service_type', 'service_id', 'student_id', 'date', 'hours')
+        tutoring = _rows(TutoringService.objects.order_by('id'), 'id', 'grade_at_service')
+        links = _rows(SubjectLink.objects.order_by('tutoringservice_id'), 'tutoringservice_id', 'subject_id')
+        subjects = _rows(Subject.objects.order_by('id'), 'id', 'name')
+
+        # Students
+        self.student_ids = np.array([row[0] for row in students], dtype=np.int64)
+        self.district, self.districts = _codes([row[2] for row in students])
+        grades = pd.Series([row[4] for row in students], dtype='float64')
+        self.level = np.select(
+            [grades.isna(), grades >= 9, grades >= 4], [NO_LEVEL, HIGH_SCHOOL, MIDDLE_SCHOOL], ELEMENTARY,
+        ).astype(np.int64)
+
+        # Countries share one label list between students and parents
+        country_codes, self.countries = _codes([row[3] for row in students] + [row[1] for row in parents])
+        self.student_country = country_codes[:len(students)]
+        self.parent_country = country_codes[len(students):]
+        self.parent_ids = np.array([row[0] for row in parents], dtype=np.int64)
+        self.student_parent = np.searchsorted(self.parent_ids, np.array([row[1] for row in students], dtype=np.int64))
+
+        # Sessions, each pointing at its student's row
+        self.event_student = np.searchsorted(self.student_ids, np.array([row[2] for row in events], dtype=np.int64))
+        self.event_tutoring = np.array([row[0] == ServiceEvent.TUTORING for row in events], dtype=bool)
+        self.event_day = np.array([row[3].toordinal() for row in events], dtype=np.int64)
+        self.event_hundredths = np.array([round(row[4] * 100) for row in events], dtype=np.int64)
+
+        # Grade at service (NaN when unknown) of the tutoring sessions
+        tutoring_rows = np.flatnonzero(self.event_tutoring)
+        tutoring_ids = np.array([row[1] for row in events], dtype=np.int64)[tutoring_rows]
+        positions, found = _lookup(tutoring_ids, np.array([row[0] for row in tutoring], dtype=np.int64))
+        grades = np.array([row[1] for row in tutoring], dtype=float)  # None becomes NaN
+        self.event_grade = np.full(len(events), np.nan)
+        self.event_grade[tutoring_rows[positions[found]]] = grades[found]
+
+        # Subject links, as (session row, subject code) pairs
+        self.subjects = [row[1] for row in subjects]
+        positions, found = _lookup(tutoring_ids, np.array([row[0] for row in links], dtype=np.int64))
+        self.subject_event = tutoring_rows[positions[found]]
+        subject_codes, _ = _lookup(np.array([row[0] for row in subjects], dtype=np.int64),
+                                   np.array([row[1] for row in links], dtype=np.int64))
+        self.subject = subject_codes[found]
+
+
+class SnapshotScope:
+    """Boolean masks over a snapshot's students and sessions, for one filter set: the in-memory ChartScope."""
+
+    def __init__(self, snapshot, towns, levels, time_range, today, start_date=None, end_date=None):
+        self.snapshot = snapshot
+        self.today = today
+        self.start_date, self.end_date, self.time_title = time_window(time_range, today, start_date, end_date)
+
+        students = np.ones(len(snapshot.student_ids), dtype=bool)
+        if towns:
+            wanted = [code for code, name in enumerate(snapshot.districts) if name in set(towns)]
+            students &= np.isin(snapshot.district, wanted)
+        if levels:
+            wanted = [code for code, name in enumerate(LEVEL_NAMES) if name in set(levels)]
+            students &= np.isin(snapshot.level, wanted)
+        self.students = students
+
+        self.in_range = snapshot.event_day >= self.start_date.toordinal()
+        if self.end_date is not None:
+            self.in_range &= snapshot.event_day <= self.end_date.toordinal()
+        self.events = self.in_range & students[snapshot.event_student]
+
+    def served(self):
+        served = np.zeros(len(self.students), dtype=bool)
+        served[self.snapshot.event_student[self.events]] = True
+        return served
+
+    def student_hundredths(self, events):
+        """Each student's hours (in hundredths) over the given session mask."""
+        snapshot = self.snapshot
+        return np.bincount(snapshot.event_student[events], weights=snapshot.event_hundredths[events],
+                           minlength=len(self.students))
+
+
+def _bar_or_pie(kind, title, totals, hours=False, **labels):
+    """A series from {label: total}, labels in charts.label_order; hours=True turns hundredths back into hours."""
+    names = sorted(totals, key=label_order)
+    values = [totals[name] / 100 if hours else totals[name] for name in names]
+    return series(kind, title, names, values, **labels)
+
+
+def service_by_town(scope):
+    snapshot = scope.snapshot
+    codes = snapshot.district[snapshot.event_student[scope.events]]
+    counts, hundredths = _by_code(codes, snapshot.event_hundredths[scope.events], len(snapshot.districts))
+    totals = _labelled_totals(hundredths, snapshot.districts, counts > 0)
+    return _bar_or_pie('bar', 'Service Hours by School District' + scope.time_title, totals, hours=True,
+                       x_label='District', y_label='Service Hours')
+
+
+def service_by_level(scope):
+    snapshot = scope.snapshot
+    hundredths = scope.student_hundredths(scope.in_range)[scope.students]
+    levels = snapshot.level[scope.students]
+    counts = np.bincount(levels, minlength=len(LEVEL_NAMES))
+    totals = np.bincount(levels, weights=hundredths, minlength=len(LEVEL_NAMES))
+    by_level = {LEVEL_NAMES[level]: totals[level] for level in np.flatnonzero(counts)}
+    return _bar_or_pie('pie', 'Service Hours by School Level' + scope.time_title, by_level, hours=True)
+
+
+def clients_by_country(scope):
+    snapshot = scope.snapshot
+    counts, _ = _by_code(snapshot.student_country[scope.served()], None, len(snapshot.countries))
+    totals = _labelled_totals(counts, snapshot.countries, counts > 0)
+    return _bar_or_pie('pie', 'Clients by Country of Origin' + scope.time_title, totals)
+
+
+def parents_by_country(scope):
+    snapshot = scope.snapshot
+    parents = np.unique(snapshot.student_parent[scope.served()])
+    counts, _ = _by_code(snapshot.parent_country[parents], None, len(snapshot.countries))
+    totals = _labelled_totals(counts, snapshot.countries, counts > 0)
+    return _bar_or_pie('pie', 'Parents by Country of Origin' + scope.time_title, totals)
+
+
+def sessions_by_subject(scope):
+    snapshot = scope.snapshot
+    counts = np.bincount(snapshot.subject[scope.events[snapshot.subject_event]], minlength=len(snapshot.subjects))
+    # Most sessions first, then by name, as in charts.sessions_by_subject
+    order = sorted(np.flatnonzero(counts), key=lambda code: (-counts[code], snapshot.subjects[code]))
+    return series(
+        'bar', 'Number of Tutoring Sessions by Subject' + scope.time_title,
+        [snapshot.subjects[code] for code in order], [counts[code] for code in order],
+        x_label='Subject', y_label='Number of Tutoring Sessions',
+    )
+
+
+def _sessions_by_district(scope, tutoring, title, y_label):
+    snapshot = scope.snapshot
+    events = scope.events & (snapshot.event_tutoring == tutoring)
+    # Every filtered student's district is listed, with 0 where nobody had a session
+    present, _ = _by_code(snapshot.district[scope.students], None, len(snapshot.districts))
+    sessions, _ = _by_code(snapshot.district[snapshot.event_student[events]], None, len(snapshot.districts))
+    totals = _labelled_totals(sessions, snapshot.districts, present > 0)
+    return _bar_or_pie('bar', title + scope.time_title, totals, x_label='District', y_label=y_label)
+
+
+def tutoring_sessions_by_district(scope):
+    return _sessions_by_district(scope, True, 'Tutoring Sessions by School District', 'Tutoring Sessions')
+
+
+def advocacy_sessions_by_district(scope):
+    return _sessions_by_district(scope, False, 'Advocacy Sessions by School District', 'Advocacy Sessions')
+
+
+def students_by_service_interval(scope):
+    # Over every student, not just the filtered ones, like the SQL version
+    hundredths = scope.student_hundredths(scope.in_range)
+    bins = np.bincount(np.digitize(hundredths, [500, 1000, 2000]), minlength=4)
+    return series(
+        'bar', 'Number of Students by Total Hours Served' + scope.time_title,
+        ['0–5 hrs', '5–10 hrs', '10–20 hrs', '20+ hrs'], list(bins),
+        x_label='Hours Served', y_label='Number of Students',
+    )
+
+
+def tutoring_hours_by_grade(scope):
+    snapshot = scope.snapshot
+    events = scope.events & ~np.isnan(snapshot.event_grade)
+    totals = pd.Series(snapshot.event_hundredths[events]).groupby(snapshot.event_grade[events].astype(np.int64)).sum()
+    return series(
+        'bar', 'Tutoring Hours By Grade' + scope.time_title,
+        [int(grade) for grade in totals.index], list(totals.to_numpy() / 100),
+        x_label='Student Grade', y_label='Total Tutoring Hours',
+    )
+
+
+SNAPSHOT_BUILDERS = {
+    'service_by_town': service_by_town,
+    'service_by_level': service_by_level,
+    'clients_by_country': clients_by_country,
+    'parents_by_country': parents_by_country,
+    'sessions_by_subject': sessions_by_subject,
+    'tutoring_sessions_by_district': tutoring_sessions_by_district,
+    'advocacy_sessions_by_district': advocacy_sessions_by_district,
+    'students_by_service_interval': students_by_service_interval,
+    'tutoring_hours_by_grade': tutoring_hours_by_grade,
+}
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def _stale(snapshot, version):
+    return snapshot is None or snapshot.version != version or time.monotonic() - snapshot.built_at > SNAPSHOT_MAX_AGE
+
+
+def current_snapshot():
+    """
+    This process's snapshot, rebuilt the first time it's asked for after
+    the data version (shared by every process, see caching.py) changes, or
+    once it is SNAPSHOT_MAX_AGE old.
+    """
+    global _snapshot
+    version = data_version()
+    snapshot = _snapshot
+    if _stale(snapshot, version):
+        with _snapshot_lock:
+            if _stale(_snapshot, version):
+                _snapshot = Snapshot(version)
+            snapshot = _snapshot
+    return snapshot
+
+
+def snapshot_chart_data(chart_type, towns, levels, time_range, today, start_date=None, end_date=None):
+    """charts.chart_data, computed from the in-memory snapshot. Raises KeyError for an unknown chart_type."""
+    builder = SNAPSHOT_BUILDERS[chart_type]
+    payload = builder(SnapshotScope(current_snapshot(), towns, levels, time_range, today, start_date, end_date))
+    payload['chart'] = chart_type
+    return payload
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ProjectConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'project'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .search import repair_name_search
+
+        # Register the handlers that maintain the rollup tables
+        from . import signals  # noqa: F401
+
+        # Put back the SQLite name search triggers after migrations that rebuild a table
+        post_migrate.connect(repair_name_search, sender=self)
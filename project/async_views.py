@@ -0,0 +1,205 @@
+# File: async_views.py
+# Description: Async versions of the read-heavy pages, for running under ASGI (see ASYNC_VIEWS in settings.py)
+
+import asyncio
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Count, Q, Sum
+from django.http import Http404
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils.timezone import now
+from .caching import CHART_CACHE_TIMEOUT, cache_is_shared, home_cache_key
+from .charts import CHART_TYPES
+from .forms import ChartsFilterForm, ParentSearchForm, StudentSearchForm
+from .models import Student, Parent, TutoringService, AdvocacyService, DailyServiceRollup
+from .pagination import KeysetPaginator
+from .search import filter_parents, filter_students
+from .served import served_total
+from .staticfiles import plotly_js_path
+from .views import GRADE_LABELS, ParentSearchView, StudentSearchView
+
+# Every ORM call below is awaited, and everything a template shows is
+# fetched before rendering, so no query runs on the event loop. The forms
+# (facet cache) and the name search (which may probe for its index) touch
+# the database while being set up, so those are built with sync_to_async.
+#
+# Django's async ORM still runs each query on the request's one sync
+# thread, so queries gathered together are issued back to back; what the
+# event loop gains is serving other requests while a query waits.
+
+
+async def _user(request):
+    """Resolve the user once, so templates reading request.user don't query from the event loop."""
+    request.user = await request.auser()
+    return request.user
+
+
+async def _values(queryset):
+    return [row async for row in queryset]
+
+
+async def _page(request, queryset, per_page, keyset_ordering):
+    """The page_obj / paginator / is_paginated context a ListView with KeysetPaginationMixin would give."""
+    if request.GET.get('paging') == 'keyset':
+        paginator = KeysetPaginator(
+            queryset, per_page, ordering=keyset_ordering, with_estimate=bool(request.GET.get('estimate')),
+        )
+        page = await sync_to_async(paginator.page)(request.GET.get('cursor'))
+        return {'paginator': paginator, 'page_obj': page, 'is_paginated': page.has_other_pages(),
+                'keyset_paging': True}, page.object_list
+
+    paginator = Paginator(queryset, per_page)
+    paginator.count = await queryset.acount()
+    try:
+        page = paginator.page(request.GET.get('page') or 1)
+    except InvalidPage as error:
+        raise Http404(str(error))
+    page.object_list = await _values(page.object_list)
+    return {'paginator': paginator, 'page_obj': page, 'is_paginated': page.has_other_pages(),
+            'keyset_paging': False}, page.object_list
+
+
+async def _home_stats(today):
+    """views.home_stats, with its independent queries awaited together (gathered)."""
+    thirty_days_ago = today - timedelta(days=30)
+    six_months_ago = today - timedelta(days=6 * 30)  # Approx. 6 months
+    one_year_ago = today - timedelta(days=365)
+
+    (students_by_town, students_by_country, grade_counts, parents_by_town, parents_by_country,
+     served_month, served_half_year, served_year, hours) = await asyncio.gather(
+        _values(Student.objects.values("town_village").annotate(count=Count("id")).order_by("-count")),
+        _values(Student.objects.values("country_of_origin").annotate(count=Count("id")).order_by("-count")),
+        _values(Student.objects.values("current_grade").annotate(count=Count("id")).order_by("current_grade")),
+        _values(Parent.objects.values("town_village").annotate(count=Count("id")).order_by()),
+        _values(Parent.objects.values("country_of_origin").annotate(count=Count("id")).order_by("-count")),
+        sync_to_async(served_total)(thirty_days_ago),
+        sync_to_async(served_total)(six_months_ago),
+        sync_to_async(served_total)(one_year_ago),
+        DailyServiceRollup.objects.filter(date__gte=one_year_ago).aaggregate(
+            tutoring_hours=Sum("hours", filter=Q(service_type=DailyServiceRollup.TUTORING)),
+            advocacy_hours=Sum("hours", filter=Q(service_type=DailyServiceRollup.ADVOCACY)),
+        ),
+    )
+
+    stats = {
+        "students_by_town": students_by_town,
+        "students_by_country": students_by_country,
+        "students_by_grade": [
+            {
+                "grade": GRADE_LABELS.get(entry["current_grade"], str(entry["current_grade"])),
+                "count": entry["count"],
+            }
+            for entry in grade_counts
+        ],
+        "parents_by_town": parents_by_town,
+        "parents_by_country": parents_by_country,
+        "tutoring_hours": hours["tutoring_hours"] or 0,
+        "advocacy_hours": hours["advocacy_hours"] or 0,
+    }
+    for window, served in [
+        ("last_thirty_days", served_month), ("last_six_months", served_half_year), ("last_year", served_year),
+    ]:
+        stats[f"students_in_{window}"] = served["students"]
+        stats[f"families_in_{window}"] = served["families"]
+    return stats
+
+
+@login_required
+async def home(request):
+    """HomePageView, sharing its cached statistics when the cache is shared."""
+    await _user(request)
+    today = now().date()
+    if not cache_is_shared():
+        return render(request, "project/home.html", await _home_stats(today))
+    # The data version is read from the database
+    key = await sync_to_async(home_cache_key)(today)
+    stats = await cache.aget(key)
+    if stats is None:
+        stats = await _home_stats(today)
+        await cache.aset(key, stats, CHART_CACHE_TIMEOUT)
+    return render(request, "project/home.html", stats)
+
+
+@login_required
+async def student_search(request):
+    await _user(request)
+    form = await sync_to_async(StudentSearchForm)(request.GET)
+    students = await sync_to_async(filter_students)(request.GET)
+    context, students = await _page(
+        request, students, StudentSearchView.paginate_by, StudentSearchView.keyset_ordering,
+    )
+    context.update({'form': form, 'students': students, 'object_list': students})
+    return render(request, "project/student_search.html", context)
+
+
+@login_required
+async def parent_search(request):
+    await _user(request)
+    form = await sync_to_async(ParentSearchForm)(request.GET)
+    parents = await sync_to_async(filter_parents)(request.GET)
+    context, parents = await _page(
+        request, parents, ParentSearchView.paginate_by, ParentSearchView.keyset_ordering,
+    )
+    context.update({'form': form, 'parents': parents, 'object_list': parents})
+    return render(request, "project/parent_search.html", context)
+
+
+@login_required
+async def student_detail(request, pk):
+    await _user(request)
+    try:
+        student = await Student.objects.select_related('parent').aget(pk=pk)
+    except Student.DoesNotExist:
+        raise Http404("No student found matching the query")
+
+    tutoring_sessions, advocacy_sessions, tutoring, advocacy = await asyncio.gather(
+        _values(student.tutoring_sessions.all().order_by('-date_of_contact')),
+        _values(student.advocacy_sessions.all().order_by('-date_of_contact')),
+        TutoringService.objects.filter(student=student).aaggregate(total_hours=Sum('length_of_session')),
+        AdvocacyService.objects.filter(student=student).aaggregate(total_hours=Sum('length_of_contact')),
+    )
+    tutoring_hours = tutoring['total_hours'] or 0
+    advocacy_hours = advocacy['total_hours'] or 0
+    context = {
+        'student': student,
+        'object': student,
+        'tutoring_sessions': tutoring_sessions,
+        'advocacy_sessions': advocacy_sessions,
+        'tutoring_hours': tutoring_hours,
+        'advocacy_hours': advocacy_hours,
+        'total_hours': tutoring_hours + advocacy_hours,
+    }
+    return render(request, 'project/student_detail.html', context)
+
+
+@login_required
+async def parent_detail(request, pk):
+    await _user(request)
+    try:
+        parent = await Parent.objects.aget(pk=pk)
+    except Parent.DoesNotExist:
+        raise Http404("No parent found matching the query")
+    students = await _values(Student.objects.filter(parent=parent))
+    return render(request, 'project/parent_detail.html', {'parent': parent, 'object': parent, 'students': students})
+
+
+async def charts(request):
+    """charts_view; the chart itself still comes from the (sync, cached) chart data API."""
+    form = await sync_to_async(ChartsFilterForm)(request.GET or None)
+    selected_chart = request.GET.get('chart_type', 'service_by_town')
+    if selected_chart not in CHART_TYPES:
+        selected_chart = 'service_by_town'
+
+    context = {
+        'form': form,
+        'selected_chart': selected_chart,
+        'chart_types': CHART_TYPES,
+        'chart_data_url': reverse('chart_data_api', args=[selected_chart]) + '?' + request.GET.urlencode(),
+        'dashboard_url': reverse('chart_dashboard') + '?' + request.GET.urlencode(),
+        'plotly_js': plotly_js_path(),
+    }
+    return render(request, 'project/charts.html', context)
@@ -0,0 +1,140 @@
+# File: bulk_load.py
+# Description: Fast loaders for large imports: PostgreSQL COPY, with an executemany fallback for SQLite
+
+import io
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max
+from .models import Parent, Student, TutoringService, AdvocacyService
+
+# In foreign-key order
+LOAD_MODELS = [Parent, Student, TutoringService, TutoringService.subjects.through, AdvocacyService]
+
+
+def reset_sequences(cursor, tables):
+    """Point each table's id sequence (PostgreSQL) at its current MAX(id)."""
+    for table in tables:
+        cursor.execute(f"""
+            SELECT setval(
+                pg_get_serial_sequence('"{table}"', 'id'),
+                COALESCE((SELECT MAX(id) FROM "{table}"), 1),
+                true
+            );
+        """)
+
+
+def _csv_value(value):
+    """One field for COPY ... (FORMAT csv): an unquoted empty string is NULL, so everything else is quoted."""
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class BulkLoader:
+    """
+    Writes unsaved model instances without bulk_create, for a fixed set of
+    tables (by default the ones the forms import fills).
+
+    Ids are handed out here, from MAX(id) + 1 per table, so rows can point at
+    parents and students written moments earlier without reading anything
+    back. On PostgreSQL the rows are streamed with COPY ... FROM STDIN
+    through psycopg2's copy_expert, with the tables locked against other
+    writers, and the id sequences are reset at the end. Elsewhere (SQLite)
+    they go through one executemany per table.
+
+    Meant for one long transaction: the caller wraps start() .. finish() in
+    transaction.atomic(). On SQLite, start() turns off synchronous writes for
+    the duration when it is called before that transaction begins.
+    """
+
+    def __init__(self, models=LOAD_MODELS, using=DEFAULT_DB_ALIAS):
+        self.models = list(models)
+        # The real connection, not the django.db.connection proxy, which costs
+        # a thread-local lookup on every attribute access
+        self.connection = connections[using]
+        self.next_ids = {}
+        self._synchronous = None
+
+    @property
+    def uses_copy(self):
+        return self.connection.vendor == 'postgresql'
+
+    def start(self):
+        # SQLite refuses to change the setting inside a transaction, so a load
+        # that is part of a caller's transaction keeps synchronous writes
+        if not self.uses_copy and not self.connection.in_atomic_block:
+            with self.connection.cursor() as cursor:
+                cursor.execute("PRAGMA synchronous")
+                self._synchronous = cursor.fetchone()[0]
+                cursor.execute("PRAGMA synchronous=OFF")
+
+    def lock_tables(self):
+        """Inside the transaction: keep other writers from taking ids we're about to use."""
+        if self.uses_copy:
+            tables = ', '.join(f'"{model._meta.db_table}"' for model in self.models)
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {tables} IN EXCLUSIVE MODE")
+
+    def assign_ids(self, objs):
+        """Give unsaved instances of one model their primary keys."""
+        if not objs:
+            return
+        model = type(objs[0])
+        if model not in self.next_ids:
+            self.next_ids[model] = (model.objects.using(self.connection.alias).aggregate(top=Max('id'))['top'] or 0) + 1
+        for obj in objs:
+            obj.pk = self.next_ids[model]
+            self.next_ids[model] += 1
+
+    def _rows(self, model, objs):
+        fields = model._meta.concrete_fields
+        connection = self.connection
+        for obj in objs:
+            row = []
+            for field in fields:
+                value = getattr(obj, field.attname)
+                if value is None and field.is_relation and field.is_cached(obj):
+                    # Assigned while the related row was still unsaved
+                    value = field.get_cached_value(obj).pk
+                row.append(field.get_db_prep_save(value, connection))
+            yield row
+
+    def write(self, objs):
+        """Insert instances of one model, assigning ids first if they have none."""
+        if not objs:
+            return
+        model = type(objs[0])
+        if objs[0].pk is None:
+            self.assign_ids(objs)
+        table = model._meta.db_table
+        columns = [field.column for field in model._meta.concrete_fields]
+        column_list = ', '.join(f'"{column}"' for column in columns)
+
+        with self.connection.cursor() as cursor:
+            if self.uses_copy:
+                buffer = io.StringIO()
+                for row in self._rows(model, objs):
+                    buffer.write(','.join(_csv_value(value) for value in row))
+                    buffer.write('\n')
+                buffer.seek(0)
+                cursor.copy_expert(f'COPY "{table}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+            else:
+                placeholders = ', '.join(['%s'] * len(columns))
+                cursor.executemany(
+                    f'INSERT INTO "{table}" ({column_list}) VALUES ({placeholders})',
+                    list(self._rows(model, objs)),
+                )
+        for obj in objs:
+            obj._state.adding = False
+
+    def finish(self):
+        """Inside the transaction, after the last write."""
+        if self.uses_copy:
+            with self.connection.cursor() as cursor:
+                reset_sequences(cursor, [model._meta.db_table for model in self.models])
+
+    def close(self):
+        """After the transaction: undo start()."""
+        if self._synchronous is not None:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA synchronous={int(self._synchronous)}")
+            self._synchronous = None
@@ -0,0 +1,68 @@
+# File: caching.py
+# Description: Data-version counter and cache keys for the chart data and home page statistics
+
+import hashlib
+import json
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import F
+from .models import DataVersion
+
+# Seconds a rendered chart (or the home page statistics) is kept. Writes
+# bump the data version, which retires every cached chart at once in every
+# process, so this only bounds how long retired entries take up memory.
+CHART_CACHE_TIMEOUT = 60 * 60
+
+# Seconds a browser may reuse chart data for the same query string without revalidating
+CHART_BROWSER_MAX_AGE = 5 * 60
+
+# Anything other than these falls through to "all time" in charts_view
+TIME_RANGES = ('30days', '6months', '1year')
+
+
+def data_version():
+    """Current data version; changes whenever students or services are written, by any process."""
+    return DataVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 1
+
+
+def bump_data_version():
+    if not DataVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        # No row yet: any fresh value retires the old keys
+        DataVersion.objects.get_or_create(pk=1, defaults={'version': 2})
+
+
+def cache_is_shared():
+    """Whether the default cache is shared by every process (CACHE_TABLE is set), not the per-process LocMemCache."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def chart_cache_key(chart_type, towns, levels, time_range, today, start_date=None, end_date=None, version=None):
+    """
+    Cache key (and ETag) for one chart's data.
+
+    Filters are normalized (order and duplicates don't matter, unknown time
+    ranges mean all time) and the key includes today's date, because every
+    time range is relative to it. Explicit start/end dates are part of the
+    key too. Pass version to reuse a data_version() already read.
+    """
+    filters = {
+        'chart': chart_type,
+        'towns': sorted(set(towns)),
+        'levels': sorted(set(levels)),
+        'time': time_range if time_range in TIME_RANGES else 'all',
+        'from': start_date.isoformat() if start_date else None,
+        'to': end_date.isoformat() if end_date else None,
+        'day': today.isoformat(),
+    }
+    digest = hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+    return f"project:chart:v{data_version() if version is None else version}:{digest}"
+
+
+def home_cache_key(today):
+    """
+    Cache key for the home page statistics, whose windows are relative to today.
+
+    Only used when cache_is_shared(): a per-process copy would be computed
+    once per worker anyway, and nothing else would ever free it.
+    """
+    return f"project:home:v{data_version()}:{today.isoformat()}"
@@ -0,0 +1,361 @@
+# File: charts.py
+# Description: Aggregations behind the charts page, returned as compact series the browser plots with plotly.js
+
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Student, TutoringService, AdvocacyService, TUTORING, ADVOCACY
+from .cube import cube_totals, school_level
+from .served import served_counts
+from .subjects import SubjectLink
+
+# chart_type -> label, in the order they appear in the chart picker
+CHART_TYPES = {
+    'service_by_town': 'Service Hours by School District',
+    'service_by_level': 'Service Hours by School Level',
+    'clients_by_country': 'Clients by Country',
+    'parents_by_country': 'Parents by Country',
+    'sessions_by_subject': 'Tutoring Sessions by Subject',
+    'tutoring_sessions_by_district': 'Tutoring Sessions by District',
+    'advocacy_sessions_by_district': 'Advocacy Sessions by District',
+    'students_by_service_interval': 'Students By Service Hours Interval',
+    'tutoring_hours_by_grade': 'Tutoring Hours By Grade',
+}
+
+# Label of the bucket for a missing district, school level or country
+UNKNOWN = 'Unknown'
+
+
+def time_window(time_range, today, start_date=None, end_date=None):
+    """
+    (first day counted, last day counted or None, title suffix) for a chart
+    time range. An explicit start_date and/or end_date overrides time_range.
+    """
+    if start_date or end_date:
+        first = start_date or datetime(1970, 1, 1).date()
+        if start_date and end_date:
+            return first, end_date, f" - From {start_date:%m/%d/%Y} to {end_date:%m/%d/%Y}"
+        if start_date:
+            return first, None, f" - Since {start_date:%m/%d/%Y}"
+        return first, end_date, f" - Through {end_date:%m/%d/%Y}"
+    if time_range == '30days':
+        return today - timedelta(days=30), None, " - Over the Last 30 Days"
+    if time_range == '6months':
+        return today - timedelta(days=6*30), None, " - Over the Last 6 Months"
+    if time_range == '1year':
+        return today - timedelta(days=365), None, " - Over the Last 1 year"
+    return datetime(1970, 1, 1).date(), None, ""
+
+
+def in_window(queryset, date_field, start_date, end_date):
+    """queryset limited to rows with date_field between start_date and end_date (None: no end)."""
+    queryset = queryset.filter(**{f'{date_field}__gte': start_date})
+    if end_date is not None:
+        queryset = queryset.filter(**{f'{date_field}__lte': end_date})
+    return queryset
+
+
+class ChartScope:
+    """The filtered students and services every chart starts from."""
+
+    def __init__(self, towns, levels, time_range, today, start_date=None, end_date=None):
+        self.today = today
+        self.start_date, self.end_date, self.time_title = time_window(time_range, today, start_date, end_date)
+
+        # Annotate school levels dynamically
+        students = Student.objects.annotate(school_level=school_level())
+        if towns:
+            students = students.filter(town_village__in=towns)
+        if levels:
+            students = students.filter(school_level__in=levels)
+        self._select_students(students)
+
+        # The same filters as cube / served set columns, for the charts read from those tables
+        self.cube_filters = {}
+        if towns:
+            self.cube_filters['district'] = towns
+        if levels:
+            self.cube_filters['school_level'] = levels
+
+    def _select_students(self, students):
+        self.students = students
+        self.tutoring_data = in_window(TutoringService.objects.filter(student__in=students), 'date_of_contact',
+                                       self.start_date, self.end_date)
+        self.advocacy_data = in_window(AdvocacyService.objects.filter(student__in=students), 'date_of_contact',
+                                       self.start_date, self.end_date)
+
+    def resolve_students(self):
+        """
+        Run the district / school level filter once and select the students
+        by id from then on, so charts built from this scope don't each
+        repeat it. Unfiltered scopes are left as they are.
+        """
+        if self.cube_filters:
+            ids = list(self.students.values_list('id', flat=True))
+            self._select_students(Student.objects.annotate(school_level=school_level()).filter(id__in=ids))
+
+    def cube_totals(self, group_by, **filters):
+        """cube.cube_totals over this scope's dates and filters."""
+        return cube_totals(group_by, self.start_date, self.end_date, **self.cube_filters, **filters)
+
+    def served_counts(self, group_by):
+        """served.served_counts over this scope's dates and filters."""
+        return served_counts(self.start_date, self.end_date, group_by, **self.cube_filters)
+
+
+def series(kind, title, labels, values, x_label=None, y_label=None):
+    """The JSON payload for one chart: plot kind, titles and parallel label/value lists."""
+    payload = {
+        'kind': kind,
+        'title': title,
+        'labels': labels,
+        'values': [float(value or 0) for value in values],
+    }
+    if kind == 'bar':
+        payload['x_label'] = x_label
+        payload['y_label'] = y_label
+    return payload
+
+
+def label_order(label):
+    """
+    Sort key for chart categories: by name, with the Unknown bucket last.
+
+    Both chart engines sort in Python with it, so the order doesn't depend on
+    where the database puts NULLs or on its collation.
+    """
+    return (label == UNKNOWN, label)
+
+
+def _summed(rows, label_key, value_key, missing=UNKNOWN):
+    """Sum value_key per label_key (None counting as missing), as (labels, totals) in label_order."""
+    totals = defaultdict(float)
+    for row in rows:
+        totals[row[label_key] if row[label_key] is not None else missing] += float(row[value_key] or 0)
+    labels = sorted(totals, key=label_order)
+    return labels, [totals[label] for label in labels]
+
+
+def _hours_since(model, hours_field, start_date, end_date=None):
+    """One student's total hours of one service type from start_date (to end_date), as a correlated subquery (0 if none)."""
+    sessions = in_window(model.objects.filter(student=OuterRef('pk')), 'date_of_contact', start_date, end_date)
+    hours = sessions.order_by().values(
+        'student'
+    ).annotate(total=Sum(hours_field)).values('total')
+    return Coalesce(Subquery(hours), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def student_hours(students, start_date, end_date=None):
+    """
+    Annotate students with tutoring_hours, advocacy_hours and total_hours
+    from start_date (through end_date, when given).
+
+    Each service type is summed in its own subquery, so a student's sessions
+    are read once each. Joining both reverse relations in one annotation
+    would pair every tutoring session with every advocacy session and
+    count each session's hours once per row on the other side.
+    """
+    return students.annotate(
+        tutoring_hours=_hours_since(TutoringService, 'length_of_session', start_date, end_date),
+        advocacy_hours=_hours_since(AdvocacyService, 'length_of_contact', start_date, end_date),
+        total_hours=F('tutoring_hours') + F('advocacy_hours'),
+    )
+
+
+def _student_values(scope, column):
+    """Distinct values of a student column ('town_village' or 'school_level') among the filtered students."""
+    return list(scope.students.values_list(column, flat=True).distinct().order_by())
+
+
+def _cube_series_rows(values, totals, measure):
+    """[{'label': value, 'total': measure}, ...] for every value, 0 where the cube has nothing."""
+    return [{'label': value, 'total': totals.get((value,), {}).get(measure, 0)} for value in values]
+
+
+# 1. Service Hours by Town/Village (Bar Graph)
+def service_by_town(scope):
+    hours_by_town = [
+        {'town': town, 'hours': total['hours']} for (town,), total in scope.cube_totals(['district']).items()
+    ]
+    towns, hours = _summed(hours_by_town, 'town', 'hours')
+    return series(
+        'bar', 'Service Hours by School District' + scope.time_title, towns, hours,
+        x_label='District', y_label='Service Hours',
+    )
+
+
+# 2. Service Hours by School Level (Pie Chart)
+def service_by_level(scope):
+    # Every level among the filtered students is listed, even with no hours
+    level_data = _cube_series_rows(_student_values(scope, 'school_level'), scope.cube_totals(['school_level']), 'hours')
+    levels, hours = _summed(level_data, 'label', 'total')
+    return series('pie', 'Service Hours by School Level' + scope.time_title, levels, hours)
+
+
+def _served_rows(counts, measure):
+    """[{'label': value, 'total': count}, ...] from served counts grouped by one column."""
+    return [{'label': value, 'total': total[measure]} for (value,), total in counts.items()]
+
+
+# 3. Clients by Country of Origin (Pie Chart)
+def clients_by_country(scope):
+    client_data = _served_rows(scope.served_counts(['student_country']), 'students')
+    countries, counts = _summed(client_data, 'label', 'total')
+    return series('pie', 'Clients by Country of Origin' + scope.time_title, countries, counts)
+
+
+# 4. Parents by Country of Origin (Pie Chart)
+def parents_by_country(scope):
+    parent_data = _served_rows(scope.served_counts(['parent_country']), 'families')
+    countries, counts = _summed(parent_data, 'label', 'total')
+    return series('pie', 'Parents by Country of Origin' + scope.time_title, countries, counts)
+
+
+# 5. Number of tutoring sessions by SUBJECT
+def sessions_by_subject(scope):
+    subject_data = SubjectLink.objects.filter(tutoringservice__in=scope.tutoring_data).values(
+        'subject__name'
+    ).annotate(count=Count('id')).order_by()
+    # Most sessions first, then by name (sorted here, not by the database's collation)
+    subject_data = sorted(subject_data, key=lambda entry: (-entry['count'], entry['subject__name']))
+    return series(
+        'bar', 'Number of Tutoring Sessions by Subject' + scope.time_title,
+        [entry['subject__name'] for entry in subject_data], [entry['count'] for entry in subject_data],
+        x_label='Subject', y_label='Number of Tutoring Sessions',
+    )
+
+
+# 6. Number of tutoring sessions by school district
+def tutoring_sessions_by_district(scope):
+    tutoring_data = _cube_series_rows(
+        _student_values(scope, 'town_village'),
+        scope.cube_totals(['district'], service_type=[TUTORING]), 'sessions',
+    )
+    towns, counts = _summed(tutoring_data, 'label', 'total')
+    return series(
+        'bar', 'Tutoring Sessions by School District' + scope.time_title, towns, counts,
+        x_label='District', y_label='Tutoring Sessions',
+    )
+
+
+# 7. Number of advocacy sessions by school district
+def advocacy_sessions_by_district(scope):
+    advocacy_data = _cube_series_rows(
+        _student_values(scope, 'town_village'),
+        scope.cube_totals(['district'], service_type=[ADVOCACY]), 'sessions',
+    )
+    towns, counts = _summed(advocacy_data, 'label', 'total')
+    return series(
+        'bar', 'Advocacy Sessions by School District' + scope.time_title, towns, counts,
+        x_label='District', y_label='Advocacy Sessions',
+    )
+
+
+# 8. Number of students by interval of number of hours served
+def students_by_service_interval(scope):
+    students_with_hours = student_hours(Student.objects.all(), scope.start_date, scope.end_date)
+    binned_data = students_with_hours.aggregate(
+        under_5=Count('id', filter=Q(total_hours__lt=5)),
+        between_5_10=Count('id', filter=Q(total_hours__gte=5, total_hours__lt=10)),
+        between_10_20=Count('id', filter=Q(total_hours__gte=10, total_hours__lt=20)),
+        over_20=Count('id', filter=Q(total_hours__gte=20)))
+    return series(
+        'bar', 'Number of Students by Total Hours Served' + scope.time_title,
+        ['0–5 hrs', '5–10 hrs', '10–20 hrs', '20+ hrs'],
+        [binned_data['under_5'], binned_data['between_5_10'], binned_data['between_10_20'], binned_data['over_20']],
+        x_label='Hours Served', y_label='Number of Students',
+    )
+
+
+# 9. Tutoring hours by student grade (at service time)
+def tutoring_hours_by_grade(scope):
+    hours_by_grade = scope.cube_totals(['grade'], service_type=[TUTORING])
+
+    # Students without a grade have no grade at service time either; leave them off the axis
+    grades = sorted(grade for (grade,) in hours_by_grade if grade is not None)
+    return series(
+        'bar', 'Tutoring Hours By Grade' + scope.time_title,
+        grades, [hours_by_grade[(grade,)]['hours'] for grade in grades],
+        x_label='Student Grade', y_label='Total Tutoring Hours',
+    )
+
+
+CHART_BUILDERS = {
+    'service_by_town': service_by_town,
+    'service_by_level': service_by_level,
+    'clients_by_country': clients_by_country,
+    'parents_by_country': parents_by_country,
+    'sessions_by_subject': sessions_by_subject,
+    'tutoring_sessions_by_district': tutoring_sessions_by_district,
+    'advocacy_sessions_by_district': advocacy_sessions_by_district,
+    'students_by_service_interval': students_by_service_interval,
+    'tutoring_hours_by_grade': tutoring_hours_by_grade,
+}
+
+
+def chart_data(chart_type, towns, levels, time_range, today, start_date=None, end_date=None):
+    """
+    Compute the series for one chart and filter set.
+
+    With settings.CHART_ENGINE = 'snapshot' the series come from the
+    in-memory snapshot in analytics.py instead of a query per chart.
+
+    Raises KeyError for an unknown chart_type.
+    """
+    if settings.CHART_ENGINE == 'snapshot':
+        # Imported here because analytics builds on this module
+        from .analytics import snapshot_chart_data
+        return snapshot_chart_data(chart_type, towns, levels, time_range, today, start_date, end_date)
+    return _build_chart(chart_type, ChartScope(towns, levels, time_range, today, start_date, end_date))
+
+
+def _build_chart(chart_type, scope):
+    payload = CHART_BUILDERS[chart_type](scope)
+    payload['chart'] = chart_type
+    return payload
+
+
+def _build_charts_in_thread(pending, scope, payloads):
+    """
+    Build charts taken off the shared pending deque until it's empty. A pool
+    thread opens its own database connection, closed again when done.
+    """
+    try:
+        while True:
+            try:
+                chart_type = pending.popleft()
+            except IndexError:
+                return
+            payloads[chart_type] = _build_chart(chart_type, scope)
+    finally:
+        connections.close_all()
+
+
+def dashboard_data(chart_types, towns, levels, time_range, today, start_date=None, end_date=None):
+    """
+    {chart_type: series} for several charts and one filter set.
+
+    The charts share one ChartScope, whose filtered students are looked up
+    once up front, and run concurrently on up to settings.DASHBOARD_WORKERS
+    threads, each with one database connection, so while the database works
+    on one chart's query the others proceed. The snapshot engine answers
+    from memory and runs them in turn.
+    """
+    chart_types = list(chart_types)
+    if settings.CHART_ENGINE == 'snapshot' or settings.DASHBOARD_WORKERS < 2 or len(chart_types) < 2:
+        return {
+            chart_type: chart_data(chart_type, towns, levels, time_range, today, start_date, end_date)
+            for chart_type in chart_types
+        }
+    scope = ChartScope(towns, levels, time_range, today, start_date, end_date)
+    scope.resolve_students()
+    pending, payloads = deque(chart_types), {}
+    workers = min(settings.DASHBOARD_WORKERS, len(chart_types))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(_build_charts_in_thread, pending, scope, payloads) for _ in range(workers)]:
+            future.result()
+    return {chart_type: payloads[chart_type] for chart_type in chart_types}
@@ -0,0 +1,175 @@
+# File: cube.py
+# Description: Monthly rollup cube of service hours and sessions by district, school level, country and grade
+
+import operator
+from datetime import timedelta
+from functools import reduce
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from .models import MonthlyServiceRollup
+from .rollups import MONTH_LOCK, SERVICE_SOURCES, lock_periods
+
+# cube column -> the same value looked up from a TutoringService/AdvocacyService row
+DIMENSIONS = {
+    'district': 'student__town_village',
+    'school_level': 'school_level',
+    'student_country': 'student__country_of_origin',
+    'parent_country': 'student__parent__country_of_origin',
+    'grade': 'grade_at_service',
+}
+
+
+def school_level(grade_field='current_grade'):
+    """The school level a grade falls in, as a query expression (the bands the charts filter on)."""
+    return Case(
+        When(**{f'{grade_field}__gte': 9}, then=Value('High School')),
+        When(**{f'{grade_field}__lt': 9, f'{grade_field}__gte': 4}, then=Value('Middle School')),
+        When(**{f'{grade_field}__lt': 4}, then=Value('Elementary')),
+        default=Value('Unknown'),
+        output_field=CharField(),
+    )
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _sessions(service_type, since=None, until=None):
+    """Sessions of one type with date in [since, until), either end open when None, with school_level annotated."""
+    source, _ = SERVICE_SOURCES[service_type]
+    sessions = source.objects.annotate(school_level=school_level('student__current_grade'))
+    if since is not None:
+        sessions = sessions.filter(date_of_contact__gte=since)
+    if until is not None:
+        sessions = sessions.filter(date_of_contact__lt=until)
+    return sessions
+
+
+def _cells(service_type, sessions, group_by, by_month=False):
+    """Hours, sessions and distinct students of sessions, grouped by the given cube columns (and month)."""
+    _, hours_field = SERVICE_SOURCES[service_type]
+    fields = [DIMENSIONS[column] for column in group_by if column != 'service_type']
+    if by_month:
+        sessions = sessions.annotate(month=TruncMonth('date_of_contact'))
+        fields = ['month'] + fields
+    return sessions.values(*fields).annotate(
+        total_hours=Sum(hours_field), session_count=Count('id'), student_count=Count('student_id', distinct=True),
+    ).order_by()
+
+
+def _write_cells(service_type, cells, batch_size=1000):
+    rows = [
+        MonthlyServiceRollup(
+            month=cell['month'],
+            service_type=service_type,
+            hours=cell['total_hours'] or 0,
+            sessions=cell['session_count'],
+            students=cell['student_count'],
+            **{column: cell[path] for column, path in DIMENSIONS.items()},
+        )
+        for cell in cells
+    ]
+    MonthlyServiceRollup.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def refresh_monthly_rollups(months, service_types=None):
+    """
+    Recompute the cube for the months (any date in them) given, from the
+    session tables: one grouped query per service type, however many months.
+    """
+    service_types = service_types or list(SERVICE_SOURCES)
+    months = sorted({month_start(day) for day in months})
+    if not months:
+        return
+    in_months = reduce(operator.or_, [
+        Q(date_of_contact__gte=month, date_of_contact__lt=next_month(month)) for month in months
+    ])
+    with transaction.atomic(savepoint=False):
+        lock_periods(MONTH_LOCK, months)
+        for service_type in service_types:
+            MonthlyServiceRollup.objects.filter(month__in=months, service_type=service_type).delete()
+            sessions = _sessions(service_type).filter(in_months)
+            _write_cells(service_type, _cells(service_type, sessions, DIMENSIONS, by_month=True))
+
+
+def rebuild_monthly_rollups(batch_size=1000):
+    """
+    Throw away the cube and rebuild it from both service tables.
+
+    Returns the number of cube rows written.
+    """
+    written = 0
+    with transaction.atomic():
+        MonthlyServiceRollup.objects.all().delete()
+        for service_type in SERVICE_SOURCES:
+            cells = _cells(service_type, _sessions(service_type), DIMENSIONS, by_month=True)
+            written += _write_cells(service_type, cells.iterator(chunk_size=batch_size), batch_size=batch_size)
+    return written
+
+
+def _split(start_date, end_date):
+    """
+    Split [start_date, end_date] (end_date None: no end) into whole months
+    for the cube, as [first month, stop month) with stop None when open, and
+    the leftover partial-month day ranges, as [(since, until), ...].
+    """
+    first = start_date if start_date.day == 1 else next_month(start_date)
+    until = end_date + timedelta(days=1) if end_date else None
+    stop = month_start(until) if until else None
+    if stop is not None and first >= stop:
+        return None, [(start_date, until)]
+    partial = []
+    if start_date < first:
+        partial.append((start_date, first))
+    if stop is not None and stop < until:
+        partial.append((stop, until))
+    return (first, stop), partial
+
+
+def cube_totals(group_by, start_date, end_date=None, **filters):
+    """
+    Hours and sessions from start_date to end_date (inclusive; None for no
+    end), grouped by cube columns, e.g. ['district'] or ['service_type'].
+
+    filters restrict cube columns to lists of values, e.g.
+    district=['Essex'], school_level=['High School'], service_type=['tutoring'].
+    Whole months are read from the cube. The days of a partial first or last
+    month are aggregated from the session tables, so the totals are exact
+    and cost at most two months of sessions.
+
+    Returns {(value of each group_by column, ...): {'hours': ..., 'sessions': ...}}.
+    """
+    totals = {}
+
+    def add(key, hours, sessions):
+        entry = totals.setdefault(key, {'hours': 0, 'sessions': 0})
+        entry['hours'] += hours or 0
+        entry['sessions'] += sessions
+
+    months, partial = _split(start_date, end_date)
+    if months is not None:
+        first, stop = months
+        cube = MonthlyServiceRollup.objects.filter(month__gte=first)
+        if stop is not None:
+            cube = cube.filter(month__lt=stop)
+        cube = cube.filter(**{f'{column}__in': values for column, values in filters.items()})
+        for row in cube.values(*group_by).annotate(total_hours=Sum('hours'), session_count=Sum('sessions')).order_by():
+            add(tuple(row[column] for column in group_by), row['total_hours'], row['session_count'])
+
+    service_types = [service_type for service_type in SERVICE_SOURCES
+                     if service_type in filters.get('service_type', SERVICE_SOURCES)]
+    for since, until in partial:
+        for service_type in service_types:
+            sessions = _sessions(service_type, since, until).filter(**{
+                f'{DIMENSIONS[column]}__in': values for column, values in filters.items() if column != 'service_type'
+            })
+            for cell in _cells(service_type, sessions, group_by):
+                key = tuple(service_type if column == 'service_type' else cell[DIMENSIONS[column]] for column in group_by)
+                add(key, cell['total_hours'], cell['session_count'])
+    return totals
@@ -0,0 +1,205 @@
+# File: exports.py
+# Description: Streaming CSV / Parquet exports of students, parents and service history
+
+import csv
+import io
+from .models import Student, Parent, TutoringService, AdvocacyService
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional; CSV always works
+    pa = pq = None
+
+# Rows fetched per round trip (a server-side cursor on PostgreSQL), and per
+# piece of response body / Parquet row group
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class Export:
+    """One downloadable table: which rows belong to a set of students, and which columns to write."""
+
+    def __init__(self, model, columns, rows_for):
+        self.model = model
+        self.columns = columns  # [(header, lookup path), ...]
+        self.rows_for = rows_for
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def rows(self, students):
+        """Tuples for the export, joined in SQL and ordered by id."""
+        paths = [path for _, path in self.columns]
+        return self.rows_for(students).order_by('id').values_list(*paths)
+
+    def field(self, path):
+        """The model field a lookup path ends at, e.g. 'student__parent__last_name'."""
+        model = self.model
+        *relations, name = path.split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(name)
+
+
+STUDENT_COLUMNS = [
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('date_of_birth', 'date_of_birth'),
+    ('current_grade', 'current_grade'),
+    ('town_village', 'town_village'),
+    ('country_of_origin', 'country_of_origin'),
+]
+
+PARENT_COLUMNS = [
+    ('parent_id', 'parent_id'),
+    ('parent_first_name', 'parent__first_name'),
+    ('parent_last_name', 'parent__last_name'),
+]
+
+EXPORTS = {
+    'students': Export(
+        Student,
+        [('id', 'id'), *STUDENT_COLUMNS, ('date_of_intake', 'date_of_intake'), *PARENT_COLUMNS],
+        lambda students: students,
+    ),
+    'parents': Export(
+        Parent,
+        [
+            ('id', 'id'),
+            ('first_name', 'first_name'),
+            ('last_name', 'last_name'),
+            ('phone_number', 'phone_number'),
+            ('email_address', 'email_address'),
+            ('home_address', 'home_address'),
+            ('town_village', 'town_village'),
+            ('country_of_origin', 'country_of_origin'),
+            ('date_of_intake', 'date_of_intake'),
+        ],
+        lambda students: Parent.objects.filter(id__in=students.values('parent_id')),
+    ),
+    'tutoring': Export(
+        TutoringService,
+        [
+            ('id', 'id'),
+            ('date_of_contact', 'date_of_contact'),
+            ('length_of_session', 'length_of_session'),
+            ('location_of_contact', 'location_of_contact'),
+            ('session_focus', 'session_focus'),
+            ('activity', 'activity'),
+            ('student_id', 'student_id'),
+            *[(f"student_{header}", f"student__{path}") for header, path in STUDENT_COLUMNS],
+            *[(header, f"student__{path}") for header, path in PARENT_COLUMNS],
+        ],
+        lambda students: TutoringService.objects.filter(student__in=students.values('id')),
+    ),
+    'advocacy': Export(
+        AdvocacyService,
+        [
+            ('id', 'id'),
+            ('date_of_contact', 'date_of_contact'),
+            ('length_of_contact', 'length_of_contact'),
+            ('school_district', 'school_district'),
+            ('description', 'description'),
+            ('student_id', 'student_id'),
+            *[(f"student_{header}", f"student__{path}") for header, path in STUDENT_COLUMNS],
+            *[(header, f"student__{path}") for header, path in PARENT_COLUMNS],
+        ],
+        lambda students: AdvocacyService.objects.filter(student__in=students.values('id')),
+    ),
+}
+
+
+def parquet_available():
+    return pa is not None
+
+
+def csv_chunks(export, students, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export as CSV text, a chunk_size batch of rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export.headers)
+    for count, row in enumerate(export.rows(students).iterator(chunk_size=chunk_size), 1):
+        writer.writerow(row)
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _arrow_type(field):
+    internal_type = field.get_internal_type()
+    if internal_type == 'DateField':
+        return pa.date32()
+    if internal_type == 'DecimalField':
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if internal_type in ('IntegerField', 'BigIntegerField', 'AutoField', 'BigAutoField', 'ForeignKey'):
+        return pa.int64()
+    return pa.string()
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink that hands back what was written since the last drain(), but keeps counting for tell()."""
+
+    def __init__(self):
+        super().__init__()
+        self.pieces = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.pieces.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.pieces)
+        self.pieces = []
+        return data
+
+
+def parquet_chunks(export, students, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the export as a Parquet file, one row group per chunk_size rows.
+
+    Needs pyarrow (see parquet_available()).
+    """
+    schema = pa.schema([(header, _arrow_type(export.field(path))) for header, path in export.columns])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def write(rows):
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=column.type) for values, column in zip(columns, schema)], schema=schema,
+        ))
+
+    rows = []
+    for row in export.rows(students).iterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) == chunk_size:
+            write(rows)
+            rows = []
+            yield sink.drain()
+    if rows:
+        write(rows)
+    writer.close()
+    yield sink.drain()
+
+
+def export_chunks(export, students, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """csv_chunks or parquet_chunks, by format name."""
+    if export_format == 'parquet':
+        return parquet_chunks(export, students, chunk_size)
+    return csv_chunks(export, students, chunk_size)
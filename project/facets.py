@@ -0,0 +1,48 @@
+# File: facets.py
+# Description: Per-process cache of the filter choices (with counts) shown on the search and chart forms
+
+import time
+from django.db.models import Count
+
+# Seconds before a cached facet is re-read. Saves and deletes in this process
+# invalidate straight away (see signals.py); other worker processes catch up
+# within this window.
+FACET_TTL = 300
+
+# (model label, field name) -> (expires at, [(value, count), ...])
+_facet_cache = {}
+
+
+def facet_counts(model, field):
+    """
+    Return [(value, count), ...] for every non-null value of model.field, ordered by value.
+
+    One grouped query per facet, cached for FACET_TTL seconds.
+    """
+    key = (model._meta.label, field)
+    cached = _facet_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    counts = [
+        (row[field], row['count'])
+        for row in model.objects.values(field).annotate(count=Count('id')).order_by(field)
+        if row[field] is not None
+    ]
+    _facet_cache[key] = (time.monotonic() + FACET_TTL, counts)
+    return counts
+
+
+def facet_choices(model, field, blank_label='All'):
+    """Form choices for a facet, e.g. [('', 'All'), ('Essex', 'Essex (42)'), ...]."""
+    choices = [('', blank_label)] if blank_label is not None else []
+    return choices + [(value, f"{value} ({count})") for value, count in facet_counts(model, field)]
+
+
+def invalidate_facets(model=None):
+    """Forget cached facets for one model, or for every model when model is None."""
+    if model is None:
+        _facet_cache.clear()
+        return
+    for key in [key for key in _facet_cache if key[0] == model._meta.label]:
+        _facet_cache.pop(key, None)
@@ -0,0 +1,145 @@
+# File: form_parsing.py
+# Description: Vectorized parsing and validation of Google Forms CSV exports, ahead of the database import
+
+import hashlib
+import pandas as pd
+from django.utils import timezone
+
+TIMESTAMP_FORMAT = "%m/%d/%Y %H:%M:%S"
+DATE_FORMAT = "%m/%d/%Y"
+
+FORM_TYPE = 'Choose Form Type'
+INTAKE = 'Intake'
+ADVOCACY_CONTACT = 'Advocacy contact'
+TUTORING_CONTACT = 'Tutoring contact'
+
+# Same mapping as create_student in models.py
+GRADE_CODES = {'K': 0, 'OS': 13, '': 13}
+
+# (first name, last name, date of birth, grade) columns for the up to three students on an intake
+STUDENT_COLUMNS = [
+    ('Student first name', 'Student last name', 'Date of birth', 'Current grade'),
+    ('Student #2 first name', 'Student #2 last name', 'Student #2 date of birth', 'Student #2 current grade'),
+    ('Student #3 first name', 'Student #3 last name', 'Student #3 date of birth', 'Student #3 current grade'),
+]
+
+# form type -> (date column, hours column)
+CONTACT_COLUMNS = {
+    ADVOCACY_CONTACT: ('Date of contactC', 'Length of contactC'),
+    TUTORING_CONTACT: ('Date of contactB', 'Length of session'),
+}
+
+# length_of_session / length_of_contact are DecimalField(max_digits=4, decimal_places=2)
+MAX_HOURS = 99.99
+
+REJECT_REASON = 'reject reason'
+
+# Bookkeeping columns the importer adds to each chunk before prepare_chunk
+FINGERPRINT = 'fingerprint'
+SUBMITTED_AT = 'submitted at'
+
+
+def read_chunks(file_path, chunk_size):
+    """Stream the export as DataFrames of chunk_size rows, every cell a str ('' when empty)."""
+    return pd.read_csv(
+        file_path, dtype=str, keep_default_na=False, chunksize=chunk_size, encoding='utf-8',
+    )
+
+
+def _parse_dates(column, date_format):
+    return pd.to_datetime(column.str.strip(), format=date_format, errors='coerce')
+
+
+def _as_python(values):
+    """Object column with None in place of NaN/NaT, ready for model fields."""
+    return values.astype(object).where(values.notna(), None)
+
+
+def fingerprint_rows(frame):
+    """
+    sha1 of each row's non-empty cells, keyed by column name, Timestamp included.
+
+    Empty cells and column order don't count, so adding a question to the
+    form doesn't change the fingerprint of rows submitted before it.
+    """
+    pieces = pd.Series('', index=frame.index)
+    for column in sorted(frame.columns):
+        values = frame[column]
+        pieces = pieces + (column + '=' + values + '\x1f').where(values != '', '')
+    return pieces.map(lambda text: hashlib.sha1(text.encode()).hexdigest())
+
+
+def submission_times(frame):
+    """The form Timestamp of each row as an aware datetime (NaT when missing or unreadable)."""
+    tz = timezone.get_current_timezone_name()
+    if 'Timestamp' not in frame.columns:
+        return pd.Series(pd.NaT, index=frame.index, dtype=pd.DatetimeTZDtype(tz=tz))
+    return _parse_dates(frame['Timestamp'], TIMESTAMP_FORMAT).dt.tz_localize(tz, ambiguous='NaT', nonexistent='NaT')
+
+
+def prepare_chunk(frame):
+    """
+    Parse and validate one chunk of the export, a column at a time.
+
+    Returns (clean, rejected). clean is the chunk's valid rows with typed
+    cells: Timestamp and the date columns become dates, grades ints and
+    lengths floats (DecimalField quantizes them to two places on save).
+    rejected holds the other rows as they appeared in the file, plus a
+    'reject reason' column naming the first problem found. Rows of an
+    unknown form type pass through untouched for the importer to skip, as
+    do any other columns (such as FINGERPRINT).
+    """
+    for column in {FORM_TYPE, 'Timestamp', 'Email'} | {c for columns in STUDENT_COLUMNS for c in columns} \
+            | {c for columns in CONTACT_COLUMNS.values() for c in columns}:
+        if column not in frame.columns:
+            frame[column] = ''
+    frame[FORM_TYPE] = frame[FORM_TYPE].str.strip()
+    form_type = frame[FORM_TYPE]
+
+    reason = pd.Series('', index=frame.index)
+    typed = {}
+
+    def reject(mask, why):
+        reason[mask & (reason == '')] = why
+
+    intake = form_type == INTAKE
+    timestamps = _parse_dates(frame['Timestamp'], TIMESTAMP_FORMAT)
+    reject(intake & timestamps.isna(), 'bad Timestamp')
+    typed['Timestamp'] = _as_python(timestamps.dt.date)
+
+    for i, (first, last, birth, grade) in enumerate(STUDENT_COLUMNS):
+        present = intake if i == 0 else intake & (frame[first].str.strip() != '')
+        # An unreadable date of birth is stored as NULL, as parse_date does
+        typed[birth] = _as_python(_parse_dates(frame[birth], DATE_FORMAT).dt.date)
+        codes = frame[grade].str.strip()
+        grades = pd.to_numeric(codes, errors='coerce').where(lambda g: g % 1 == 0)
+        grades = grades.mask(codes.isin(GRADE_CODES.keys()), codes.map(GRADE_CODES))
+        reject(present & grades.isna(), f'bad {grade}')
+        typed[grade] = _as_python(grades.astype('Int64'))
+
+    for contact_type, (date_column, hours_column) in CONTACT_COLUMNS.items():
+        contact = form_type == contact_type
+        dates = _parse_dates(frame[date_column], DATE_FORMAT)
+        reject(contact & dates.isna(), f'bad {date_column}')
+        typed[date_column] = _as_python(dates.dt.date)
+        hours = pd.to_numeric(frame[hours_column].str.strip(), errors='coerce').round(2)
+        reject(contact & ~hours.between(0, MAX_HOURS), f'bad {hours_column}')
+        typed[hours_column] = _as_python(hours)
+
+    if SUBMITTED_AT in frame.columns:
+        frame[SUBMITTED_AT] = _as_python(frame[SUBMITTED_AT])
+
+    bad = reason != ''
+    rejected = frame[bad].assign(**{REJECT_REASON: reason[bad]})
+    clean = frame[~bad].assign(**{column: values[~bad] for column, values in typed.items()})
+    return clean, rejected
+
+
+def parse_chunk(frame):
+    """
+    Everything the importer does to a raw chunk before touching the database:
+    FINGERPRINT and SUBMITTED_AT columns, then prepare_chunk. A plain
+    function of its argument, so it can run in a worker process.
+    """
+    frame = frame.assign(**{FINGERPRINT: fingerprint_rows(frame), SUBMITTED_AT: submission_times(frame)})
+    return prepare_chunk(frame)
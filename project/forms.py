@@ -3,7 +3,8 @@
 # Description: A bunch of forms to be used by the views
 
 from django import forms
-from .models import Student, Parent
+from .models import Student, Parent, Subject
+from .facets import facet_choices, facet_counts
 from django.utils import timezone
 
 class StudentSearchForm(forms.Form):
@@ -12,6 +13,7 @@ class StudentSearchForm(forms.Form):
     country_of_origin = forms.ChoiceField(required=False, label="Country of Origin")
     current_grade = forms.ChoiceField(required=False, label="Grade")
     town_village = forms.ChoiceField(required=False, label="School District")
+    subject = forms.ChoiceField(required=False, label="Tutored In")
 
     time_period = forms.ChoiceField(
         choices=[
@@ -27,24 +29,12 @@ class StudentSearchForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # Dynamically generate choices from the database
-        self.fields['country_of_origin'].choices = [('', 'All')] + [
-            (country, country)
-            for country in Student.objects.values_list('country_of_origin', flat=True).distinct()
-            if country is not None
-        ]
-
-        self.fields['current_grade'].choices = [('', 'All')] + [
-            (grade, grade)
-            for grade in Student.objects.values_list('current_grade', flat=True).distinct()
-            if grade is not None
-        ]
-
-        self.fields['town_village'].choices = [('', 'All')] + [
-            (town, town)
-            for town in Student.objects.values_list('town_village', flat=True).distinct()
-            if town is not None
-        ]
+        # Choices (with counts) come from the per-process facet cache
+        self.fields['country_of_origin'].choices = facet_choices(Student, 'country_of_origin')
+        self.fields['current_grade'].choices = facet_choices(Student, 'current_grade')
+        self.fields['town_village'].choices = facet_choices(Student, 'town_village')
+        # Subject rows are unique by name, so their counts would all be 1
+        self.fields['subject'].choices = [('', 'All')] + [(name, name) for name, _ in facet_counts(Subject, 'name')]
 
 class ParentSearchForm(forms.Form):
     search_name = forms.CharField(max_length=100, required=False, label="Search by Name")
@@ -54,15 +44,8 @@ class ParentSearchForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        towns = Parent.objects.values_list('town_village', flat=True).distinct()
-        self.fields['town_village'].choices = [('', 'All')] + [
-            (town, town) for town in towns if town is not None
-        ]
-
-        countries = Parent.objects.values_list('country_of_origin', flat=True).distinct()
-        self.fields['country_of_origin'].choices = [('', 'All')] + [
-            (country, country) for country in countries if country is not None
-        ]
+        self.fields['town_village'].choices = facet_choices(Parent, 'town_village')
+        self.fields['country_of_origin'].choices = facet_choices(Parent, 'country_of_origin')
 
 
 class StudentUpdateForm(forms.ModelForm):
@@ -129,8 +112,7 @@ class StudentForm(forms.ModelForm):
         self.fields['phone_number'].label = 'Phone Number'
 
 class ChartsFilterForm(forms.Form):
-    town_village = forms.ModelMultipleChoiceField(
-        queryset=Student.objects.values_list('town_village', flat=True).distinct(),
+    town_village = forms.MultipleChoiceField(
         widget=forms.CheckboxSelectMultiple,
         required=False,
         label="Student School District"
@@ -154,4 +136,11 @@ class ChartsFilterForm(forms.Form):
         ],
         required=False,
         label="Time Range"
-    )
\ No newline at end of file
+    )
+    # Either date overrides the time range
+    start_date = forms.DateField(required=False, label="From", widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(required=False, label="To", widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['town_village'].choices = facet_choices(Student, 'town_village', blank_label=None)
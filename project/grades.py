@@ -0,0 +1,70 @@
+# File: grades.py
+# Description: School years, grade-at-service stamps on sessions, and the yearly grade rollover
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import ExtractYear
+from .models import Student, TutoringService, AdvocacyService, GradeRollover
+
+SERVICE_MODELS = [TutoringService, AdvocacyService]
+
+# Grades the rollover promotes: K (0) through 12. 13 is out of school, and -1
+# (the model default) means the grade was never entered.
+PROMOTED_GRADES = (0, 12)
+
+
+def school_year_of(day):
+    """The school year a date falls in, named by the calendar year it starts in (on July 1)."""
+    return day.year if day.month >= 7 else day.year - 1
+
+
+def grade_at(current_grade, day, today):
+    """A student's grade on day, given their grade today: one lower for each school year back."""
+    if current_grade is None:
+        return None
+    return current_grade - (school_year_of(today) - school_year_of(day))
+
+
+def stamp_service(service, current_grade, day, today):
+    """Set school_year and grade_at_service on an unsaved or changed session."""
+    service.school_year = school_year_of(day)
+    service.grade_at_service = grade_at(current_grade, day, today)
+
+
+def backfill_grades(today, restamp=False):
+    """
+    Stamp sessions saved before school_year/grade_at_service existed, in one
+    UPDATE per service table. restamp=True recomputes every session from the
+    students' current grades.
+
+    Returns {model: sessions updated}.
+    """
+    school_year = Case(
+        When(date_of_contact__month__gte=7, then=ExtractYear('date_of_contact')),
+        default=ExtractYear('date_of_contact') - 1,
+    )
+    current_grade = Subquery(Student.objects.filter(pk=OuterRef('student_id')).values('current_grade')[:1])
+    updated = {}
+    with transaction.atomic():
+        for model in SERVICE_MODELS:
+            sessions = model.objects.all() if restamp else model.objects.filter(school_year__isnull=True)
+            updated[model] = sessions.update(
+                school_year=school_year,
+                grade_at_service=current_grade - (Value(school_year_of(today)) - school_year),
+            )
+    return updated
+
+
+def promote_students(school_year):
+    """
+    Move every student in K-12 up one grade for school_year, in one UPDATE,
+    and record it so the same year can't be promoted twice.
+
+    Returns the number of students promoted.
+    """
+    with transaction.atomic():
+        promoted = Student.objects.filter(current_grade__range=PROMOTED_GRADES).update(
+            current_grade=F('current_grade') + 1
+        )
+        GradeRollover.objects.create(school_year=school_year, students=promoted)
+    return promoted
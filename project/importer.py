@@ -0,0 +1,477 @@
+# File: importer.py
+# Description: Bulk importer for the Google Forms CSV export (intake, tutoring and advocacy rows)
+
+import multiprocessing
+import os
+import time
+from collections import deque
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+from django.db import transaction
+from .models import Parent, Student, TutoringService, AdvocacyService, ImportSource, ImportedRow
+from .bulk_load import LOAD_MODELS, BulkLoader
+from .caching import bump_data_version
+from .cube import rebuild_monthly_rollups, refresh_monthly_rollups
+from .facets import invalidate_facets
+from .grades import stamp_service
+from .form_parsing import (
+    ADVOCACY_CONTACT, CONTACT_COLUMNS, FINGERPRINT, FORM_TYPE, INTAKE, STUDENT_COLUMNS, SUBMITTED_AT,
+    TUTORING_CONTACT, parse_chunk, read_chunks,
+)
+from .subjects import SubjectLink, subject_links
+from .rollups import rebuild_daily_rollups, rebuild_service_events, refresh_service_days
+from .served import rebuild_served_sets, refresh_served_sets, served_days
+
+
+def parse_pool(workers):
+    """
+    A process pool for parse_chunk. Workers are spawned rather than forked,
+    so they don't inherit the parent's open database connections.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def service_student_name(form_type, row):
+    """(first, last) of the student a tutoring or advocacy row is about."""
+    suffix = 'C' if form_type == ADVOCACY_CONTACT else 'B'
+    return row[f'Student first name{suffix}'], row[f'Student last name{suffix}']
+
+
+def normalize_name(value):
+    """Case- and whitespace-insensitive form of a name, for matching form rows to students."""
+    return ' '.join((value or '').split()).casefold()
+
+
+class KnownStudent:
+    """What the resolver remembers about one student."""
+    __slots__ = ('id', 'parent_key', 'town_village', 'current_grade', 'instance')
+
+    def __init__(self, id, parent_key, town_village, current_grade, instance=None):
+        self.id = id
+        self.parent_key = parent_key
+        self.town_village = town_village
+        self.current_grade = current_grade
+        # The unsaved Student while its intake chunk is being written
+        self.instance = instance
+
+    @property
+    def pk(self):
+        return self.instance.pk if self.instance is not None else self.id
+
+    def saved(self):
+        """Drop the model instance once it has a pk, so preloading stays cheap on memory."""
+        if self.instance is not None and self.instance.pk is not None:
+            self.id = self.instance.pk
+            self.town_village = self.instance.town_village
+            self.current_grade = self.instance.current_grade
+            self.instance = None
+
+
+class StudentResolver:
+    """
+    Matches contact rows to students without a query per row.
+
+    Every student is loaded once into a (normalized first, last) map, and
+    students created by intake rows are added as the import reaches them,
+    so a contact row sees exactly the students that exist at its point in
+    the file. A name shared by several students only resolves when a parent
+    name is given to tell them apart.
+    """
+
+    def __init__(self):
+        self._by_name = {}
+
+    def load(self):
+        rows = Student.objects.values_list(
+            'id', 'first_name', 'last_name', 'town_village', 'current_grade', 'parent__first_name', 'parent__last_name'
+        ).order_by('id')
+        for student_id, first_name, last_name, town, grade, parent_first, parent_last in rows.iterator(chunk_size=5000):
+            self._remember(first_name, last_name, KnownStudent(
+                student_id, (normalize_name(parent_first), normalize_name(parent_last)), town, grade,
+            ))
+        return self
+
+    def _remember(self, first_name, last_name, known):
+        self._by_name.setdefault((normalize_name(first_name), normalize_name(last_name)), []).append(known)
+        return known
+
+    def add(self, student, parent):
+        """Remember a Student built from an intake row (saved or not)."""
+        return self._remember(student.first_name, student.last_name, KnownStudent(
+            student.pk, (normalize_name(parent.first_name), normalize_name(parent.last_name)),
+            student.town_village, student.current_grade, instance=student,
+        ))
+
+    def resolve(self, first_name, last_name, parent_first_name=None, parent_last_name=None):
+        """Return [KnownStudent, ...]: exactly one entry when the name resolves, none or several when it doesn't."""
+        candidates = self._by_name.get((normalize_name(first_name), normalize_name(last_name)), [])
+        if len(candidates) > 1 and (parent_first_name or parent_last_name):
+            parent_key = (normalize_name(parent_first_name), normalize_name(parent_last_name))
+            candidates = [known for known in candidates if known.parent_key == parent_key]
+        return candidates
+
+
+class ImportStats:
+    """Counters for one import run."""
+
+    def __init__(self):
+        self.rows = 0
+        self.parents = 0
+        self.students = 0
+        self.tutoring = 0
+        self.advocacy = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.already_imported = 0
+        # (row, form type, student name, problem, candidate student ids) for rows that didn't resolve
+        self.unresolved = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.rows} rows in {self.elapsed:.1f}s ({self.rows_per_second:.0f} rows/s): "
+            f"{self.parents} parents, {self.students} students, {self.tutoring} tutoring, "
+            f"{self.advocacy} advocacy, {self.already_imported} already imported, "
+            f"{self.rejected} rejected, {self.skipped} skipped"
+        )
+
+
+class FormsImporter:
+    """
+    Streams a forms export and writes it in chunks with bulk_create.
+
+    Each chunk is parsed and validated column-wise by prepare_chunk (rows
+    that fail go to rejects_path), resolved in memory (contact rows are matched to
+    students through a StudentResolver loaded once per run), then written as
+    one bulk INSERT per table, so a chunk costs a handful of statements
+    instead of several per row. Rows are committed per chunk, or all at once
+    with single_transaction=True. Contact rows whose student is missing or
+    ambiguous are skipped and listed in stats.unresolved.
+
+    Every row written is fingerprinted (see fingerprint_rows) under an
+    ImportSource, so importing the same export again only writes rows not
+    seen before. With incremental=True, rows submitted before the source's
+    watermark are dropped without even a fingerprint lookup; the watermark
+    never passes a contact row whose student didn't resolve, so later runs
+    retry it until its student has been added. Each chunk
+    commits together with a checkpoint, and a rerun of the same file after
+    a crash starts after the last committed chunk. Any file imported under
+    the source after a crash skips the rows committed before it by their
+    fingerprints instead.
+
+    With fast=True the tables are written through a BulkLoader (COPY
+    on PostgreSQL, executemany on SQLite) instead of bulk_create, and the
+    whole file is loaded in one transaction. That's for large historical
+    backfills; there is no point resuming those from a checkpoint.
+
+    Parsing (parse_chunk) can be handed to a concurrent.futures process
+    pool with parse_pool. At most parse_ahead chunks are parsed ahead of the
+    one being written, so memory stays bounded by the chunk size.
+
+    bulk_create skips model signals, so sessions get their grade-at-service
+    stamp and subject links as they are built, and the service ledger, daily
+    rollups, monthly cube and served sets are refreshed once at the end
+    instead of row by row, for just the days the new sessions (and students
+    whose district changed) fall on. The first import after one that
+    stopped part-way (a resumed import, or any other file under the same
+    source) rebuilds them in full, since the run that stopped never
+    refreshed the days it had written.
+    """
+
+    def __init__(self, chunk_size=1000, single_transaction=False, rebuild_derived=True, rejects_path=None,
+                 source='forms', incremental=False, fast=False, parse_pool=None, parse_ahead=4,
+                 log=None):
+        self.chunk_size = chunk_size
+        self.rejects_path = rejects_path
+        self.single_transaction = single_transaction
+        self.rebuild_derived = rebuild_derived
+        self.source_name = source
+        self.incremental = incremental
+        self.loader = BulkLoader(LOAD_MODELS + [ImportedRow]) if fast else None
+        self.parse_pool = parse_pool
+        self.parse_ahead = parse_ahead
+        self.log = log or (lambda message: None)
+        self.stats = ImportStats()
+        self.source = None
+        self.resolver = None
+        self.today = date.today()
+        self.service_days = set()
+        self.moved_students = set()
+        self.resumed = False
+        # Submitted time of the earliest contact row that didn't resolve this run
+        self.retry_from = None
+        self._rejects_started = False
+
+    def run(self, file_path):
+        file_path = os.path.abspath(file_path)
+        self.source, _ = ImportSource.objects.get_or_create(name=self.source_name)
+        self.resolver = StudentResolver().load()
+        if self.loader is not None:
+            self.loader.start()
+            try:
+                with transaction.atomic():
+                    self.loader.lock_tables()
+                    self._import_rows(file_path)
+                    self.loader.finish()
+            finally:
+                self.loader.close()
+        elif self.single_transaction:
+            with transaction.atomic():
+                self._import_rows(file_path)
+        else:
+            self._import_rows(file_path)
+
+        if self.rebuild_derived and self.resumed:
+            # The run that stopped part-way wrote sessions whose days this run never saw
+            rebuild_service_events()
+            rebuild_daily_rollups()
+            rebuild_monthly_rollups()
+            rebuild_served_sets()
+        elif self.rebuild_derived and (self.stats.tutoring or self.stats.advocacy or self.stats.students):
+            # New sessions only change the derived rows of the days they fall on, so
+            # an import costs what it adds, not the size of the history. A student
+            # whose district changed also moves in the cube and served sets on every
+            # day they were served
+            refresh_service_days(self.service_days)
+            if self.moved_students:
+                self.service_days.update(served_days(student_id__in=self.moved_students))
+            refresh_monthly_rollups(self.service_days)
+            refresh_served_sets(self.service_days)
+
+        # Only now is the file done: a crash before this resumes, and so rebuilds the derived tables
+        self.source.checkpoint_file = ''
+        self.source.checkpoint_row = 0
+        self.source.save()
+        bump_data_version()
+        invalidate_facets()
+        self.stats.finish()
+        return self.stats
+
+    def _import_rows(self, file_path):
+        resume_after = 0
+        if self.source.checkpoint_row:
+            # An import of this source stopped part-way, whatever file it was
+            # reading, so the rows it committed never reached the derived tables
+            self.resumed = True
+            if self.source.checkpoint_file == file_path:
+                resume_after = self.source.checkpoint_row
+                self.log(f"Resuming after row {resume_after}")
+            else:
+                self.log(f"An import of {self.source.checkpoint_file} stopped after row "
+                         f"{self.source.checkpoint_row}; the derived tables will be rebuilt")
+
+        for last_row, row_count, clean, rejected in self._parsed_chunks(file_path, resume_after):
+            clean, rejected = self._new_rows(clean, rejected)
+            if len(rejected):
+                self._write_rejects(rejected.drop(columns=[FINGERPRINT, SUBMITTED_AT]))
+            with transaction.atomic():
+                self._write_chunk(list(zip(clean.index, clean.to_dict('records'))))
+                self.source.checkpoint_file = file_path
+                self.source.checkpoint_row = last_row
+                self.source.save()
+            self.stats.rows += row_count
+            self.log(f"{self.stats.rows} rows read")
+
+    def _parsed_chunks(self, file_path, resume_after):
+        """Yield (last row number, rows read, clean, rejected) per chunk, in file order."""
+        def frames():
+            for frame in read_chunks(file_path, self.chunk_size):
+                # Number rows by their 1-based position among the data rows
+                frame.index = frame.index + 1
+                if len(frame) and frame.index[-1] > resume_after:
+                    yield frame[frame.index > resume_after]
+
+        if self.parse_pool is None:
+            for frame in frames():
+                yield (frame.index[-1], len(frame), *parse_chunk(frame))
+            return
+
+        # At most parse_ahead chunks are parsed but not yet written
+        in_flight = deque()
+        for frame in frames():
+            in_flight.append((frame.index[-1], len(frame), self.parse_pool.submit(parse_chunk, frame)))
+            if len(in_flight) >= self.parse_ahead:
+                last_row, row_count, parsed = in_flight.popleft()
+                yield (last_row, row_count, *parsed.result())
+        while in_flight:
+            last_row, row_count, parsed = in_flight.popleft()
+            yield (last_row, row_count, *parsed.result())
+
+    def _new_rows(self, clean, rejected):
+        """Drop the rows of a parsed chunk that were imported (or, incrementally, passed) before."""
+        count = len(clean) + len(rejected)
+        clean = clean[~clean[FINGERPRINT].duplicated()]
+        watermark = self.source.watermark
+        if self.incremental and watermark is not None:
+            # Rows stamped exactly at the watermark may be the rest of a
+            # second that was split across chunks, so those get checked
+            def unpassed(frame):
+                return frame[[at is None or at >= watermark for at in frame[SUBMITTED_AT]]]
+            clean, rejected = unpassed(clean), unpassed(rejected)
+        seen = set(ImportedRow.objects.filter(
+            source=self.source, fingerprint__in=list(clean[FINGERPRINT]),
+        ).values_list('fingerprint', flat=True))
+        clean = clean[~clean[FINGERPRINT].isin(seen)]
+        self.stats.already_imported += count - len(clean) - len(rejected)
+        return clean, rejected
+
+    def _write_rejects(self, rejected):
+        self.stats.rejected += len(rejected)
+        if self.rejects_path:
+            rejected.to_csv(self.rejects_path, mode='a' if self._rejects_started else 'w', header=not self._rejects_started, index=False)
+            self._rejects_started = True
+
+    def _write_chunk(self, rows):
+        """
+        Write one chunk of (row number, typed row) pairs from prepare_chunk,
+        inside the caller's transaction. Rows are resolved in file order,
+        then each table gets one bulk INSERT.
+        """
+        parents = []
+        new_students = []
+        tutoring = []
+        advocacy = []
+        town_updates = {}
+        imported = []
+        for row_number, row in rows:
+            form_type = row[FORM_TYPE]
+            if form_type == INTAKE:
+                imported.append(row)
+                parent, children = self._build_intake(row)
+                parents.append(parent)
+                for student in children:
+                    new_students.append(self.resolver.add(student, parent))
+            elif form_type in (ADVOCACY_CONTACT, TUTORING_CONTACT):
+                name = service_student_name(form_type, row)
+                matches = self.resolver.resolve(*name)
+                if len(matches) != 1:
+                    problem = 'not found' if not matches else 'ambiguous'
+                    self.log(f"Student {problem}: {' '.join(name)} (row {row_number})")
+                    self.stats.unresolved.append((row_number, form_type, ' '.join(name), problem, [known.pk for known in matches]))
+                    self.stats.skipped += 1
+                    submitted_at = row[SUBMITTED_AT]
+                    if submitted_at is not None and (self.retry_from is None or submitted_at < self.retry_from):
+                        self.retry_from = submitted_at
+                    continue
+                imported.append(row)
+                known = matches[0]
+                service, district = self._build_service(form_type, row, known)
+                (advocacy if form_type == ADVOCACY_CONTACT else tutoring).append(service)
+
+                # First service row seen for a student decides their school district
+                if known.town_village == 'None':
+                    known.town_village = district
+                    if known.instance is not None:
+                        known.instance.town_village = district
+                    else:
+                        town_updates[known.id] = district
+            else:
+                self.stats.skipped += 1
+
+        # Both writers copy the pks just assigned to parents (and students)
+        # into the FKs of the rows created against them
+        self._insert(Parent, parents)
+        self._insert(Student, [known.instance for known in new_students])
+        self._insert(TutoringService, tutoring)
+        self._insert(SubjectLink, subject_links([(service.pk, service.session_focus) for service in tutoring]))
+        self._insert(AdvocacyService, advocacy)
+        if town_updates:
+            self.moved_students.update(town_updates)
+            Student.objects.bulk_update(
+                [Student(id=student_id, town_village=town) for student_id, town in town_updates.items()],
+                ['town_village'],
+            )
+        for known in new_students:
+            known.saved()
+
+        # Contact rows that didn't resolve aren't recorded, so a later run can retry them
+        self._insert(ImportedRow, [
+            ImportedRow(source=self.source, fingerprint=row[FINGERPRINT], submitted_at=row[SUBMITTED_AT])
+            for row in imported
+        ])
+        submitted = [row[SUBMITTED_AT] for row in imported if row[SUBMITTED_AT] is not None]
+        if submitted and (self.source.watermark is None or max(submitted) > self.source.watermark):
+            self.source.watermark = max(submitted)
+        # ...and the watermark stays at the earliest of them, so an incremental run still reads them
+        if self.retry_from is not None and (self.source.watermark is None or self.source.watermark > self.retry_from):
+            self.source.watermark = self.retry_from
+
+        self.stats.parents += len(parents)
+        self.stats.students += len(new_students)
+        self.stats.tutoring += len(tutoring)
+        self.stats.advocacy += len(advocacy)
+
+    def _insert(self, model, objs):
+        if self.loader is not None:
+            self.loader.write(objs)
+        else:
+            model.objects.bulk_create(objs)
+
+    def _build_intake(self, row):
+        """An unsaved Parent and its Students for a validated intake row."""
+        parent = Parent(
+            date_of_intake=row['Timestamp'],
+            first_name=row['Parent first name'],
+            last_name=row['Parent last name'],
+            phone_number=row['Phone number'],
+            email_address=row['Email'],
+            home_address=row['Address'],
+            town_village=row['Town/ Village'],
+            country_of_origin=row['Country of origin'],
+        )
+        children = [
+            Student(
+                date_of_intake=row['Timestamp'],
+                parent=parent,
+                first_name=row[first_key],
+                last_name=row[last_key],
+                date_of_birth=row[birth_key],
+                current_grade=row[grade_key],
+                # Filled in from the first service row, like create_student does
+                town_village='None',
+                country_of_origin=row['Country of origin'],
+            )
+            # Student #2 and #3 only when the form has them
+            for i, (first_key, last_key, birth_key, grade_key) in enumerate(STUDENT_COLUMNS)
+            if i == 0 or row[first_key].strip()
+        ]
+        return parent, children
+
+    def _build_service(self, form_type, row, known):
+        """(unsaved service, school district) for a validated contact row."""
+        if known.instance is not None:
+            student = {'student': known.instance}
+        else:
+            student = {'student_id': known.id}
+        date_column, hours_column = CONTACT_COLUMNS[form_type]
+        if form_type == ADVOCACY_CONTACT:
+            district = row['School districtC']
+            service = AdvocacyService(
+                **student,
+                date_of_contact=row[date_column],
+                school_district=district,
+                length_of_contact=row[hours_column],
+                description=row['Description of advocacy'],
+            )
+        else:
+            district = row['School districtB']
+            service = TutoringService(
+                **student,
+                date_of_contact=row[date_column],
+                location_of_contact=row['Location of contact'],
+                length_of_session=row[hours_column],
+                session_focus=row['Focus'],
+                activity=row['Activity'],
+            )
+        current_grade = known.instance.current_grade if known.instance is not None else known.current_grade
+        stamp_service(service, current_grade, row[date_column], self.today)
+        self.service_days.add(row[date_column])
+        return service, district
@@ -0,0 +1,27 @@
+# backfill_grades.py (Django management command)
+
+from datetime import date
+from django.core.management.base import BaseCommand
+from project.caching import bump_data_version
+from project.cube import rebuild_monthly_rollups
+from project.grades import backfill_grades
+
+
+class Command(BaseCommand):
+    help = "Fill in school_year and grade_at_service on sessions that don't have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restamp', action='store_true',
+            help="Recompute every session from the students' current grades, not just unstamped ones",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Stamping grade at service...")
+        updated = backfill_grades(date.today(), restamp=options['restamp'])
+        for model, count in updated.items():
+            self.stdout.write(self.style.SUCCESS(f"  ✓ {count} {model._meta.verbose_name} rows updated"))
+        if any(updated.values()):
+            # update() skips the save signals; the cube is broken down by grade at service
+            rebuild_monthly_rollups()
+            bump_data_version()
@@ -0,0 +1,21 @@
+# backfill_subjects.py (Django management command)
+
+from django.core.management.base import BaseCommand
+from project.caching import bump_data_version
+from project.subjects import backfill_subjects
+
+
+class Command(BaseCommand):
+    help = 'Link tutoring sessions to Subject rows parsed from their session focus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--relink', action='store_true', help='Drop every link and rebuild them all')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Linking tutoring sessions to subjects...")
+        written = backfill_subjects(relink=options['relink'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"  ✓ {written} subject links written"))
+        if written or options['relink']:
+            # bulk_create skips the save signals
+            bump_data_version()
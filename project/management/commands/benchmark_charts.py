@@ -0,0 +1,197 @@
+# benchmark_charts.py (Django management command)
+
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, When
+from project.caching import bump_data_version
+from project.charts import ChartScope, chart_data
+from project.cube import refresh_monthly_rollups
+from project.grades import stamp_service
+from project.models import Parent, Student, TutoringService, AdvocacyService
+from project.rollups import refresh_service_days
+from project.served import refresh_served_sets
+
+# Synthetic students are filed under a district no real student has
+BENCHMARK_TOWN = 'Benchmark District'
+
+
+def fanned_out_hours(students, start_date):
+    """The old annotation: one Sum over a join of both reverse relations."""
+    return students.annotate(
+        total_hours=Sum(
+            Case(
+                When(tutoring_sessions__date_of_contact__gte=start_date, then=F('tutoring_sessions__length_of_session')),
+                When(advocacy_sessions__date_of_contact__gte=start_date, then=F('advocacy_sessions__length_of_contact')),
+                default=0,
+                output_field=FloatField(),
+            )
+        )
+    )
+
+
+def hours_by_level(annotated):
+    rows = annotated.values('school_level', 'total_hours')
+    totals = {}
+    for row in rows:
+        totals[row['school_level']] = totals.get(row['school_level'], 0) + float(row['total_hours'] or 0)
+    return totals
+
+
+def students_by_interval(annotated):
+    bins = annotated.aggregate(
+        under_5=Count('id', filter=Q(total_hours__lt=5)),
+        between_5_10=Count('id', filter=Q(total_hours__gte=5, total_hours__lt=10)),
+        between_10_20=Count('id', filter=Q(total_hours__gte=10, total_hours__lt=20)),
+        over_20=Count('id', filter=Q(total_hours__gte=20)),
+    )
+    return [bins['under_5'], bins['between_5_10'], bins['between_10_20'], bins['over_20']]
+
+
+def true_hours(start_date):
+    """Every student's total hours since start_date, summed in Python from the session rows."""
+    hours = dict.fromkeys(Student.objects.values_list('id', flat=True), Decimal(0))
+    for model, hours_field in [(TutoringService, 'length_of_session'), (AdvocacyService, 'length_of_contact')]:
+        sessions = model.objects.filter(date_of_contact__gte=start_date).values_list('student_id', hours_field)
+        for student_id, length in sessions.iterator(chunk_size=5000):
+            hours[student_id] += length or 0
+    return hours
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the service_by_level and students_by_service_interval charts, old (one join of both '
+        'session tables) against what chart_data runs now for the configured CHART_ENGINE, on synthetic '
+        'students. Everything runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500, help='Synthetic students (default 500)')
+        parser.add_argument('--tutoring', type=int, default=30, help='Tutoring sessions per student (default 30)')
+        parser.add_argument('--advocacy', type=int, default=10, help='Advocacy sessions per student (default 10)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per query; the best time is reported')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['students'] < 1 or options['repeat'] < 1:
+            raise CommandError("--students and --repeat must be at least 1")
+        with transaction.atomic():
+            expected = self.create_dataset(options)
+            self.compare(options, expected)
+            transaction.set_rollback(True)
+
+    def create_dataset(self, options):
+        """
+        Students, sessions over the last two years, and each student's true
+        total hours in the last year.
+
+        The sessions are stamped and the derived tables refreshed for their
+        days the way the forms importer does, so the charts read them from the
+        ledger, cube and served sets like real data.
+        """
+        rng = random.Random(options['seed'])
+        today = date.today()
+        start_date = today - timedelta(days=365)
+
+        parent = Parent.objects.create(first_name='Benchmark', last_name='Parent', town_village=BENCHMARK_TOWN)
+        students = Student.objects.bulk_create([
+            Student(first_name=f'Student{i}', last_name='Benchmark', current_grade=i % 13,
+                    town_village=BENCHMARK_TOWN, parent=parent)
+            for i in range(options['students'])
+        ])
+
+        expected = {}
+        tutoring, advocacy = [], []
+        for student in students:
+            expected[student.id] = Decimal(0)
+            for _ in range(options['tutoring']):
+                session = TutoringService(
+                    student=student, date_of_contact=today - timedelta(days=rng.randrange(730)),
+                    location_of_contact='Library', session_focus='Math', activity='',
+                    length_of_session=Decimal(rng.randrange(25, 300)) / 100,
+                )
+                stamp_service(session, student.current_grade, session.date_of_contact, today)
+                tutoring.append(session)
+                if session.date_of_contact >= start_date:
+                    expected[student.id] += session.length_of_session
+            for _ in range(options['advocacy']):
+                session = AdvocacyService(
+                    student=student, date_of_contact=today - timedelta(days=rng.randrange(730)),
+                    description='', school_district=BENCHMARK_TOWN,
+                    length_of_contact=Decimal(rng.randrange(25, 300)) / 100,
+                )
+                stamp_service(session, student.current_grade, session.date_of_contact, today)
+                advocacy.append(session)
+                if session.date_of_contact >= start_date:
+                    expected[student.id] += session.length_of_contact
+        TutoringService.objects.bulk_create(tutoring, batch_size=5000)
+        AdvocacyService.objects.bulk_create(advocacy, batch_size=5000)
+
+        days = {session.date_of_contact for session in tutoring + advocacy}
+        refresh_service_days(days)
+        refresh_monthly_rollups(days)
+        refresh_served_sets(days)
+        bump_data_version()
+        return expected
+
+    def best_time(self, repeat, run):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best * 1000, result
+
+    def compare(self, options, expected):
+        scope = ChartScope([BENCHMARK_TOWN], None, '1year', date.today())
+        students = scope.students
+        start_date = scope.start_date
+
+        joined_rows = students.values_list('id', 'tutoring_sessions__id', 'advocacy_sessions__id').count()
+        session_rows = (TutoringService.objects.filter(student__in=students).count()
+                        + AdvocacyService.objects.filter(student__in=students).count())
+        self.stdout.write(
+            f"{len(expected)} students, {options['tutoring']} tutoring + {options['advocacy']} advocacy sessions each"
+        )
+        self.stdout.write(f"  rows aggregated before: {joined_rows} (students x tutoring x advocacy join)")
+        self.stdout.write(f"  session rows: {session_rows}")
+
+        # service_by_level covers the benchmark district; students_by_service_interval
+        # counts every student, as the chart always has
+        level_truth = float(sum(expected.values()))
+        interval_truth = [0, 0, 0, 0]
+        for hours in true_hours(start_date).values():
+            interval_truth[0 if hours < 5 else 1 if hours < 10 else 2 if hours < 20 else 3] += 1
+
+        repeat = options['repeat']
+        today = date.today()
+        self.stdout.write(f"chart engine: {settings.CHART_ENGINE}")
+        for chart_type, old_query, truth, total in [
+            ('service_by_level', lambda: hours_by_level(fanned_out_hours(students, start_date)),
+             level_truth, sum),
+            ('students_by_service_interval',
+             lambda: students_by_interval(fanned_out_hours(Student.objects.all(), start_date)),
+             interval_truth, lambda values: [int(value) for value in values]),
+        ]:
+            before_ms, before = self.best_time(repeat, old_query)
+            # Exactly what the chart API computes for this chart and filter set
+            after_ms, after = self.best_time(
+                repeat, lambda: chart_data(chart_type, [BENCHMARK_TOWN], [], '1year', today)['values'],
+            )
+            before = before.values() if isinstance(before, dict) else before
+            self.stdout.write(f"{chart_type}:")
+            self.stdout.write(f"  before: {before_ms:8.1f} ms  result {self.rounded(total(before))}")
+            self.stdout.write(f"  after:  {after_ms:8.1f} ms  result {self.rounded(total(after))}")
+            style = self.style.SUCCESS if self.rounded(total(after)) == self.rounded(truth) else self.style.ERROR
+            self.stdout.write(style(f"  expected          result {self.rounded(truth)}"))
+
+    @staticmethod
+    def rounded(value):
+        if isinstance(value, list):
+            return value
+        return round(value, 2)
@@ -0,0 +1,133 @@
+# explain_indexes.py (Django management command)
+
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+from django.utils.timezone import now
+from project.cube import month_start
+from project.models import (
+    Student, Parent, TutoringService, AdvocacyService, ServiceEvent, DailyServiceRollup, MonthlyServiceRollup,
+    DailyServedSet,
+)
+
+
+def index_checks():
+    """
+    (page, description, queryset, index names any one of which the plan should use)
+
+    The querysets mirror the hot queries of HomePageView, StudentSearchView
+    and charts_view, including the reads of the served sets (served.py), the
+    cube (cube.py) and the daily rollups behind them.
+    """
+    today = now().date()
+    last_year = today - timedelta(days=365)
+    first_month = month_start(last_year)
+    some_student = Student.objects.values_list('id', flat=True).first() or 0
+    some_town = Student.objects.values_list('town_village', flat=True).first() or ''
+    return [
+        ('home', 'students by town',
+         Student.objects.values('town_village').annotate(count=Count('id')).order_by('-count'),
+         ['student_town_grade_idx']),
+        ('home', 'students by country',
+         Student.objects.values('country_of_origin').annotate(count=Count('id')).order_by('-count'),
+         ['student_country_idx']),
+        ('home', 'students by grade',
+         Student.objects.values('current_grade').annotate(count=Count('id')).order_by('current_grade'),
+         ['student_grade_idx', 'student_town_grade_idx']),
+        ('home', 'parents by country',
+         Parent.objects.values('country_of_origin').annotate(count=Count('id')).order_by('-count'),
+         ['parent_country_idx']),
+        ('home', 'served in the last year',
+         DailyServedSet.objects.filter(date__gte=last_year).values_list('students', 'parents'),
+         ['served_set_date_idx', 'unique_served_set']),
+        ('home', 'service hours in the last year',
+         DailyServiceRollup.objects.filter(date__gte=last_year).values('service_type').annotate(hours=Sum('hours')),
+         ['rollup_date_type_idx', 'unique_daily_rollup']),
+        ('search', 'name lookup',
+         Student.objects.filter(last_name='Smith', first_name='Anna'),
+         ['student_name_idx']),
+        ('search', 'district + grade filter',
+         Student.objects.filter(town_village=some_town, current_grade=5),
+         # with few rows per grade the planner may take the grade index and filter the town
+         ['student_town_grade_idx', 'student_grade_idx']),
+        ('search', 'time period filter',
+         Student.objects.filter(id__in=ServiceEvent.objects.filter(date__gte=last_year).values('student_id')),
+         ['event_date_student_idx']),
+        ('charts', 'tutoring hours in range',
+         TutoringService.objects.filter(date_of_contact__gte=last_year).values('student_id').annotate(hours=Sum('length_of_session')),
+         ['tutoring_date_idx', 'tutoring_student_date_idx']),
+        ('charts', 'advocacy hours in range',
+         AdvocacyService.objects.filter(date_of_contact__gte=last_year).values('student_id').annotate(hours=Sum('length_of_contact')),
+         ['advocacy_date_idx', 'advocacy_student_date_idx']),
+        ('charts', 'served by district in range',
+         DailyServedSet.objects.filter(date__gte=last_year, date__lte=today, district__in=[some_town])
+         .values_list('district', 'students', 'parents'),
+         ['served_set_date_idx', 'unique_served_set']),
+        ('charts', 'cube hours by district',
+         MonthlyServiceRollup.objects.filter(month__gte=first_month, month__lt=month_start(today))
+         .values('district').annotate(hours=Sum('hours'), sessions=Sum('sessions')).order_by(),
+         ['cube_month_type_idx', 'unique_cube_cell']),
+        ('charts', 'cube filtered by service type, district and level',
+         MonthlyServiceRollup.objects.filter(month__gte=first_month, service_type__in=[MonthlyServiceRollup.TUTORING],
+                                             district__in=[some_town], school_level__in=['High School'])
+         .values('school_level').annotate(hours=Sum('hours'), sessions=Sum('sessions')).order_by(),
+         ['cube_month_type_idx', 'unique_cube_cell']),
+        ('charts', 'district filter',
+         Student.objects.filter(town_village__in=[some_town]),
+         ['student_town_grade_idx']),
+        ('charts', 'service hours by district',
+         ServiceEvent.objects.filter(date__gte=last_year).values('student__town_village').annotate(hours=Sum('hours')),
+         # the planner may drive this from the student side and use the FK index instead
+         ['event_date_student_idx', 'project_serviceevent_student_id']),
+        ('detail', 'sessions for one student',
+         TutoringService.objects.filter(student_id=some_student).order_by('-date_of_contact'),
+         ['tutoring_student_date_idx']),
+        ('detail', 'advocacy for one student',
+         AdvocacyService.objects.filter(student_id=some_student).order_by('-date_of_contact'),
+         ['advocacy_student_date_idx']),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot home/search/chart queries and check that they use the project indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force-index', action='store_true',
+            help='On PostgreSQL, disable sequential scans so small tables still show whether an index is usable',
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan for every query')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Unsupported database backend: {vendor}")
+
+        if options['force_index'] and vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+        self.stdout.write(f"Checking index usage on {vendor}")
+        misses = 0
+        for page, description, queryset, expected in index_checks():
+            plan = queryset.explain()
+            started = time.perf_counter()
+            list(queryset)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            used = [name for name in expected if name in plan]
+            label = f"[{page}] {description} ({elapsed_ms:.1f} ms)"
+            if used:
+                self.stdout.write(self.style.SUCCESS(f"  ✓ {label}: {', '.join(used)}"))
+            else:
+                misses += 1
+                self.stdout.write(self.style.WARNING(f"  ✗ {label}: expected one of {', '.join(expected)}"))
+            if options['verbose_plans'] or not used:
+                for line in plan.splitlines():
+                    self.stdout.write(f"      {line}")
+
+        if misses:
+            raise CommandError(f"{misses} queries did not use the expected index")
+        self.stdout.write(self.style.SUCCESS("All queries use their indexes."))
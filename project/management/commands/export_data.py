@@ -0,0 +1,48 @@
+# export_data.py (Django management command)
+
+from django.core.management.base import BaseCommand, CommandError
+from project.exports import EXPORTS, EXPORT_FORMATS, export_chunks, parquet_available
+from project.search import filter_students
+
+class Command(BaseCommand):
+    help = 'Write students, parents, tutoring or advocacy sessions to CSV or Parquet, with the student search filters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='File to write (CSV goes to stdout if omitted)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        # Same names as the student search page's GET parameters
+        parser.add_argument('--search-name', default='')
+        parser.add_argument('--town-village', default='')
+        parser.add_argument('--country-of-origin', default='')
+        parser.add_argument('--current-grade', default='')
+        parser.add_argument('--time-period', default='', choices=['', '2_weeks', '6_months', '1_year'])
+        parser.add_argument('--subject', default='', help='Only students tutored in this subject')
+
+    def handle(self, *args, **options):
+        if options['format'] == 'parquet':
+            if not parquet_available():
+                raise CommandError("Parquet export needs pyarrow (pip install pyarrow)")
+            if not options['output']:
+                raise CommandError("Parquet export needs --output")
+
+        params = {
+            name: options[name]
+            for name in ('search_name', 'town_village', 'country_of_origin', 'current_grade', 'time_period', 'subject')
+        }
+        chunks = export_chunks(EXPORTS[options['export']], filter_students(params), options['format'], options['chunk_size'])
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        if options['format'] == 'parquet':
+            out = open(options['output'], 'wb')
+        else:
+            out = open(options['output'], 'w', newline='', encoding='utf-8')
+        with out:
+            for chunk in chunks:
+                out.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"  ✓ {options['export']} written to {options['output']}"))
@@ -0,0 +1,77 @@
+# import_forms.py (Django management command)
+
+import csv
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from project.importer import FormsImporter, parse_pool
+
+class Command(BaseCommand):
+    help = 'Import a Google Forms CSV export (intake, tutoring and advocacy rows) in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows written per bulk INSERT batch')
+        parser.add_argument('--single-transaction', action='store_true',
+                            help='Roll back the whole file if any chunk fails, instead of committing per chunk')
+        parser.add_argument('--fast', action='store_true',
+                            help='Load with COPY (PostgreSQL) or executemany (SQLite) in one transaction, for large backfills')
+        parser.add_argument('--parse-workers', type=int, default=0,
+                            help='Parse and validate chunks in this many worker processes (0 parses in this process)')
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help="Don't refresh the service ledger, rollups, cube and served sets afterwards (run rebuild_rollups later)")
+        parser.add_argument('--source', default='forms',
+                            help='Name the export is tracked under, for skipping rows imported before')
+        parser.add_argument('--incremental', action='store_true',
+                            help="Skip rows submitted before the source's watermark without checking them")
+        parser.add_argument('--rejects', metavar='CSV',
+                            help='Write rows that fail validation (bad dates, grades or lengths) to this file, with the reason')
+        parser.add_argument('--report', metavar='CSV',
+                            help='Write contact rows whose student was not found or ambiguous to this file')
+        parser.add_argument('--warm-caches', action='store_true',
+                            help='Run warm_caches afterwards, so the home page and charts are ready for the new data')
+
+    def handle(self, *args, **options):
+        pool = parse_pool(options['parse_workers']) if options['parse_workers'] > 0 else None
+        importer = FormsImporter(
+            chunk_size=options['chunk_size'],
+            single_transaction=options['single_transaction'],
+            rebuild_derived=not options['skip_rebuild'],
+            rejects_path=options['rejects'],
+            source=options['source'],
+            incremental=options['incremental'],
+            fast=options['fast'],
+            parse_pool=pool,
+            parse_ahead=2 * max(options['parse_workers'], 1),
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(f"Importing {options['csv_file']}...")
+        try:
+            stats = importer.run(options['csv_file'])
+        except OSError as e:
+            raise CommandError(f"Can't read {options['csv_file']}: {e}")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f"  ✓ {stats}"))
+        if importer.source.watermark:
+            self.stdout.write(f"    {importer.source.name} watermark: {timezone.localtime(importer.source.watermark):%Y-%m-%d %H:%M:%S}")
+
+        if stats.rejected and options['rejects']:
+            self.stdout.write(f"    rejected rows written to {options['rejects']}")
+        if stats.unresolved:
+            self.stdout.write(self.style.WARNING(f"  ! {len(stats.unresolved)} contact rows didn't match exactly one student"))
+            if options['report']:
+                self.write_report(options['report'], stats.unresolved)
+                self.stdout.write(f"    listed in {options['report']}")
+
+        if options['warm_caches']:
+            call_command('warm_caches', stdout=self.stdout, verbosity=options['verbosity'])
+
+    def write_report(self, path, unresolved):
+        with open(path, 'w', newline='', encoding='utf-8') as report:
+            writer = csv.writer(report)
+            writer.writerow(['row', 'form type', 'student', 'problem', 'candidate student ids'])
+            for row, form_type, name, problem, candidates in unresolved:
+                writer.writerow([row, form_type, name, problem, ' '.join(str(pk) for pk in candidates)])
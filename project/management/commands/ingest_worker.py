@@ -0,0 +1,105 @@
+# ingest_worker.py (Django management command)
+
+import glob
+import os
+import time
+import traceback
+from datetime import datetime
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+from project.importer import FormsImporter, parse_pool
+from project.models import IngestedFile
+
+class Command(BaseCommand):
+    help = 'Watch a folder for Google Forms CSV exports and import each new one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Seconds between scans of the folder')
+        parser.add_argument('--settle', type=float, default=10,
+                            help="Seconds a file must go unmodified before it's picked up (so half-copied files are left alone)")
+        parser.add_argument('--parse-workers', type=int, default=2,
+                            help='Processes used to parse and validate chunks (0 parses in this process)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--source', default='forms')
+        parser.add_argument('--incremental', action='store_true')
+        parser.add_argument('--once', action='store_true',
+                            help='Import whatever is waiting and exit instead of watching')
+        parser.add_argument('--warm-caches', action='store_true',
+                            help='Run warm_caches after each file is imported')
+
+    def handle(self, *args, **options):
+        directory = os.path.abspath(options['directory'])
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory")
+
+        pool = parse_pool(options['parse_workers']) if options['parse_workers'] > 0 else None
+        self.stdout.write(f"Watching {directory} (every {options['interval']:g}s)")
+        try:
+            while True:
+                close_old_connections()
+                for path in self.waiting_files(directory, options['settle']):
+                    self.ingest(path, pool, options)
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping.")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def waiting_files(self, directory, settle):
+        """IngestedFile records for the settled CSVs that haven't been imported (or failed) yet."""
+        now = time.time()
+        for path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+            stat = os.stat(path)
+            if now - stat.st_mtime < settle:
+                continue
+            modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_current_timezone())
+            record, _ = IngestedFile.objects.get_or_create(path=path, size=stat.st_size, modified=modified)
+            # A file left RUNNING by a worker that died is picked up again; the
+            # importer's checkpoint lets it carry on where it stopped
+            if record.status in (IngestedFile.PENDING, IngestedFile.RUNNING):
+                yield record
+
+    def ingest(self, record, pool, options):
+        self.stdout.write(f"Importing {os.path.basename(record.path)}...")
+        record.status = IngestedFile.RUNNING
+        record.started_at = timezone.now()
+        record.error = ''
+        record.save()
+
+        importer = FormsImporter(
+            chunk_size=options['chunk_size'],
+            source=options['source'],
+            incremental=options['incremental'],
+            parse_pool=pool,
+            parse_ahead=2 * max(options['parse_workers'], 1),
+        )
+        started = time.perf_counter()
+        try:
+            stats = importer.run(record.path)
+        except Exception:
+            # The chunks committed before the failure stay imported, and the
+            # checkpoint they left makes the next file imported under this
+            # source rebuild the derived tables (see FormsImporter)
+            record.status = IngestedFile.FAILED
+            record.error = traceback.format_exc()
+            self.stdout.write(self.style.ERROR(f"  ✗ {os.path.basename(record.path)} failed"))
+        else:
+            record.status = IngestedFile.DONE
+            record.rows = stats.rows
+            record.rejected = stats.rejected
+            record.unresolved = len(stats.unresolved)
+            record.summary = str(stats)
+            self.stdout.write(self.style.SUCCESS(f"  ✓ {stats}"))
+        record.finished_at = timezone.now()
+        record.seconds = time.perf_counter() - started
+        record.save()
+
+        if options['warm_caches'] and record.status == IngestedFile.DONE:
+            call_command('warm_caches', stdout=self.stdout, verbosity=options['verbosity'])
@@ -0,0 +1,144 @@
+# load_test.py (Django management command)
+
+import os
+import socket
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+DEFAULT_PATHS = ['/project/', '/project/search/', '/project/parent_search/', '/project/charts/']
+
+# Django's ALLOWED_HOSTS has this one for local runs
+HOST = '127.0.0.1'
+
+# (label, server command, extra environment) for --compare; {workers} and {port} are filled in
+SERVERS = [
+    ('sync (gunicorn, wsgi)', ['gunicorn', 'cs412.wsgi', '-w', '{workers}', '-b', f'{HOST}:{{port}}'], {}),
+    ('async (uvicorn workers, asgi)', [
+        'gunicorn', 'cs412.asgi:application', '-k', 'uvicorn_worker.UvicornWorker',
+        '-w', '{workers}', '-b', f'{HOST}:{{port}}',
+    ], {'ASYNC_VIEWS': '1'}),
+]
+
+
+class NoRedirects(urllib.request.HTTPRedirectHandler):
+    """Report a redirect (e.g. to the login page) as the response itself, which then counts as a failure."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+OPENER = urllib.request.build_opener(NoRedirects)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Hit the home, search and charts pages with concurrent requests and report throughput and latency. '
+        'With --compare, start the sync (WSGI) and async (ASGI, uvicorn workers) servers in turn with the '
+        'same worker count and run the same load against each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', help='A running server to test, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--compare', action='store_true', help='Start and compare the sync and async servers')
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes for --compare (default 2)')
+        parser.add_argument('--path', action='append', dest='paths', help=f'Page to request (default {DEFAULT_PATHS})')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per run (default 200)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once (default 16)')
+        parser.add_argument('--username', help='Log in as this user (default: the first superuser)')
+
+    def handle(self, *args, **options):
+        if not options['base_url'] and not options['compare']:
+            raise CommandError("Give --base-url or --compare")
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1")
+        paths = options['paths'] or DEFAULT_PATHS
+        cookie = self.session_cookie(options['username'])
+
+        if options['base_url']:
+            self.report(options['base_url'], self.run(options['base_url'].rstrip('/'), paths, cookie, options))
+            return
+        for label, command, env in SERVERS:
+            port = free_port()
+            command = [part.format(workers=options['workers'], port=port) for part in command]
+            server = subprocess.Popen(
+                command, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                base_url = f'http://{HOST}:{port}'
+                self.wait_until_up(server, base_url)
+                self.report(f"{label}, {options['workers']} workers", self.run(base_url, paths, cookie, options))
+            finally:
+                server.terminate()
+                server.wait()
+
+    def session_cookie(self, username):
+        """Cookie header for a logged-in session, so the login-only pages render instead of redirecting."""
+        users = User.objects.filter(username=username) if username else User.objects.filter(is_superuser=True)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError("No such user" if username else "No superuser to log in as; pass --username")
+        client = Client()
+        client.force_login(user)
+        return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    def wait_until_up(self, server, base_url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"Server exited with status {server.returncode}; is gunicorn/uvicorn installed?")
+            try:
+                urllib.request.urlopen(base_url + '/project/login/', timeout=1).read()
+                return
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.2)
+        raise CommandError(f"Server at {base_url} didn't come up within {timeout}s")
+
+    def fetch(self, url, cookie):
+        request = urllib.request.Request(url, headers={'Cookie': cookie})
+        started = time.perf_counter()
+        try:
+            with OPENER.open(request, timeout=60) as response:
+                response.read()
+                ok = response.status == 200
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            ok = False
+        return ok, time.perf_counter() - started
+
+    def run(self, base_url, paths, cookie, options):
+        urls = [base_url + paths[i % len(paths)] for i in range(options['requests'])]
+        # One pass over every page first, so no run pays for cold caches
+        for path in paths:
+            self.fetch(base_url + path, cookie)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(lambda url: self.fetch(url, cookie), urls))
+        return time.perf_counter() - started, results
+
+    def report(self, label, outcome):
+        elapsed, results = outcome
+        latencies = sorted(latency for _, latency in results)
+        failures = sum(1 for ok, _ in results if not ok)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(f"{label}:")
+        self.stdout.write(
+            f"  {len(results) / elapsed:7.1f} requests/s   "
+            f"latency p50 {statistics.median(latencies) * 1000:6.1f} ms  p95 {p95 * 1000:6.1f} ms"
+        )
+        if failures:
+            self.stdout.write(self.style.ERROR(f"  ! {failures} of {len(results)} requests failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"  ✓ {len(results)} requests"))
@@ -0,0 +1,29 @@
+# rebuild_rollups.py (Django management command)
+
+from django.core.management.base import BaseCommand
+from project.cube import rebuild_monthly_rollups
+from project.rollups import rebuild_daily_rollups, rebuild_service_events
+from project.served import rebuild_served_sets
+
+class Command(BaseCommand):
+    help = 'Rebuild the service ledger, daily rollup, served set and monthly cube tables from the tutoring and advocacy tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding service ledger...")
+        written = rebuild_service_events(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"  ✓ {written} service events written"))
+
+        self.stdout.write("Rebuilding daily service rollups...")
+        written = rebuild_daily_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"  ✓ {written} rollup rows written"))
+
+        self.stdout.write("Rebuilding monthly service cube...")
+        written = rebuild_monthly_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"  ✓ {written} cube rows written"))
+
+        self.stdout.write("Rebuilding daily served sets...")
+        written = rebuild_served_sets(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"  ✓ {written} served sets written"))
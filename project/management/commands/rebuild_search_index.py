@@ -0,0 +1,16 @@
+# rebuild_search_index.py (Django management command)
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from project.search import install_name_search
+
+class Command(BaseCommand):
+    help = 'Create (or repair) the name search index: pg_trgm on PostgreSQL, FTS5 + triggers on SQLite'
+
+    def handle(self, *args, **kwargs):
+        if install_name_search(connection):
+            self.stdout.write(self.style.SUCCESS(f"Name search index ready on {connection.vendor}."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"Name search index not available on {connection.vendor}; search falls back to icontains."
+            ))
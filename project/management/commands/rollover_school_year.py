@@ -0,0 +1,45 @@
+# rollover_school_year.py (Django management command)
+
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from project.caching import bump_data_version
+from project.cube import rebuild_monthly_rollups
+from project.facets import invalidate_facets
+from project.grades import PROMOTED_GRADES, promote_students, school_year_of
+from project.models import Student, GradeRollover
+from project.served import rebuild_served_sets
+
+
+class Command(BaseCommand):
+    help = (
+        'Promote every K-12 student one grade for the new school year, in one UPDATE. '
+        'Run once on or soon after July 1; sessions keep the grade they were stamped with.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school-year', type=int,
+            help='School year being started, by its first calendar year (default: the current one)',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many students would move up')
+
+    def handle(self, *args, **options):
+        school_year = options['school_year'] or school_year_of(date.today())
+        label = f"{school_year}-{school_year + 1}"
+
+        previous = GradeRollover.objects.filter(school_year=school_year).first()
+        if previous:
+            raise CommandError(f"Grades were already rolled over for {label} on {previous.created:%Y-%m-%d}")
+
+        if options['dry_run']:
+            count = Student.objects.filter(current_grade__range=PROMOTED_GRADES).count()
+            self.stdout.write(f"{count} students would be promoted for {label}")
+            return
+
+        promoted = promote_students(school_year)
+        # update() skips the save signals; the cube's and served sets' school levels follow current grades
+        rebuild_monthly_rollups()
+        rebuild_served_sets()
+        bump_data_version()
+        invalidate_facets(Student)
+        self.stdout.write(self.style.SUCCESS(f"  ✓ {promoted} students promoted for {label}"))
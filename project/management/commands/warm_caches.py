@@ -0,0 +1,105 @@
+# warm_caches.py (Django management command)
+
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.timezone import now
+from project.caching import CHART_CACHE_TIMEOUT, TIME_RANGES, cache_is_shared, chart_cache_key, data_version, home_cache_key
+from project.charts import CHART_TYPES, chart_data
+from project.facets import facet_counts
+from project.models import Student
+from project.views import home_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Precompute the home page statistics and every chart for each time range, unfiltered and for each '
+        'single school district, into the cache. Run it after an import (see import_forms --warm-caches) so '
+        'the first visitors find them ready.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Entries computed at once, each on its own thread and database connection (default 4)')
+        parser.add_argument('--force', action='store_true',
+                            help='Recompute entries that are already cached for the current data version')
+        parser.add_argument('--slowest', type=int, default=10,
+                            help='How many of the most expensive entries to list at the end (default 10)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+        if not cache_is_shared():
+            self.stdout.write(self.style.WARNING(
+                "  ! The cache is in-memory and per process, so the web workers won't see these entries; "
+                "set CACHE_TABLE (and run createcachetable) to share it"
+            ))
+
+        entries = self.entries(options['force'])
+        if not entries:
+            self.stdout.write(self.style.SUCCESS("  ✓ Everything is already cached"))
+            return
+
+        workers = min(options['workers'], len(entries))
+        self.stdout.write(f"Warming {len(entries)} cache entries on {workers} threads...")
+        pending, timings = deque(entries), []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(self.warm_in_thread, pending, timings) for _ in range(workers)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        computing = sum(seconds for _, seconds in timings)
+        self.stdout.write(self.style.SUCCESS(
+            f"  ✓ {len(timings)} entries cached in {elapsed:.1f}s ({computing:.1f}s of computing)"
+        ))
+        if options['slowest'] > 0:
+            self.stdout.write("Most expensive:")
+            for label, seconds in sorted(timings, key=lambda timing: timing[1], reverse=True)[:options['slowest']]:
+                self.stdout.write(f"  {seconds * 1000:8.1f} ms  {label}")
+
+    def entries(self, force):
+        """(label, cache key, compute) for each entry to warm, skipping those already cached unless force."""
+        today = date.today()
+        entries = []
+        if cache_is_shared():
+            # The home page doesn't use a per-process cache
+            home_today = now().date()
+            entries.append(('home', home_cache_key(home_today), lambda: home_stats(home_today)))
+
+        version = data_version()
+        districts = [[]] + [[town] for town, _ in facet_counts(Student, 'town_village')]
+        for time_range in ('all',) + TIME_RANGES:
+            for towns in districts:
+                for chart_type in CHART_TYPES:
+                    label = f"{chart_type} {time_range} {towns[0] if towns else 'all districts'}"
+                    key = chart_cache_key(chart_type, towns, [], time_range, today, version=version)
+                    compute = (lambda chart_type=chart_type, towns=towns, time_range=time_range:
+                               chart_data(chart_type, towns, [], time_range, today))
+                    entries.append((label, key, compute))
+
+        if force:
+            return entries
+        cached = cache.get_many([key for _, key, _ in entries])
+        return [entry for entry in entries if entry[1] not in cached]
+
+    def warm_in_thread(self, pending, timings):
+        """Compute and cache entries until none are left; one database connection per thread."""
+        try:
+            while True:
+                try:
+                    label, key, compute = pending.popleft()
+                except IndexError:
+                    return
+                started = time.perf_counter()
+                value = compute()
+                seconds = time.perf_counter() - started
+                cache.set(key, value, CHART_CACHE_TIMEOUT)
+                timings.append((label, seconds))
+                self.stdout.write(f"  {seconds * 1000:8.1f} ms  {label}")
+        finally:
+            connections.close_all()
@@ -0,0 +1,37 @@
+# File: middleware.py
+# Description: WhiteNoise static file serving that also runs in an async middleware chain
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise, marked async capable.
+
+    One sync-only middleware makes Django run every request on a thread
+    under ASGI, which would undo the async views. Looking a path up in
+    WhiteNoise's file index is a dict lookup (unless autorefresh, a
+    development setting, is on), so it is safe to do on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
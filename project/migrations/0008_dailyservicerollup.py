@@ -0,0 +1,55 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    DailyServiceRollup = apps.get_model('project', 'DailyServiceRollup')
+    sources = [
+        ('tutoring', apps.get_model('project', 'TutoringService'), 'length_of_session'),
+        ('advocacy', apps.get_model('project', 'AdvocacyService'), 'length_of_contact'),
+    ]
+    for service_type, source, hours_field in sources:
+        cells = (
+            source.objects.values('date_of_contact', 'student_id', 'student__parent_id')
+            .annotate(hours=Sum(hours_field), sessions=Count('id'))
+            .order_by()
+        )
+        DailyServiceRollup.objects.bulk_create(
+            [
+                DailyServiceRollup(date=cell['date_of_contact'], student_id=cell['student_id'],
+                                   parent_id=cell['student__parent_id'], service_type=service_type,
+                                   hours=cell['hours'] or 0, sessions=cell['sessions'])
+                for cell in cells.iterator()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0007_alter_student_current_grade_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyServiceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('service_type', models.CharField(choices=[('tutoring', 'Tutoring'), ('advocacy', 'Advocacy')], max_length=10)),
+                ('hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('sessions', models.IntegerField(default=0)),
+                ('parent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='project.parent')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='project.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'service_type'], name='rollup_date_type_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'student', 'service_type'), name='unique_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
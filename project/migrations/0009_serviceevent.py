@@ -0,0 +1,49 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_service_events(apps, schema_editor):
+    ServiceEvent = apps.get_model('project', 'ServiceEvent')
+    sources = [
+        ('tutoring', apps.get_model('project', 'TutoringService'), 'length_of_session'),
+        ('advocacy', apps.get_model('project', 'AdvocacyService'), 'length_of_contact'),
+    ]
+    for service_type, source, hours_field in sources:
+        rows = source.objects.values_list('id', 'student_id', 'student__parent_id', 'date_of_contact', hours_field)
+        ServiceEvent.objects.bulk_create(
+            [
+                ServiceEvent(service_type=service_type, service_id=service_id, student_id=student_id,
+                             parent_id=parent_id, date=day, hours=hours)
+                for service_id, student_id, parent_id, day, hours in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0008_dailyservicerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service_type', models.CharField(choices=[('tutoring', 'Tutoring'), ('advocacy', 'Advocacy')], max_length=10)),
+                ('service_id', models.BigIntegerField()),
+                ('date', models.DateField()),
+                ('hours', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('parent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='service_events', to='project.parent')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='service_events', to='project.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'student'], name='event_date_student_idx')],
+                'constraints': [models.UniqueConstraint(fields=('service_type', 'service_id'), name='unique_service_event')],
+            },
+        ),
+        migrations.RunPython(backfill_service_events, migrations.RunPython.noop),
+    ]
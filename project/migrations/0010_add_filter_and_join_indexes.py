@@ -0,0 +1,57 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0009_serviceevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='advocacyservice',
+            index=models.Index(fields=['student', 'date_of_contact'], name='advocacy_student_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advocacyservice',
+            index=models.Index(fields=['date_of_contact'], name='advocacy_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parent',
+            index=models.Index(fields=['last_name', 'first_name'], name='parent_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parent',
+            index=models.Index(fields=['town_village'], name='parent_town_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parent',
+            index=models.Index(fields=['country_of_origin'], name='parent_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['last_name', 'first_name'], name='student_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['town_village', 'current_grade'], name='student_town_grade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['country_of_origin'], name='student_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['current_grade'], name='student_grade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tutoringservice',
+            index=models.Index(fields=['student', 'date_of_contact'], name='tutoring_student_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tutoringservice',
+            index=models.Index(fields=['date_of_contact'], name='tutoring_date_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from project.search import install_name_search, uninstall_name_search
+
+
+def install(apps, schema_editor):
+    install_name_search(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_name_search(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0010_add_filter_and_join_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0011_name_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+                ('checkpoint_file', models.CharField(blank=True, max_length=500)),
+                ('checkpoint_row', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImportedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='project.importsource')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'fingerprint'), name='unique_imported_row')],
+            },
+        ),
+    ]
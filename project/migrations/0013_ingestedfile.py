@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0012_import_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500)),
+                ('size', models.BigIntegerField()),
+                ('modified', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('rows', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+                ('unresolved', models.IntegerField(default=0)),
+                ('summary', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('seconds', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('path', 'size', 'modified'), name='unique_ingested_file')],
+            },
+        ),
+    ]
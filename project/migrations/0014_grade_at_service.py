@@ -0,0 +1,72 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:25
+
+from datetime import date
+from django.db import migrations, models
+from django.db.models import Case, OuterRef, Subquery, Value, When
+from django.db.models.functions import ExtractYear
+
+
+def school_year_of(day):
+    return day.year if day.month >= 7 else day.year - 1
+
+
+def backfill_grades(apps, schema_editor):
+    Student = apps.get_model('project', 'Student')
+    school_year = Case(
+        When(date_of_contact__month__gte=7, then=ExtractYear('date_of_contact')),
+        default=ExtractYear('date_of_contact') - 1,
+    )
+    current_grade = Subquery(Student.objects.filter(pk=OuterRef('student_id')).values('current_grade')[:1])
+    for model_name in ('TutoringService', 'AdvocacyService'):
+        apps.get_model('project', model_name).objects.update(
+            school_year=school_year,
+            grade_at_service=current_grade - (Value(school_year_of(date.today())) - school_year),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0013_ingestedfile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeRollover',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('school_year', models.IntegerField(unique=True)),
+                ('students', models.IntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='advocacyservice',
+            name='grade_at_service',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='advocacyservice',
+            name='school_year',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tutoringservice',
+            name='grade_at_service',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tutoringservice',
+            name='school_year',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='advocacyservice',
+            index=models.Index(fields=['school_year', 'grade_at_service'], name='advocacy_year_grade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tutoringservice',
+            index=models.Index(fields=['school_year', 'grade_at_service'], name='tutoring_year_grade_idx'),
+        ),
+        migrations.RunPython(backfill_grades, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:28
+
+import re
+from django.db import migrations, models
+
+
+def subject_names(session_focus):
+    if not session_focus:
+        return []
+    names = [part.strip().capitalize() for part in re.split(r'[/,]\s*', session_focus) if part.strip()]
+    return list(dict.fromkeys(names))
+
+
+def backfill_subjects(apps, schema_editor):
+    Subject = apps.get_model('project', 'Subject')
+    TutoringService = apps.get_model('project', 'TutoringService')
+    SubjectLink = TutoringService.subjects.through
+    pairs = [
+        (session_id, name)
+        for session_id, focus in TutoringService.objects.values_list('id', 'session_focus').iterator()
+        for name in subject_names(focus)
+    ]
+    Subject.objects.bulk_create([Subject(name=name) for name in dict.fromkeys(name for _, name in pairs)])
+    ids = dict(Subject.objects.values_list('name', 'id'))
+    SubjectLink.objects.bulk_create(
+        [SubjectLink(tutoringservice_id=session_id, subject_id=ids[name]) for session_id, name in pairs],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0014_grade_at_service'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Subject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tutoringservice',
+            name='subjects',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='tutoring_sessions', to='project.subject'),
+        ),
+        migrations.RunPython(backfill_subjects, migrations.RunPython.noop),
+    ]
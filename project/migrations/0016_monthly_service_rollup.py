@@ -0,0 +1,71 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:31
+
+from django.db import migrations, models
+from django.db.models import Case, CharField, Count, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+
+def backfill_monthly_rollups(apps, schema_editor):
+    MonthlyServiceRollup = apps.get_model('project', 'MonthlyServiceRollup')
+    sources = [
+        ('tutoring', apps.get_model('project', 'TutoringService'), 'length_of_session'),
+        ('advocacy', apps.get_model('project', 'AdvocacyService'), 'length_of_contact'),
+    ]
+    school_level = Case(
+        When(student__current_grade__gte=9, then=Value('High School')),
+        When(student__current_grade__lt=9, student__current_grade__gte=4, then=Value('Middle School')),
+        When(student__current_grade__lt=4, then=Value('Elementary')),
+        default=Value('Unknown'),
+        output_field=CharField(),
+    )
+    for service_type, source, hours_field in sources:
+        cells = (
+            source.objects.annotate(month=TruncMonth('date_of_contact'), school_level=school_level)
+            .values('month', 'student__town_village', 'school_level', 'student__country_of_origin',
+                    'student__parent__country_of_origin', 'grade_at_service')
+            .annotate(total_hours=Sum(hours_field), session_count=Count('id'),
+                      student_count=Count('student_id', distinct=True))
+            .order_by()
+        )
+        MonthlyServiceRollup.objects.bulk_create(
+            [
+                MonthlyServiceRollup(
+                    month=cell['month'], service_type=service_type, district=cell['student__town_village'],
+                    school_level=cell['school_level'], student_country=cell['student__country_of_origin'],
+                    parent_country=cell['student__parent__country_of_origin'], grade=cell['grade_at_service'],
+                    hours=cell['total_hours'] or 0, sessions=cell['session_count'], students=cell['student_count'],
+                )
+                for cell in cells.iterator()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0015_subject'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyServiceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('service_type', models.CharField(choices=[('tutoring', 'Tutoring'), ('advocacy', 'Advocacy')], max_length=10)),
+                ('district', models.CharField(blank=True, max_length=100, null=True)),
+                ('school_level', models.CharField(max_length=20)),
+                ('student_country', models.CharField(blank=True, max_length=100, null=True)),
+                ('parent_country', models.CharField(blank=True, max_length=100, null=True)),
+                ('grade', models.IntegerField(blank=True, null=True)),
+                ('hours', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('sessions', models.IntegerField(default=0)),
+                ('students', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'service_type'], name='cube_month_type_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_monthly_rollups, migrations.RunPython.noop),
+    ]
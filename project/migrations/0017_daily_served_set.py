@@ -0,0 +1,66 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:35
+
+import numpy as np
+from django.db import migrations, models
+from django.db.models import Case, CharField, Value, When
+
+
+def pack_ids(ids):
+    return np.unique(np.asarray(list(ids), dtype='<i8')).tobytes()
+
+
+def backfill_served_sets(apps, schema_editor):
+    DailyServedSet = apps.get_model('project', 'DailyServedSet')
+    ServiceEvent = apps.get_model('project', 'ServiceEvent')
+    school_level = Case(
+        When(student__current_grade__gte=9, then=Value('High School')),
+        When(student__current_grade__lt=9, student__current_grade__gte=4, then=Value('Middle School')),
+        When(student__current_grade__lt=4, then=Value('Elementary')),
+        default=Value('Unknown'),
+        output_field=CharField(),
+    )
+    rows = ServiceEvent.objects.annotate(school_level=school_level).values_list(
+        'date', 'student__town_village', 'school_level', 'student__country_of_origin',
+        'student__parent__country_of_origin', 'student_id', 'student__parent_id',
+    ).distinct()
+    cells = {}
+    for day, district, level, student_country, parent_country, student_id, parent_id in rows.iterator():
+        students, parents = cells.setdefault((day, district, level, student_country, parent_country), (set(), set()))
+        students.add(student_id)
+        if parent_id is not None:
+            parents.add(parent_id)
+    DailyServedSet.objects.bulk_create(
+        [
+            DailyServedSet(date=day, district=district, school_level=level, student_country=student_country,
+                           parent_country=parent_country, students=pack_ids(students), parents=pack_ids(parents))
+            for (day, district, level, student_country, parent_country), (students, parents) in cells.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0016_monthly_service_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyServedSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('district', models.CharField(blank=True, max_length=100, null=True)),
+                ('school_level', models.CharField(max_length=20)),
+                ('student_country', models.CharField(blank=True, max_length=100, null=True)),
+                ('parent_country', models.CharField(blank=True, max_length=100, null=True)),
+                ('students', models.BinaryField()),
+                ('parents', models.BinaryField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='served_set_date_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_served_sets, migrations.RunPython.noop),
+    ]
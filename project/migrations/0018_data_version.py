@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    apps.get_model('project', 'DataVersion').objects.create(pk=1, version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0017_daily_served_set'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0018_data_version'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='monthlyservicerollup',
+            constraint=models.UniqueConstraint(fields=('month', 'service_type', 'district', 'school_level', 'student_country', 'parent_country', 'grade'), name='unique_cube_cell', nulls_distinct=False),
+        ),
+    ]
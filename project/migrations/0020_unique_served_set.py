@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0019_unique_cube_cell'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='dailyservedset',
+            constraint=models.UniqueConstraint(fields=('date', 'district', 'school_level', 'student_country', 'parent_country'), name='unique_served_set', nulls_distinct=False),
+        ),
+    ]
@@ -3,6 +3,7 @@
 # Description: All the database models for the project
 from django.db import models
 import csv
+import os
 from datetime import datetime
 #from .models import Parent, Student, TutoringService, AdvocacyService
 
@@ -16,6 +17,13 @@ class Parent(models.Model):
     town_village = models.CharField(max_length=100, null=True, blank=True)
     country_of_origin = models.CharField(max_length=100, default="None", null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='parent_name_idx'),
+            models.Index(fields=['town_village'], name='parent_town_idx'),
+            models.Index(fields=['country_of_origin'], name='parent_country_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
@@ -31,10 +39,25 @@ class Student(models.Model):
     country_of_origin = models.CharField(max_length=100, default="None", null=True, blank=True)
     date_of_intake = models.DateField(null=True, blank=True)
     parent = models.ForeignKey(Parent, on_delete=models.CASCADE, related_name="children")
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='student_name_idx'),
+            models.Index(fields=['town_village', 'current_grade'], name='student_town_grade_idx'),
+            models.Index(fields=['country_of_origin'], name='student_country_idx'),
+            models.Index(fields=['current_grade'], name='student_grade_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+class Subject(models.Model):
+    """A subject tutored, normalized from the free-text session focus (see subjects.py)."""
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
 class TutoringService(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="tutoring_sessions")
     date_of_contact = models.DateField()
@@ -42,6 +65,18 @@ class TutoringService(models.Model):
     session_focus = models.CharField(max_length=100)
     activity = models.TextField()
     length_of_session = models.DecimalField(max_digits=4, decimal_places=2)
+    # Derived from session_focus whenever the session is saved, so not edited directly
+    subjects = models.ManyToManyField(Subject, related_name="tutoring_sessions", blank=True, editable=False)
+    # Stamped when the session is saved (see grades.py), so later grade rollovers don't move it
+    school_year = models.IntegerField(null=True, blank=True)
+    grade_at_service = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'date_of_contact'], name='tutoring_student_date_idx'),
+            models.Index(fields=['date_of_contact'], name='tutoring_date_idx'),
+            models.Index(fields=['school_year', 'grade_at_service'], name='tutoring_year_grade_idx'),
+        ]
 
     def __str__(self):
         return f"Tutoring: {self.student.first_name} on {self.date_of_contact}"
@@ -52,10 +87,256 @@ class AdvocacyService(models.Model):
     description = models.TextField()
     date_of_contact = models.DateField()
     school_district = models.CharField(max_length=100)
+    # Stamped when the session is saved (see grades.py), so later grade rollovers don't move it
+    school_year = models.IntegerField(null=True, blank=True)
+    grade_at_service = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'date_of_contact'], name='advocacy_student_date_idx'),
+            models.Index(fields=['date_of_contact'], name='advocacy_date_idx'),
+            models.Index(fields=['school_year', 'grade_at_service'], name='advocacy_year_grade_idx'),
+        ]
 
     def __str__(self):
         return f"Advocacy: {self.student.first_name} on {self.date_of_contact}"
 
+# Service types shared by the derived service tables below
+TUTORING = 'tutoring'
+ADVOCACY = 'advocacy'
+SERVICE_TYPES = [
+    (TUTORING, 'Tutoring'),
+    (ADVOCACY, 'Advocacy'),
+]
+
+class ServiceEvent(models.Model):
+    """
+    One row per tutoring or advocacy session, in a single table.
+
+    Lets "who was served since X" questions run as one indexed range scan
+    instead of OR-ing two reverse joins and de-duplicating. Kept in sync
+    with both service tables by the handlers in signals.py.
+    """
+    TUTORING = TUTORING
+    ADVOCACY = ADVOCACY
+
+    service_type = models.CharField(max_length=10, choices=SERVICE_TYPES)
+    service_id = models.BigIntegerField()
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="service_events")
+    parent = models.ForeignKey(Parent, on_delete=models.CASCADE, related_name="service_events")
+    date = models.DateField()
+    hours = models.DecimalField(max_digits=4, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service_type', 'service_id'], name='unique_service_event'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'student'], name='event_date_student_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_service_type_display()}: {self.student_id} on {self.date}"
+
+class DailyServiceRollup(models.Model):
+    """
+    Hours and session counts per student, day and service type.
+
+    Kept current by the signal handlers in signals.py and rebuilt from
+    scratch by the rebuild_rollups management command.
+    """
+    TUTORING = TUTORING
+    ADVOCACY = ADVOCACY
+
+    date = models.DateField()
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="daily_rollups")
+    parent = models.ForeignKey(Parent, on_delete=models.CASCADE, related_name="daily_rollups")
+    service_type = models.CharField(max_length=10, choices=SERVICE_TYPES)
+    hours = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    sessions = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'student', 'service_type'], name='unique_daily_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'service_type'], name='rollup_date_type_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_service_type_display()}: {self.student_id} on {self.date} ({self.hours} hrs)"
+
+
+class MonthlyServiceRollup(models.Model):
+    """
+    Hours, sessions and distinct students per month, service type and
+    combination of the chart dimensions: the student's district, school level
+    and country, the parent's country and the grade at service.
+
+    Each month is recomputed from the session tables whenever a write touches
+    it (see cube.py), and rebuilt from scratch by rebuild_rollups.
+    """
+    TUTORING = TUTORING
+    ADVOCACY = ADVOCACY
+
+    month = models.DateField()  # first day of the month
+    service_type = models.CharField(max_length=10, choices=SERVICE_TYPES)
+    district = models.CharField(max_length=100, null=True, blank=True)
+    school_level = models.CharField(max_length=20)
+    student_country = models.CharField(max_length=100, null=True, blank=True)
+    parent_country = models.CharField(max_length=100, null=True, blank=True)
+    grade = models.IntegerField(null=True, blank=True)
+    hours = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    sessions = models.IntegerField(default=0)
+    # Distinct within this cell only; counts of different cells can't be added up
+    students = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # One row per cell, a missing district/country/grade included. SQLite
+            # can't enforce NULLS NOT DISTINCT, so it skips this (check models.W047);
+            # refreshes delete and reinsert a month's rows rather than upserting,
+            # so nothing relies on it there.
+            models.UniqueConstraint(
+                fields=['month', 'service_type', 'district', 'school_level', 'student_country', 'parent_country', 'grade'],
+                name='unique_cube_cell', nulls_distinct=False,
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['month', 'service_type'], name='cube_month_type_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_service_type_display()}: {self.month:%Y-%m} {self.district} ({self.hours} hrs)"
+
+
+class DailyServedSet(models.Model):
+    """
+    The ids of the students and families served on one day, per combination
+    of the student's district, school level and country and the parent's
+    country.
+
+    Each set is a sorted array of ids (see served.py), so the distinct
+    students or families served over any window and filter are the union of
+    that window's sets. Kept current by the signal handlers in signals.py and
+    rebuilt from scratch by rebuild_rollups.
+    """
+    date = models.DateField()
+    district = models.CharField(max_length=100, null=True, blank=True)
+    school_level = models.CharField(max_length=20)
+    student_country = models.CharField(max_length=100, null=True, blank=True)
+    parent_country = models.CharField(max_length=100, null=True, blank=True)
+    students = models.BinaryField()
+    parents = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            # One set per day and combination, a missing district or country included.
+            # SQLite skips this (see MonthlyServiceRollup); refreshes delete and
+            # reinsert a day's sets, so nothing relies on it there.
+            models.UniqueConstraint(
+                fields=['date', 'district', 'school_level', 'student_country', 'parent_country'],
+                name='unique_served_set', nulls_distinct=False,
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='served_set_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Served on {self.date}: {self.district} / {self.school_level}"
+
+
+class ImportSource(models.Model):
+    """
+    Progress of imports from one form export (see importer.py).
+
+    watermark is the latest form Timestamp imported so far; checkpoint_file
+    and checkpoint_row record how far an unfinished import got, so a rerun
+    after a crash picks up from there.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+    checkpoint_file = models.CharField(max_length=500, blank=True)
+    checkpoint_row = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} (up to {self.watermark})"
+
+
+class ImportedRow(models.Model):
+    """Fingerprint of one form row already written to the database, so reimports skip it."""
+    source = models.ForeignKey(ImportSource, on_delete=models.CASCADE, related_name="rows")
+    fingerprint = models.CharField(max_length=40)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'fingerprint'], name='unique_imported_row'),
+        ]
+
+    def __str__(self):
+        return f"{self.source.name}: {self.fingerprint}"
+
+
+class IngestedFile(models.Model):
+    """A CSV export picked up from the drop folder by the ingest_worker command."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    path = models.CharField(max_length=500)
+    size = models.BigIntegerField()
+    modified = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    rows = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    unresolved = models.IntegerField(default=0)
+    summary = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    seconds = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # The same path with a new size or mtime is a new export
+            models.UniqueConstraint(fields=['path', 'size', 'modified'], name='unique_ingested_file'),
+        ]
+
+    def __str__(self):
+        return f"{os.path.basename(self.path)} ({self.get_status_display()})"
+
+
+class GradeRollover(models.Model):
+    """A school year whose grade promotion has been applied (see the rollover_school_year command)."""
+    school_year = models.IntegerField(unique=True)
+    students = models.IntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.school_year}-{self.school_year + 1}: {self.students} students promoted"
+
+
+class DataVersion(models.Model):
+    """
+    A single row whose version goes up on every write to the students,
+    parents or services (see caching.py). Kept in the database so every
+    worker process and management command sees the same version.
+    """
+    version = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"Data version {self.version}"
+
 
 def load_data(file_path):
     """
@@ -193,4 +474,3 @@ def parse_date(date_str):
         return datetime.strptime(date_str, '%m/%d/%Y').date()
     except (ValueError, TypeError):
         return None
-
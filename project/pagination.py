@@ -0,0 +1,180 @@
+# File: pagination.py
+# Description: Opt-in keyset (cursor) pagination for the student and parent search views
+
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+# Cap on the row count used for the "about N results" line when the database
+# can't give us a planner estimate
+COUNT_CAP = 1000
+
+
+def encode_cursor(values, direction):
+    """Pack a row's ordering key and a direction ('next'/'prev') into an opaque URL-safe token."""
+    raw = json.dumps([direction, values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor. Returns (None, None) for a missing or mangled token."""
+    if not token:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None, None
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return None, None
+    return direction, values
+
+
+def estimate_count(queryset):
+    """
+    A cheap stand-in for queryset.count().
+
+    On PostgreSQL this is the planner's row estimate; elsewhere it counts at
+    most COUNT_CAP + 1 rows, so the result means "more than COUNT_CAP" when
+    it comes back larger than that.
+    """
+    if connection.vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+    return queryset.order_by()[:COUNT_CAP + 1].count()
+
+
+class KeysetPage:
+    """Quacks enough like django.core.paginator.Page for the search templates."""
+
+    def __init__(self, object_list, next_token, previous_token, estimated_count=None):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+        self.count_is_capped = connection.vendor != 'postgresql' and estimated_count is not None and estimated_count > COUNT_CAP
+        self.estimated_count = COUNT_CAP if self.count_is_capped else estimated_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate by seeking past the last row seen instead of OFFSET, and without COUNT(*).
+
+    Rows are ordered by ordering (which must end in a unique field) so every
+    row has a distinct key. The cost of a page doesn't depend on how deep it
+    is or how many rows match.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('last_name', 'first_name', 'id'), with_estimate=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.with_estimate = with_estimate
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.ordering]
+
+    def _cursor_values(self, values):
+        """
+        A decoded cursor's values converted to their ordering fields' types,
+        or None when the token didn't come from us (wrong length or types).
+        """
+        if values is None or len(values) != len(self.ordering):
+            return None
+        converted = []
+        for field, value in zip(self.ordering, values):
+            if value is None or isinstance(value, (list, dict)):
+                return None
+            try:
+                converted.append(self.queryset.model._meta.get_field(field).to_python(value))
+            except ValidationError:
+                return None
+        return converted
+
+    def _seek(self, values, op):
+        """Rows strictly after (op='gt') or before (op='lt') values in ordering."""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            step = Q(**{f"{field}__{op}": values[i]})
+            for earlier, value in zip(self.ordering[:i], values[:i]):
+                step &= Q(**{earlier: value})
+            condition |= step
+        return condition
+
+    def page(self, token=None):
+        direction, values = decode_cursor(token)
+        values = self._cursor_values(values)
+        if values is None:
+            # Missing or tampered with: start from the first page
+            direction = None
+
+        queryset = self.queryset
+        if direction == 'prev':
+            queryset = queryset.filter(self._seek(values, 'lt')).order_by(*[f"-{field}" for field in self.ordering])
+        else:
+            if direction == 'next':
+                queryset = queryset.filter(self._seek(values, 'gt'))
+            queryset = queryset.order_by(*self.ordering)
+
+        # One extra row tells us whether there is another page in this direction
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            rows.reverse()
+
+        if direction == 'prev':
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, direction == 'next'
+
+        next_token = encode_cursor(self._key(rows[-1]), 'next') if rows and has_next else None
+        previous_token = encode_cursor(self._key(rows[0]), 'prev') if rows and has_previous else None
+        estimated = estimate_count(self.queryset) if self.with_estimate else None
+        return KeysetPage(rows, next_token, previous_token, estimated)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin that switches to KeysetPaginator when the request asks for ?paging=keyset.
+
+    ?cursor= carries the opaque token and ?estimate=1 adds an estimated total.
+    Without ?paging=keyset the view keeps Django's normal page-number paginator.
+    """
+    keyset_ordering = ('last_name', 'first_name', 'id')
+
+    def uses_keyset(self):
+        return self.request.GET.get('paging') == 'keyset'
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.uses_keyset():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(
+            queryset,
+            page_size,
+            ordering=self.keyset_ordering,
+            with_estimate=bool(self.request.GET.get('estimate')),
+        )
+        page = paginator.page(self.request.GET.get('cursor'))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['keyset_paging'] = self.uses_keyset()
+        return context
@@ -0,0 +1,143 @@
+# File: rollups.py
+# Description: Helpers that keep the service ledger and daily rollup tables in step with the service tables
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from .models import TutoringService, AdvocacyService, ServiceEvent, DailyServiceRollup, TUTORING, ADVOCACY
+
+# Namespaces for the advisory locks taken by lock_periods
+DAY_LOCK = 1
+MONTH_LOCK = 2
+
+# service type -> (source model, hours field)
+SERVICE_SOURCES = {
+    TUTORING: (TutoringService, 'length_of_session'),
+    ADVOCACY: (AdvocacyService, 'length_of_contact'),
+}
+
+
+def service_type_for(model):
+    """Return the rollup service type for a TutoringService/AdvocacyService class."""
+    for service_type, (source, _) in SERVICE_SOURCES.items():
+        if model is source:
+            return service_type
+    return None
+
+
+def lock_periods(namespace, days):
+    """
+    Lock each of days (dates; first days of months for MONTH_LOCK) until the
+    current transaction ends.
+
+    Refreshes delete a period's derived rows and insert them again, so two
+    running at once for the same period would both insert. The locks are
+    taken in date order, and a transaction that needs both kinds takes the
+    MONTH_LOCKs first, so two refreshes can't deadlock on them. Only
+    PostgreSQL needs this: SQLite lets one transaction write at a time.
+    """
+    days = sorted({day.toordinal() for day in days})
+    if not days or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, day) FROM unnest(%s::int[]) AS day ORDER BY day", [namespace, days],
+        )
+
+
+def _rollup_rows(service_type, sessions, batch_size):
+    """DailyServiceRollup rows for the (day, student) cells of the given sessions of one type."""
+    _, hours_field = SERVICE_SOURCES[service_type]
+    cells = (
+        sessions.values('date_of_contact', 'student_id', 'student__parent_id')
+        .annotate(hours=Sum(hours_field), sessions=Count('id'))
+        .order_by()
+    )
+    for cell in cells.iterator(chunk_size=batch_size):
+        yield DailyServiceRollup(
+            date=cell['date_of_contact'],
+            student_id=cell['student_id'],
+            parent_id=cell['student__parent_id'],
+            service_type=service_type,
+            hours=cell['hours'] or 0,
+            sessions=cell['sessions'],
+        )
+
+
+def _event_rows(service_type, sessions, batch_size):
+    """ServiceEvent rows mirroring the given sessions of one type."""
+    _, hours_field = SERVICE_SOURCES[service_type]
+    rows = sessions.values_list('id', 'student_id', 'student__parent_id', 'date_of_contact', hours_field)
+    for service_id, student_id, parent_id, day, hours in rows.iterator(chunk_size=batch_size):
+        yield ServiceEvent(
+            service_type=service_type,
+            service_id=service_id,
+            student_id=student_id,
+            parent_id=parent_id,
+            date=day,
+            hours=hours,
+        )
+
+
+def _write_batches(model, rows, batch_size):
+    """bulk_create rows batch_size at a time; returns how many were written."""
+    written = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def refresh_service_days(days, service_types=None, batch_size=1000):
+    """
+    Recompute the service ledger and daily rollup rows of the given days
+    from the service tables, for every service type or just service_types.
+    """
+    days = set(days)
+    if not days:
+        return
+    with transaction.atomic(savepoint=False):
+        lock_periods(DAY_LOCK, days)
+        for service_type in service_types or list(SERVICE_SOURCES):
+            source, _ = SERVICE_SOURCES[service_type]
+            sessions = source.objects.filter(date_of_contact__in=days)
+            ServiceEvent.objects.filter(service_type=service_type, date__in=days).delete()
+            _write_batches(ServiceEvent, _event_rows(service_type, sessions, batch_size), batch_size)
+            DailyServiceRollup.objects.filter(service_type=service_type, date__in=days).delete()
+            _write_batches(DailyServiceRollup, _rollup_rows(service_type, sessions, batch_size), batch_size)
+
+
+def rebuild_daily_rollups(batch_size=1000):
+    """
+    Throw away the rollup table and rebuild it from both service tables.
+
+    Returns the number of rollup rows written.
+    """
+    written = 0
+    with transaction.atomic():
+        DailyServiceRollup.objects.all().delete()
+        for service_type, (source, _) in SERVICE_SOURCES.items():
+            rows = _rollup_rows(service_type, source.objects.all(), batch_size)
+            written += _write_batches(DailyServiceRollup, rows, batch_size)
+    return written
+
+
+def rebuild_service_events(batch_size=1000):
+    """
+    Throw away the service ledger and rebuild it from both service tables.
+
+    Returns the number of ledger rows written.
+    """
+    written = 0
+    with transaction.atomic():
+        ServiceEvent.objects.all().delete()
+        for service_type, (source, _) in SERVICE_SOURCES.items():
+            rows = _event_rows(service_type, source.objects.all(), batch_size)
+            written += _write_batches(ServiceEvent, rows, batch_size)
+    return written
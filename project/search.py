@@ -0,0 +1,289 @@
+# File: search.py
+# Description: Indexed name search for students and parents (pg_trgm on PostgreSQL, FTS5 on SQLite)
+
+from datetime import timedelta
+from functools import lru_cache
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import CharField, F, Func, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.timezone import now
+from .models import Parent, Student, TutoringService, ServiceEvent
+
+# Tables that get a name index. Both have first_name/last_name columns.
+NAME_SEARCH_TABLES = ['project_parent', 'project_student']
+
+# Triggers (suffixes of the FTS table name) that keep a SQLite index in step with its table
+FTS_TRIGGERS = ('ai', 'ad', 'au')
+
+# The trigram tokenizer can't match anything shorter than this
+FTS_MIN_TOKEN = 3
+
+# time_period -> how far back a student must have been served
+TIME_PERIODS = {
+    '2_weeks': timedelta(weeks=2),
+    '6_months': timedelta(weeks=26),
+    '1_year': timedelta(weeks=52),
+}
+
+
+class FullName(Func):
+    """first_name || ' ' || last_name, spelled exactly like the PostgreSQL index expression."""
+    template = "(%(expressions)s)"
+    arg_joiner = " || ' ' || "
+    output_field = CharField()
+
+    def __init__(self, **extra):
+        super().__init__(F('first_name'), F('last_name'), **extra)
+
+
+class ILike(Lookup):
+    """Case-insensitive LIKE that pg_trgm GIN indexes can answer (Django's icontains wraps both sides in UPPER)."""
+    lookup_name = 'ilike'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} ILIKE {rhs}", lhs_params + rhs_params
+
+
+def _fts_table(table):
+    return f"{table}_name_fts"
+
+
+def _sqlite_objects(cursor, table):
+    """Which of the FTS table and its triggers exist for table."""
+    fts = _fts_table(table)
+    names = [fts] + [f"{fts}_{suffix}" for suffix in FTS_TRIGGERS]
+    cursor.execute(f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(names))})", names)
+    return {name for name, in cursor.fetchall()}
+
+
+def _install_sqlite(cursor, table):
+    fts = _fts_table(table)
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"first_name, last_name, content='{table}', content_rowid='id', tokenize='trigram')"
+    )
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, first_name, last_name) VALUES (new.id, new.first_name, new.last_name);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, first_name, last_name) VALUES ('delete', old.id, old.first_name, old.last_name);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF first_name, last_name ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, first_name, last_name) VALUES ('delete', old.id, old.first_name, old.last_name);
+            INSERT INTO {fts}(rowid, first_name, last_name) VALUES (new.id, new.first_name, new.last_name);
+        END
+    """)
+    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _install_postgresql(cursor, table):
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx ON {table} "
+        f"USING gin ((first_name || ' ' || last_name) gin_trgm_ops)"
+    )
+
+
+def install_name_search(conn):
+    """
+    Create the name search index for every table in NAME_SEARCH_TABLES.
+
+    Safe to run repeatedly: the SQLite triggers are dropped when Django rebuilds
+    a table during a migration, and re-running this puts them back (see
+    repair_name_search, which does so after every migrate). Returns
+    False when the database can't support the index (no FTS5 trigram
+    tokenizer, or pg_trgm not installable), in which case search_by_name
+    falls back to icontains.
+    """
+    _backend_available.cache_clear()
+    try:
+        with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+            if conn.vendor == 'sqlite':
+                for table in NAME_SEARCH_TABLES:
+                    _install_sqlite(cursor, table)
+            elif conn.vendor == 'postgresql':
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                for table in NAME_SEARCH_TABLES:
+                    _install_postgresql(cursor, table)
+            else:
+                return False
+    except DatabaseError:
+        return False
+    return True
+
+
+def uninstall_name_search(conn):
+    with conn.cursor() as cursor:
+        for table in NAME_SEARCH_TABLES:
+            if conn.vendor == 'sqlite':
+                fts = _fts_table(table)
+                for suffix in FTS_TRIGGERS:
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+            elif conn.vendor == 'postgresql':
+                cursor.execute(f"DROP INDEX IF EXISTS {table}_name_trgm_idx")
+
+
+def repair_name_search(using, **kwargs):
+    """
+    post_migrate handler: reinstall SQLite name search whose triggers a migration dropped.
+
+    Rows written while the triggers were missing aren't in the index, so
+    install_name_search rebuilds it too. Does nothing where name search was
+    never installed (or was uninstalled by migrating back).
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for table in NAME_SEARCH_TABLES:
+            present = _sqlite_objects(cursor, table)
+            if _fts_table(table) in present and len(present) < 1 + len(FTS_TRIGGERS):
+                break
+        else:
+            return
+    install_name_search(conn)
+
+
+@lru_cache(maxsize=None)
+def _backend_available(vendor, table):
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            # Without its triggers the index goes stale, so it only counts with all of them
+            return len(_sqlite_objects(cursor, table)) == 1 + len(FTS_TRIGGERS)
+        elif vendor == 'postgresql':
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [f"{table}_name_trgm_idx"])
+        else:
+            return False
+        return cursor.fetchone() is not None
+
+
+def _token_filter(tokens):
+    """Every token has to appear in the first or the last name."""
+    condition = Q()
+    for token in tokens:
+        condition &= Q(first_name__icontains=token) | Q(last_name__icontains=token)
+    return condition
+
+
+def _fts_query(tokens):
+    return " AND ".join('"' + token.replace('"', '""') + '"' for token in tokens)
+
+
+def search_by_name(queryset, search_name):
+    """
+    Filter a Student or Parent queryset down to rows whose name matches search_name.
+
+    Each whitespace-separated part of the query must appear somewhere in the
+    first or last name, so "maria jose garcia" and "garcia maria" both work.
+    On PostgreSQL, near misses are also accepted ("jonh smtih") and results
+    come back ordered by trigram similarity.
+    """
+    tokens = search_name.split()
+    if not tokens:
+        return queryset
+
+    table = queryset.model._meta.db_table
+    vendor = connection.vendor
+    if not _backend_available(vendor, table):
+        return queryset.filter(_token_filter(tokens))
+
+    if vendor == 'postgresql':
+        query = " ".join(tokens)
+        every_token = Q()
+        for token in tokens:
+            escaped = token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            every_token &= Q(ILike(FullName(), Value(f"%{escaped}%")))
+        return (
+            queryset.filter(every_token | Q(TrigramSimilar(FullName(), query)))
+            .annotate(name_rank=TrigramSimilarity(FullName(), query))
+            .order_by('-name_rank', 'last_name', 'first_name')
+        )
+
+    # SQLite: long tokens go through the FTS5 trigram index, short ones
+    # (which the trigram tokenizer can't see) only narrow that result down
+    long_tokens = [token for token in tokens if len(token) >= FTS_MIN_TOKEN]
+    short_tokens = [token for token in tokens if len(token) < FTS_MIN_TOKEN]
+    if long_tokens:
+        fts = _fts_table(table)
+        queryset = queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [_fts_query(long_tokens)])
+        )
+    return queryset.filter(_token_filter(short_tokens)).order_by('last_name', 'first_name')
+
+
+def filter_students(params, queryset=None):
+    """
+    Apply the student search filters in params (request.GET or a dict) to queryset.
+
+    Shared by StudentSearchView and the exports, so an export of a search
+    returns the same students the search page lists.
+    """
+    if queryset is None:
+        queryset = Student.objects.all()
+
+    # Get search and filter parameters
+    search_name = params.get("search_name", "")
+    town_filter = params.get("town_village", "")
+    country_filter = params.get("country_of_origin", "")
+    grade_filter = params.get("current_grade", "")
+    time_period = params.get("time_period", "")
+    subject_filter = params.get("subject", "")
+
+    # Apply search by name (case-insensitive, every part of the name has to match)
+    if search_name:
+        queryset = search_by_name(queryset, search_name)
+
+    # Apply filters for town, country and grade
+    if town_filter:
+        queryset = queryset.filter(town_village=town_filter)
+    if country_filter:
+        queryset = queryset.filter(country_of_origin=country_filter)
+    if grade_filter:
+        queryset = queryset.filter(current_grade=grade_filter)
+
+    # Subject filter: tutored in that subject at least once
+    if subject_filter:
+        queryset = queryset.filter(
+            id__in=TutoringService.objects.filter(subjects__name=subject_filter).values('student_id')
+        )
+
+    # Time period filter: served at least once since the cutoff
+    if time_period in TIME_PERIODS:
+        cutoff_date = now().date() - TIME_PERIODS[time_period]
+        queryset = queryset.filter(
+            id__in=ServiceEvent.objects.filter(date__gte=cutoff_date).values('student_id')
+        )
+
+    return queryset
+
+
+def filter_parents(params, queryset=None):
+    """Apply the parent search filters in params (request.GET or a dict) to queryset."""
+    if queryset is None:
+        queryset = Parent.objects.all()
+
+    # Get search and filter parameters
+    search_name = params.get("search_name", "")
+    town_filter = params.get("town_village", "")
+    country_filter = params.get("country_of_origin", "")
+
+    # Apply search by name (case-insensitive, every part of the name has to match)
+    if search_name:
+        queryset = search_by_name(queryset, search_name)
+
+    # Apply filters for town/village and country of origin
+    if town_filter:
+        queryset = queryset.filter(town_village=town_filter)
+    if country_filter:
+        queryset = queryset.filter(country_of_origin=country_filter)
+
+    return queryset
@@ -0,0 +1,140 @@
+# File: served.py
+# Description: Per-day sets of the students and families served, unioned into distinct counts over any window
+
+import numpy as np
+from django.db import transaction
+from .cube import school_level
+from .models import DailyServedSet, ServiceEvent
+from .rollups import DAY_LOCK, lock_periods
+
+# Ids are stored as little-endian int64 (the tables use BigAutoField), sorted
+ID_DTYPE = '<i8'
+
+# set column -> the same value looked up from a ServiceEvent row
+DIMENSIONS = {
+    'district': 'student__town_village',
+    'school_level': 'school_level',
+    'student_country': 'student__country_of_origin',
+    'parent_country': 'student__parent__country_of_origin',
+}
+
+
+def pack_ids(ids):
+    """Sorted, de-duplicated ids as bytes for a BinaryField."""
+    return np.unique(np.asarray(list(ids), dtype=ID_DTYPE)).tobytes()
+
+
+def unpack_ids(blob):
+    return np.frombuffer(blob, dtype=ID_DTYPE)
+
+
+def union_ids(blobs):
+    """The sorted union of packed id sets."""
+    return np.unique(unpack_ids(b''.join(blobs)))
+
+
+def _day_cells(events):
+    """
+    Yield (day, {dimension values: (student ids, parent ids)}) for the
+    service events given, one day at a time.
+    """
+    rows = events.annotate(school_level=school_level('student__current_grade')).values_list(
+        'date', *DIMENSIONS.values(), 'student_id', 'student__parent_id',
+    ).distinct().order_by('date')
+    day, cells = None, {}
+    for row_day, *key, student_id, parent_id in rows.iterator(chunk_size=2000):
+        if row_day != day:
+            if cells:
+                yield day, cells
+            day, cells = row_day, {}
+        students, parents = cells.setdefault(tuple(key), (set(), set()))
+        students.add(student_id)
+        if parent_id is not None:
+            parents.add(parent_id)
+    if cells:
+        yield day, cells
+
+
+def _served_sets(day, cells):
+    return [
+        DailyServedSet(
+            date=day, students=pack_ids(students), parents=pack_ids(parents),
+            **dict(zip(DIMENSIONS, key)),
+        )
+        for key, (students, parents) in cells.items()
+    ]
+
+
+def refresh_served_sets(days):
+    """Recompute the served sets of the given days from the service ledger."""
+    days = set(days)
+    if not days:
+        return
+    with transaction.atomic(savepoint=False):
+        lock_periods(DAY_LOCK, days)
+        DailyServedSet.objects.filter(date__in=days).delete()
+        sets = []
+        for day, cells in _day_cells(ServiceEvent.objects.filter(date__in=days)):
+            sets.extend(_served_sets(day, cells))
+        DailyServedSet.objects.bulk_create(sets, batch_size=1000)
+
+
+def served_days(**event_filter):
+    """The days the service events matching event_filter (e.g. student_id=3) fall on."""
+    return list(ServiceEvent.objects.filter(**event_filter).values_list('date', flat=True).distinct())
+
+
+def rebuild_served_sets(batch_size=1000):
+    """
+    Throw away the served sets and rebuild them from the service ledger.
+
+    Returns the number of sets written.
+    """
+    written = 0
+    with transaction.atomic():
+        DailyServedSet.objects.all().delete()
+        batch = []
+        for day, cells in _day_cells(ServiceEvent.objects.all()):
+            batch.extend(_served_sets(day, cells))
+            if len(batch) >= batch_size:
+                DailyServedSet.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            DailyServedSet.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def served_counts(start_date, end_date=None, group_by=(), **filters):
+    """
+    Distinct students and families served from start_date to end_date
+    (inclusive; None for no end), grouped by set columns, e.g.
+    ['student_country'].
+
+    filters restrict set columns to lists of values, e.g.
+    district=['Essex'], school_level=['High School']. The counts are exact:
+    the window's sets are read (one row per day and dimension combination)
+    and their ids unioned.
+
+    Returns {(value of each group_by column, ...): {'students': ..., 'families': ...}}.
+    """
+    sets = DailyServedSet.objects.filter(date__gte=start_date)
+    if end_date is not None:
+        sets = sets.filter(date__lte=end_date)
+    sets = sets.filter(**{f'{column}__in': values for column, values in filters.items()})
+
+    blobs = {}
+    for *key, students, parents in sets.values_list(*group_by, 'students', 'parents').iterator(chunk_size=2000):
+        student_blobs, parent_blobs = blobs.setdefault(tuple(key), ([], []))
+        student_blobs.append(students)
+        parent_blobs.append(parents)
+    return {
+        key: {'students': len(union_ids(students)), 'families': len(union_ids(parents))}
+        for key, (students, parents) in blobs.items()
+    }
+
+
+def served_total(start_date, end_date=None, **filters):
+    """served_counts without grouping: {'students': ..., 'families': ...}."""
+    return served_counts(start_date, end_date, **filters).get((), {'students': 0, 'families': 0})
@@ -0,0 +1,166 @@
+# File: signals.py
+# Description: Signal handlers that keep derived tables current when services and students change
+
+import threading
+from datetime import date
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Parent, Student, Subject, TutoringService, AdvocacyService, TUTORING, ADVOCACY
+from .caching import bump_data_version
+from .cube import month_start, refresh_monthly_rollups
+from .facets import invalidate_facets
+from .served import refresh_served_sets, served_days
+from .grades import stamp_service
+from .subjects import set_subjects
+from .rollups import DAY_LOCK, MONTH_LOCK, lock_periods, refresh_service_days, service_type_for
+
+
+@receiver(pre_save, sender=TutoringService)
+@receiver(pre_save, sender=AdvocacyService)
+def remember_previous_service_cell(sender, instance, **kwargs):
+    """Stash the (student, date) a service had before this save so its old cell can be refreshed."""
+    instance._previous_cell = None
+    if instance.pk:
+        instance._previous_cell = (
+            sender.objects.filter(pk=instance.pk).values_list('student_id', 'date_of_contact').first()
+        )
+
+
+@receiver(pre_save, sender=TutoringService)
+@receiver(pre_save, sender=AdvocacyService)
+def stamp_grade_at_service(sender, instance, **kwargs):
+    """Record the school year and the student's grade at the time of a new (or moved) session."""
+    day = sender._meta.get_field('date_of_contact').to_python(instance.date_of_contact)
+    unchanged = getattr(instance, '_previous_cell', None) == (instance.student_id, day)
+    if instance.school_year is None or not unchanged:
+        stamp_service(instance, instance.student.current_grade, day, date.today())
+
+
+# Work queued by the handlers below for when the write commits, per thread
+# (each thread has its own database connection, so its own transaction)
+_pending = threading.local()
+
+
+def _queue(service_types=(TUTORING, ADVOCACY), days=()):
+    """
+    Queue the derived rows of days (for service_types) for a refresh once
+    the current transaction commits, or straight away outside one.
+
+    Every write in a transaction queues into the same batch, so deleting a
+    parent with dozens of sessions refreshes each affected day once. The
+    data version is bumped with the batch even when no days are queued.
+    """
+    batch = getattr(_pending, 'days', None)
+    if batch is None:
+        batch = _pending.days = {service_type: set() for service_type in (TUTORING, ADVOCACY)}
+    for service_type in service_types:
+        batch[service_type].update(days)
+    # One callback per write: after a rollback the batch is still queued, and
+    # the next commit's callback takes it (refreshing a day again is harmless)
+    transaction.on_commit(_refresh_pending)
+
+
+def _refresh_pending():
+    """Refresh every derived table for the queued days, all in one transaction."""
+    batch = getattr(_pending, 'days', None)
+    if batch is None:
+        return
+    _pending.days = None
+    days = set().union(*batch.values())
+    with transaction.atomic():
+        # Months before days, each in date order, so concurrent refreshes can't deadlock
+        lock_periods(MONTH_LOCK, {month_start(day) for day in days})
+        lock_periods(DAY_LOCK, days)
+        for service_type, service_days in batch.items():
+            refresh_service_days(service_days, [service_type])
+            refresh_monthly_rollups(service_days, [service_type])
+        refresh_served_sets(days)
+        # Retire every cached chart; they are all computed from these tables
+        bump_data_version()
+
+
+@receiver(post_save, sender=TutoringService)
+@receiver(post_save, sender=AdvocacyService)
+def service_saved(sender, instance, **kwargs):
+    # date_of_contact may still be a string when created straight from request.POST
+    day = sender._meta.get_field('date_of_contact').to_python(instance.date_of_contact)
+    previous = getattr(instance, '_previous_cell', None)
+    _queue([service_type_for(sender)], [day] + ([previous[1]] if previous else []))
+
+
+@receiver(post_save, sender=TutoringService)
+def tutoring_saved(sender, instance, **kwargs):
+    """Keep the session's Subject links in line with its session_focus."""
+    set_subjects(instance)
+
+
+@receiver(post_delete, sender=TutoringService)
+@receiver(post_delete, sender=AdvocacyService)
+def service_deleted(sender, instance, **kwargs):
+    day = sender._meta.get_field('date_of_contact').to_python(instance.date_of_contact)
+    _queue([service_type_for(sender)], [day])
+
+
+# Student / parent columns the monthly cube and served sets are broken down by (and the parent the ledger records)
+CUBE_STUDENT_FIELDS = ('town_village', 'current_grade', 'country_of_origin', 'parent_id')
+CUBE_PARENT_FIELDS = ('country_of_origin',)
+
+
+@receiver(pre_save, sender=Student)
+@receiver(pre_save, sender=Parent)
+def remember_previous_cube_columns(sender, instance, **kwargs):
+    """Stash the cube columns a student/parent had before this save."""
+    fields = CUBE_STUDENT_FIELDS if sender is Student else CUBE_PARENT_FIELDS
+    instance._previous_cube_columns = None
+    if instance.pk:
+        instance._previous_cube_columns = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Parent)
+def refresh_rollups_for_person(sender, instance, created, **kwargs):
+    """
+    Queue the days a student (or a parent's students) was served, per
+    service type, when a column the derived tables are broken down by
+    changed. That includes a student's parent, which the ledger and rollups
+    record.
+
+    Each queued day and its month are recomputed whole, everyone's sessions
+    included, so editing a student served over several years costs a few
+    grouped queries per month they were served. That's fine for edits one
+    at a time; for bulk changes (renaming a district, merging families) use
+    update() and then the rebuild_rollups command instead of saving each row.
+    """
+    fields = CUBE_STUDENT_FIELDS if sender is Student else CUBE_PARENT_FIELDS
+    previous = getattr(instance, '_previous_cube_columns', None)
+    if created or previous is None or previous == tuple(getattr(instance, field) for field in fields):
+        _queue()
+        return
+    person = {'student_id' if sender is Student else 'parent_id': instance.pk}
+    for service_type in (TUTORING, ADVOCACY):
+        # Only the service types the person actually has on each day
+        _queue([service_type], served_days(service_type=service_type, **person))
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Parent)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Parent)
+def person_changed(sender, **kwargs):
+    """A new, edited or removed student/parent can change the search form facets."""
+    invalidate_facets(sender)
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Parent)
+def person_deleted(sender, **kwargs):
+    """A removed student/parent's sessions queue their own days; this just retires the cached charts."""
+    _queue()
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def subject_changed(sender, **kwargs):
+    """A new, renamed or removed subject changes the search form's subject choices."""
+    invalidate_facets(sender)
@@ -0,0 +1,60 @@
+# File: staticfiles.py
+# Description: Serves the plotly.js bundle that ships with the plotly package as a content-hashed static file
+
+import hashlib
+import os
+from functools import lru_cache
+import plotly
+from django.contrib.staticfiles.finders import BaseFinder
+from django.core.files.storage import FileSystemStorage
+
+PLOTLY_SOURCE = os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js')
+PLOTLY_PREFIX = 'plotly'
+
+
+@lru_cache(maxsize=None)
+def plotly_js_name():
+    """plotly.min.<first 12 hex chars of its md5>.js, so the URL changes whenever the bundle does."""
+    with open(PLOTLY_SOURCE, 'rb') as bundle:
+        digest = hashlib.md5(bundle.read()).hexdigest()[:12]
+    return f"plotly.min.{digest}.js"
+
+
+def plotly_js_path():
+    """Static path of the bundle, for use with {% static %} / django.templatetags.static.static."""
+    return f"{PLOTLY_PREFIX}/{plotly_js_name()}"
+
+
+class PlotlyStorage(FileSystemStorage):
+    """Read-only view of the plotly package data that exposes the bundle under its hashed name."""
+
+    def __init__(self):
+        super().__init__(location=os.path.dirname(PLOTLY_SOURCE))
+        self.prefix = PLOTLY_PREFIX
+
+    def path(self, name):
+        if name == plotly_js_name():
+            return PLOTLY_SOURCE
+        return super().path(name)
+
+
+class PlotlyFinder(BaseFinder):
+    """
+    Staticfiles finder that adds plotly/plotly.min.<hash>.js.
+
+    collectstatic copies it into STATIC_ROOT like any other file, and
+    WhiteNoise serves it with far-future cache headers because its name
+    matches WHITENOISE_IMMUTABLE_FILE_TEST.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.storage = PlotlyStorage()
+
+    def find(self, path, all=False, **kwargs):
+        if path == plotly_js_path():
+            return [PLOTLY_SOURCE] if all else PLOTLY_SOURCE
+        # Like Django's own finders: finders.find() treats anything else as a match
+        return []
+
+    def list(self, ignore_patterns):
+        yield plotly_js_name(), self.storage
@@ -0,0 +1,67 @@
+# File: subjects.py
+# Description: Normalizes the free-text tutoring session focus into Subject rows
+
+import re
+from django.db import transaction
+from .facets import invalidate_facets
+from .models import Subject, TutoringService
+
+# One row per (tutoring session, subject)
+SubjectLink = TutoringService.subjects.through
+
+
+def subject_names(session_focus):
+    """The subjects named in a session focus such as 'math/reading, Science', each once, in order."""
+    if not session_focus:
+        return []
+    names = [part.strip().capitalize() for part in re.split(r'[/,]\s*', session_focus) if part.strip()]
+    return list(dict.fromkeys(names))
+
+
+def subject_ids(names):
+    """{name: Subject id} for names, creating the subjects that don't exist yet."""
+    names = set(names)
+    ids = dict(Subject.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - ids.keys()
+    if missing:
+        Subject.objects.bulk_create([Subject(name=name) for name in missing], ignore_conflicts=True)
+        # bulk_create skips the save signals that retire the search form's subject choices
+        invalidate_facets(Subject)
+        ids.update(Subject.objects.filter(name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def subject_links(sessions):
+    """Unsaved SubjectLink rows for [(saved session id, session_focus), ...]."""
+    pairs = [(session_id, name) for session_id, focus in sessions for name in subject_names(focus)]
+    ids = subject_ids(name for _, name in pairs)
+    return [SubjectLink(tutoringservice_id=session_id, subject_id=ids[name]) for session_id, name in pairs]
+
+
+def set_subjects(session):
+    """Point a saved session at the subjects in its session_focus."""
+    session.subjects.set(subject_ids(subject_names(session.session_focus)).values())
+
+
+def backfill_subjects(relink=False, batch_size=2000):
+    """
+    Link tutoring sessions to their subjects, batch_size sessions at a
+    time: those with no links yet, or every session with relink=True.
+
+    Returns the number of links written.
+    """
+    sessions = TutoringService.objects.order_by('id')
+    if not relink:
+        sessions = sessions.filter(subjects__isnull=True)
+    written = 0
+    last_id = 0
+    with transaction.atomic():
+        if relink:
+            SubjectLink.objects.all().delete()
+        while True:
+            # Keyset batches: links are written between reads, so no cursor is held open across them
+            batch = list(sessions.filter(id__gt=last_id).values_list('id', 'session_focus')[:batch_size])
+            if not batch:
+                return written
+            written += len(SubjectLink.objects.bulk_create(subject_links(batch)))
+            last_id = batch[-1][0]
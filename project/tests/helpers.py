@@ -0,0 +1,83 @@
+# File: helpers.py
+# Description: Shared fixtures and assertions for the project tests
+
+from django.contrib.auth.models import User
+from django.test import Client
+from project.cube import rebuild_monthly_rollups
+from project.models import (
+    Parent, Student, TutoringService, AdvocacyService, ServiceEvent, DailyServiceRollup, MonthlyServiceRollup,
+    DailyServedSet,
+)
+from project.rollups import rebuild_daily_rollups, rebuild_service_events
+from project.served import rebuild_served_sets
+
+
+def derived_tables():
+    """Every row of the four derived tables, in a comparable form."""
+    return {
+        'events': sorted(ServiceEvent.objects.values_list(
+            'service_type', 'service_id', 'student_id', 'parent_id', 'date', 'hours')),
+        'daily': sorted(DailyServiceRollup.objects.values_list(
+            'date', 'student_id', 'parent_id', 'service_type', 'hours', 'sessions')),
+        'cube': sorted(MonthlyServiceRollup.objects.values_list(
+            'month', 'service_type', 'district', 'school_level', 'student_country', 'parent_country', 'grade',
+            'hours', 'sessions', 'students'), key=repr),
+        'served': sorted(
+            ((row[:5], bytes(row[5]), bytes(row[6])) for row in DailyServedSet.objects.values_list(
+                'date', 'district', 'school_level', 'student_country', 'parent_country', 'students', 'parents')),
+            key=repr),
+    }
+
+
+def rebuild_derived_tables():
+    rebuild_service_events()
+    rebuild_daily_rollups()
+    rebuild_monthly_rollups()
+    rebuild_served_sets()
+
+
+class DerivedTablesMixin:
+    def assertMatchesRebuild(self):
+        """The derived tables as maintained so far equal the same tables rebuilt from scratch."""
+        maintained = derived_tables()
+        rebuild_derived_tables()
+        rebuilt = derived_tables()
+        for table in rebuilt:
+            self.assertEqual(maintained[table], rebuilt[table], f"{table} differs from a rebuild")
+
+
+def family(parent_name, children, town='Essex', country='Nepal'):
+    """
+    A parent and their students: children is a list of (first name, grade),
+    each with the parent's last name, town and country.
+    """
+    first_name, last_name = parent_name.split()
+    parent = Parent.objects.create(first_name=first_name, last_name=last_name, town_village=town,
+                                   country_of_origin=country)
+    students = [
+        Student.objects.create(first_name=child, last_name=last_name, parent=parent, town_village=town,
+                               current_grade=grade, country_of_origin=country)
+        for child, grade in children
+    ]
+    return parent, students
+
+
+def tutoring(student, day, hours=1, focus='Math'):
+    return TutoringService.objects.create(
+        student=student, date_of_contact=day, location_of_contact='Library', session_focus=focus,
+        activity='', length_of_session=hours,
+    )
+
+
+def advocacy(student, day, hours=1):
+    return AdvocacyService.objects.create(
+        student=student, date_of_contact=day, school_district='Essex', length_of_contact=hours, description='',
+    )
+
+
+def logged_in_client(staff=False):
+    """A test Client signed in as a new user (a staff member when staff=True)."""
+    user = User.objects.create_user('staff' if staff else 'volunteer', is_staff=staff)
+    client = Client()
+    client.force_login(user)
+    return client
@@ -0,0 +1,112 @@
+# File: test_async_views.py
+# Description: The async versions of the read-heavy pages, served through their own URLconf
+
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import include, path
+from django.utils.timezone import now
+from project import async_views, urls as project_urls
+from project.views import home_stats
+from .helpers import advocacy, family, tutoring
+
+# project.urls picks its views once, from ASYNC_VIEWS at import, so the async
+# pages are swapped in by name here instead
+ASYNC_PAGES = {
+    'home': async_views.home,
+    'student_search': async_views.student_search,
+    'student_detail': async_views.student_detail,
+    'parent_search': async_views.parent_search,
+    'parent_detail': async_views.parent_detail,
+    'charts': async_views.charts,
+}
+urlpatterns = [
+    path('project/', include([
+        path(str(pattern.pattern), ASYNC_PAGES.get(pattern.name, pattern.callback), name=pattern.name)
+        for pattern in project_urls.urlpatterns
+    ])),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewTests(TestCase):
+    """Each async page shows what its sync counterpart does, and still needs a login."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = now().date()
+        cls.user = User.objects.create_user('volunteer')
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.rai, (cls.ana, cls.bo) = family('Asha Rai', [('Ana', 3), ('Bo', 7)])
+            cls.wangchuk, (cls.cai,) = family('Dorji Wangchuk', [('Cai', 10)], town='Lowell', country='Bhutan')
+            tutoring(cls.ana, cls.today - timedelta(days=3), hours=2)
+            tutoring(cls.ana, cls.today - timedelta(days=50), hours=Decimal('1.5'))
+            advocacy(cls.ana, cls.today - timedelta(days=5))
+            tutoring(cls.cai, cls.today - timedelta(days=200))
+
+    def setUp(self):
+        self.async_client.force_login(self.user)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    async def test_home(self):
+        response = await self.async_client.get('/project/')
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(home_stats)(self.today)
+        for key, value in expected.items():
+            self.assertEqual(response.context[key], value, key)
+        self.assertContains(response, 'In the last 1 year: 2')
+
+    async def test_home_with_a_shared_cache(self):
+        with mock.patch.object(async_views, 'cache_is_shared', return_value=True), \
+                mock.patch.object(async_views, '_home_stats', wraps=async_views._home_stats) as computed:
+            first = await self.async_client.get('/project/')
+            second = await self.async_client.get('/project/')
+        self.assertEqual(computed.call_count, 1)
+        self.assertEqual(second.context['tutoring_hours'], first.context['tutoring_hours'])
+        self.assertContains(second, 'In the last 1 year: 2')
+
+    async def test_student_search(self):
+        response = await self.async_client.get('/project/search/', {'town_village': 'Essex'})
+        self.assertEqual([student.first_name for student in response.context['students']], ['Ana', 'Bo'])
+        self.assertEqual(response.context['paginator'].count, 2)
+        response = await self.async_client.get('/project/search/', {'paging': 'keyset', 'subject': 'Math'})
+        self.assertTrue(response.context['keyset_paging'])
+        self.assertEqual([student.first_name for student in response.context['students']], ['Ana', 'Cai'])
+
+    async def test_student_search_page_out_of_range(self):
+        response = await self.async_client.get('/project/search/', {'page': 9})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_parent_search(self):
+        response = await self.async_client.get('/project/parent_search/', {'country_of_origin': 'Bhutan'})
+        self.assertEqual([parent.last_name for parent in response.context['parents']], ['Wangchuk'])
+
+    async def test_student_detail(self):
+        response = await self.async_client.get(f'/project/students/{self.ana.pk}/')
+        self.assertEqual(len(response.context['tutoring_sessions']), 2)
+        self.assertEqual((response.context['tutoring_hours'], response.context['advocacy_hours'],
+                          response.context['total_hours']), (Decimal('3.5'), 1, Decimal('4.5')))
+        self.assertEqual((await self.async_client.get('/project/students/0/')).status_code, 404)
+
+    async def test_parent_detail(self):
+        response = await self.async_client.get(f'/project/parent/{self.rai.pk}/')
+        self.assertEqual(sorted(student.first_name for student in response.context['students']), ['Ana', 'Bo'])
+        self.assertEqual((await self.async_client.get('/project/parent/0/')).status_code, 404)
+
+    async def test_charts(self):
+        response = await self.async_client.get('/project/charts/', {'chart_type': 'nonsense'})
+        self.assertEqual(response.context['selected_chart'], 'service_by_town')
+        self.assertContains(response, '/project/api/charts/service_by_town/')
+
+    async def test_pages_need_login(self):
+        await self.async_client.alogout()
+        for url in ['/project/', '/project/search/', f'/project/students/{self.ana.pk}/',
+                    '/project/parent_search/', f'/project/parent/{self.rai.pk}/']:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertRedirects(response, f'/project/login/?next={url}', fetch_redirect_response=False)
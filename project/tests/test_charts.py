@@ -0,0 +1,276 @@
+# File: test_charts.py
+# Description: The chart series, their cache and the chart data API
+
+import re
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from project import analytics
+from project.caching import chart_cache_key
+from project import charts
+from project.charts import CHART_TYPES, ChartScope, chart_data
+from .helpers import advocacy, family, logged_in_client, tutoring
+from project.models import Parent, Student
+
+
+class ChartFixture:
+    """Two families in two districts, served in 2024."""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.create_families()
+
+    @classmethod
+    def create_families(cls):
+        _, (cls.ana, cls.bo) = family('Asha Rai', [('Ana', 3), ('Bo', 7)])
+        _, (cls.cai,) = family('Dorji Wangchuk', [('Cai', 10)], town='Lowell', country='Bhutan')
+        tutoring(cls.ana, date(2024, 1, 15), hours=2)
+        tutoring(cls.bo, date(2024, 2, 1), focus='Reading')
+        tutoring(cls.cai, date(2024, 3, 10), hours=3, focus='Math/Science')
+        advocacy(cls.cai, date(2024, 3, 12))
+
+    def setUp(self):
+        # Cached charts would outlive each test's rolled back transaction
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+class ChartCacheTests(ChartFixture, TestCase):
+    """Charts are cached per normalized filter set until a write bumps the data version."""
+
+    today = date(2024, 6, 1)
+
+    def test_key_normalizes_filters(self):
+        key = chart_cache_key('service_by_town', ['Lowell', 'Essex'], [], '1year', self.today)
+        self.assertEqual(chart_cache_key('service_by_town', ['Essex', 'Lowell', 'Essex'], [], '1year', self.today), key)
+        self.assertEqual(chart_cache_key('service_by_town', [], [], 'forever', self.today),
+                         chart_cache_key('service_by_town', [], [], 'all', self.today))
+        self.assertNotEqual(chart_cache_key('service_by_town', ['Essex'], [], '1year', self.today), key)
+        self.assertNotEqual(chart_cache_key('service_by_level', ['Essex', 'Lowell'], [], '1year', self.today), key)
+        self.assertNotEqual(chart_cache_key('service_by_town', ['Essex', 'Lowell'], [], '1year', date(2024, 6, 2)), key)
+        self.assertNotEqual(
+            chart_cache_key('service_by_town', ['Essex', 'Lowell'], [], '1year', self.today, start_date=date(2024, 2, 1)),
+            key)
+
+    def test_write_retires_cached_charts(self):
+        key = chart_cache_key('service_by_town', [], [], 'all', self.today)
+        with self.captureOnCommitCallbacks(execute=True):
+            tutoring(self.bo, date(2024, 4, 1))
+        self.assertNotEqual(chart_cache_key('service_by_town', [], [], 'all', self.today), key)
+
+    def test_api_serves_cached_chart_until_a_write(self):
+        client = logged_in_client()
+        url = '/project/api/charts/service_by_town/?town_village=Lowell&town_village=Essex'
+        with mock.patch('project.views.chart_data', wraps=chart_data) as computed:
+            first = client.get(url).json()
+            # Same filters in another order: the cached chart
+            self.assertEqual(client.get('/project/api/charts/service_by_town/?town_village=Essex&town_village=Lowell')
+                             .json(), first)
+            self.assertEqual(computed.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                tutoring(self.bo, date(2024, 4, 1), hours=5)
+            self.assertEqual(client.get(url).json()['values'], [first['values'][0] + 5, first['values'][1]])
+            self.assertEqual(computed.call_count, 2)
+
+
+class ChartApiTests(ChartFixture, TestCase):
+    """The JSON chart data API behind the charts page."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = logged_in_client()
+
+    def test_series(self):
+        response = self.client.get('/project/api/charts/service_by_town/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'chart': 'service_by_town', 'kind': 'bar', 'title': 'Service Hours by School District',
+            'labels': ['Essex', 'Lowell'], 'values': [3.0, 4.0], 'x_label': 'District', 'y_label': 'Service Hours',
+        })
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+
+    def test_filters(self):
+        payload = self.client.get('/project/api/charts/service_by_town/', {
+            'town_village': 'Essex', 'start_date': '2024-02-01', 'end_date': '2024-12-31',
+        }).json()
+        self.assertEqual((payload['labels'], payload['values']), (['Essex'], [1.0]))
+        self.assertEqual(payload['title'], 'Service Hours by School District - From 02/01/2024 to 12/31/2024')
+        # A malformed date is ignored
+        payload = self.client.get('/project/api/charts/service_by_town/', {'start_date': 'soon'}).json()
+        self.assertEqual(payload['values'], [3.0, 4.0])
+
+    def test_unknown_chart(self):
+        response = self.client.get('/project/api/charts/nonsense/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+
+    def test_etag_revalidation(self):
+        url = '/project/api/charts/clients_by_country/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            tutoring(self.ana, date(2024, 4, 1))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_needs_login(self):
+        url = '/project/api/charts/service_by_town/'
+        self.client.logout()
+        self.assertRedirects(self.client.get(url), f'/project/login/?next={url}', fetch_redirect_response=False)
+
+
+class ServiceHoursChartTests(ChartFixture, TestCase):
+    """Hours per student are summed per session type, so neither type is counted once per session of the other."""
+
+    today = date(2024, 6, 1)
+
+    def test_service_by_level(self):
+        payload = chart_data('service_by_level', [], [], 'all', self.today)
+        self.assertEqual((payload['labels'], payload['values']), (['Elementary', 'High School', 'Middle School'], [2, 4, 1]))
+        payload = chart_data('service_by_level', ['Essex'], ['Middle School'], 'all', self.today)
+        self.assertEqual((payload['labels'], payload['values']), (['Middle School'], [1]))
+
+    def test_students_by_service_interval(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for day in range(1, 8):
+                tutoring(self.cai, date(2024, 4, day))
+                advocacy(self.cai, date(2024, 4, day))
+        # Cai: 3 + 1 + 7 * (1 + 1) hours
+        payload = chart_data('students_by_service_interval', [], [], 'all', self.today)
+        self.assertEqual(payload['values'], [2, 0, 1, 0])
+        payload = chart_data('students_by_service_interval', [], [], '30days', self.today)
+        self.assertEqual(payload['values'], [3, 0, 0, 0])
+
+    def test_benchmark_matches_the_true_totals(self):
+        out = StringIO()
+        call_command('benchmark_charts', students=5, tutoring=3, advocacy=2, repeat=1, stdout=out)
+        output = out.getvalue()
+        after = re.findall(r'after: .* result (.*)', output)
+        self.assertEqual(len(after), 2)
+        self.assertEqual(after, re.findall(r'expected +result (.*)', output))
+
+
+class ChartEngineTests(ChartFixture, TestCase):
+    """The SQL and snapshot engines return the same series, categories in the same order, for every chart."""
+
+    today = date(2024, 6, 1)
+    filter_sets = [
+        ([], [], 'all', None, None),
+        ([], [], '30days', None, None),
+        (['Essex'], [], 'all', None, None),
+        ([], ['Elementary', 'Unknown'], 'all', None, None),
+        (['Lowell', 'Essex'], ['High School'], 'all', None, None),
+        ([], [], 'all', date(2024, 1, 20), date(2024, 3, 10)),
+        ([], [], 'all', None, date(2024, 2, 1)),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        with cls.captureOnCommitCallbacks(execute=True):
+            # No district, country or grade, and names that sort differently by collation
+            parent = Parent.objects.create(first_name='Ali', last_name='Omar', country_of_origin=None)
+            nobody = Student.objects.create(first_name='Dee', last_name='Omar', parent=parent, town_village=None,
+                                            current_grade=None, country_of_origin=None)
+            _, (eve,) = family('Sam Ortiz', [('Eve', 5)], town='essex', country='Ecuador')
+            _, (fay,) = family('Ana Lind', [('Fay', 12)], town='Ängby', country='Unknown')
+            tutoring(nobody, date(2024, 1, 20), hours=Decimal('0.75'), focus='art/Science')
+            advocacy(nobody, date(2024, 5, 20), hours=Decimal('2.25'))
+            tutoring(eve, date(2024, 2, 29), focus='Math')
+            tutoring(fay, date(2024, 5, 30), hours=6, focus='Ärt')
+            advocacy(fay, date(2023, 12, 31))
+
+    def setUp(self):
+        super().setUp()
+        # The snapshot is kept per data version, which starts over with each test's data
+        patcher = mock.patch.object(analytics, '_snapshot', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_engines_agree(self):
+        for chart_type in CHART_TYPES:
+            for towns, levels, time_range, start_date, end_date in self.filter_sets:
+                with self.subTest(chart=chart_type, towns=towns, levels=levels, time_range=time_range,
+                                  start_date=start_date, end_date=end_date):
+                    args = (chart_type, towns, levels, time_range, self.today, start_date, end_date)
+                    with override_settings(CHART_ENGINE='sql'):
+                        sql = chart_data(*args)
+                    with override_settings(CHART_ENGINE='snapshot'):
+                        snapshot = chart_data(*args)
+                    self.assertEqual(snapshot, sql)
+
+    def test_unknown_bucket_comes_last(self):
+        for engine in ['sql', 'snapshot']:
+            with self.subTest(engine=engine), override_settings(CHART_ENGINE=engine):
+                self.assertEqual(chart_data('service_by_town', [], [], 'all', self.today)['labels'],
+                                 ['Essex', 'Lowell', 'essex', 'Ängby', 'Unknown'])
+                # A real country called Unknown merges with the missing ones
+                self.assertEqual(chart_data('clients_by_country', [], [], 'all', self.today)['labels'],
+                                 ['Bhutan', 'Ecuador', 'Nepal', 'Unknown'])
+                self.assertEqual(chart_data('service_by_level', [], [], 'all', self.today)['labels'],
+                                 ['Elementary', 'High School', 'Middle School', 'Unknown'])
+
+
+class ChartScopeTests(ChartFixture, TestCase):
+    """A scope whose students were resolved to ids builds the same charts as the filter it came from."""
+
+    today = date(2024, 6, 1)
+
+    def test_resolved_scope_builds_the_same_charts(self):
+        for towns, levels in [(['Essex'], []), ([], ['High School', 'Middle School']), (['Lowell'], ['Elementary'])]:
+            scope = ChartScope(towns, levels, 'all', self.today)
+            scope.resolve_students()
+            for chart_type in CHART_TYPES:
+                with self.subTest(chart=chart_type, towns=towns, levels=levels):
+                    self.assertEqual(charts._build_chart(chart_type, scope),
+                                     chart_data(chart_type, towns, levels, 'all', self.today))
+
+    def test_students_are_selected_by_id(self):
+        scope = ChartScope(['Essex'], ['Elementary'], 'all', self.today)
+        scope.resolve_students()
+        self.assertEqual(list(scope.students.values_list('first_name', flat=True)), ['Ana'])
+        self.assertNotIn('town_village', str(scope.tutoring_data.query))
+
+    def test_unfiltered_scope_is_left_alone(self):
+        scope = ChartScope([], [], 'all', self.today)
+        with self.assertNumQueries(0):
+            scope.resolve_students()
+
+
+@override_settings(DASHBOARD_WORKERS=4)
+class DashboardTests(ChartFixture, TransactionTestCase):
+    """The dashboard computes every chart at once on worker threads, reusing the ones already cached."""
+
+    # Committed data, so the worker threads' own connections can see it
+    def setUp(self):
+        super().setUp()
+        self.create_families()
+        self.client = logged_in_client()
+        self.today = date.today()
+
+    def test_every_chart_matches_chart_data(self):
+        response = self.client.get('/project/charts/dashboard/', {'town_village': 'Essex', 'time_range': 'all'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['charts'], [
+            chart_data(chart_type, ['Essex'], [], 'all', self.today) for chart_type in CHART_TYPES
+        ])
+        for chart_type in CHART_TYPES:
+            self.assertContains(response, f'id="chart-{chart_type}"')
+
+    def test_cached_charts_are_reused(self):
+        url = '/project/charts/dashboard/?time_range=all'
+        self.client.get('/project/api/charts/service_by_town/?time_range=all')
+        with mock.patch('project.views.dashboard_data', wraps=charts.dashboard_data) as computed:
+            self.client.get(url)
+            self.assertEqual(computed.call_args.args[0], [chart_type for chart_type in CHART_TYPES
+                                                          if chart_type != 'service_by_town'])
+            self.client.get(url)
+            self.assertEqual(computed.call_count, 1)
@@ -0,0 +1,105 @@
+# File: test_cube.py
+# Description: The monthly service cube: totals over any date range, and the refreshes that keep it current
+
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from project import signals
+from project.cube import cube_totals, refresh_monthly_rollups
+from project.models import MonthlyServiceRollup, TutoringService, AdvocacyService
+from .helpers import DerivedTablesMixin, advocacy, family, tutoring
+
+
+class CubeFixture:
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            _, (cls.ana, cls.bo) = family('Asha Rai', [('Ana', 3), ('Bo', 10)])
+            _, (cls.cai,) = family('Dorji Wangchuk', [('Cai', 7)], town='Lowell', country='Bhutan')
+            tutoring(cls.ana, date(2024, 1, 10), hours=2)
+            tutoring(cls.ana, date(2024, 1, 31))
+            tutoring(cls.bo, date(2024, 2, 1), hours=Decimal('1.5'))
+            tutoring(cls.cai, date(2024, 2, 15), hours=3)
+            tutoring(cls.cai, date(2024, 3, 20))
+            advocacy(cls.ana, date(2024, 2, 14), hours=4)
+            advocacy(cls.cai, date(2024, 3, 1))
+
+
+def expected_totals(group_by, start_date, end_date=None, **filters):
+    """cube_totals worked out session by session, to check the cube against."""
+    sessions = [
+        (session, 'tutoring', session.length_of_session) for session in TutoringService.objects.all()
+    ] + [
+        (session, 'advocacy', session.length_of_contact) for session in AdvocacyService.objects.all()
+    ]
+    totals = {}
+    for session, service_type, hours in sessions:
+        if session.date_of_contact < start_date or (end_date and session.date_of_contact > end_date):
+            continue
+        columns = {'service_type': service_type, 'district': session.student.town_village}
+        if any(columns[column] not in values for column, values in filters.items()):
+            continue
+        entry = totals.setdefault(tuple(columns[column] for column in group_by), {'hours': 0, 'sessions': 0})
+        entry['hours'] += hours
+        entry['sessions'] += 1
+    return totals
+
+
+class CubeTotalsTests(CubeFixture, TestCase):
+    """Whole months come from the cube and partial ones from the sessions, so every range is exact."""
+
+    def assertTotals(self, group_by, start_date, end_date=None, **filters):
+        self.assertEqual(cube_totals(group_by, start_date, end_date, **filters),
+                         expected_totals(group_by, start_date, end_date, **filters))
+
+    def test_whole_months(self):
+        self.assertTotals(['service_type'], date(2024, 1, 1), date(2024, 2, 29))
+
+    def test_partial_first_and_last_month(self):
+        self.assertTotals(['district'], date(2024, 1, 31), date(2024, 3, 19))
+        self.assertTotals(['district', 'service_type'], date(2024, 1, 11), date(2024, 3, 1))
+
+    def test_within_one_month(self):
+        self.assertTotals(['district'], date(2024, 2, 2), date(2024, 2, 20))
+
+    def test_open_end(self):
+        self.assertTotals(['service_type'], date(2024, 2, 15))
+
+    def test_filters(self):
+        self.assertTotals(['district'], date(2024, 1, 15), date(2024, 3, 31), district=['Lowell'])
+        self.assertTotals(['district'], date(2024, 1, 1), None, service_type=['advocacy'], district=['Essex'])
+
+    def test_whole_months_read_only_the_cube(self):
+        # One cube query, no session tables
+        with self.assertNumQueries(1):
+            cube_totals(['district'], date(2024, 1, 1), date(2024, 3, 31))
+
+
+class CubeRefreshTests(CubeFixture, DerivedTablesMixin, TestCase):
+    """Refreshing a month replaces its cells, and a student edit refreshes only the days they were served."""
+
+    def test_refreshing_twice_keeps_one_row_per_cell(self):
+        # Refreshes delete and reinsert, so they don't need the unique constraint (SQLite has none)
+        refresh_monthly_rollups([date(2024, 2, 1)])
+        refresh_monthly_rollups([date(2024, 2, 10), date(2024, 3, 5)])
+        self.assertEqual(MonthlyServiceRollup.objects.filter(month=date(2024, 2, 1)).count(), 3)
+        self.assertMatchesRebuild()
+
+    def test_student_edit_refreshes_their_days_per_service_type(self):
+        with mock.patch.object(signals, 'refresh_service_days', wraps=signals.refresh_service_days) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.cai.current_grade = 9
+                self.cai.save()
+        self.assertEqual(
+            sorted((service_types[0], sorted(days)) for (days, service_types), _ in refresh.call_args_list),
+            [('advocacy', [date(2024, 3, 1)]), ('tutoring', [date(2024, 2, 15), date(2024, 3, 20)])],
+        )
+        self.assertMatchesRebuild()
+
+    def test_unchanged_student_refreshes_nothing(self):
+        with mock.patch.object(signals, 'refresh_service_days') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.cai.first_name = 'Caius'
+                self.cai.save()
+        self.assertTrue(all(not days for (days, _), _ in refresh.call_args_list))
@@ -0,0 +1,90 @@
+# File: test_exports.py
+# Description: Streaming CSV / Parquet exports and the export_data command
+
+import csv
+import io
+import os
+import tempfile
+import unittest
+from datetime import date
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase
+from project.exports import EXPORTS, csv_chunks, parquet_available, parquet_chunks
+from project.models import Student
+from .helpers import advocacy, family, logged_in_client, tutoring
+
+if parquet_available():
+    import pyarrow.parquet as pq
+
+
+class ExportTests(TestCase):
+    """Exports stream the students a search matches, or their parents and sessions, a chunk at a time."""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            _, (cls.ana, cls.bo) = family('Asha Rai', [('Ana', 3), ('Bo', 7)])
+            _, (cls.cai,) = family('Dorji Wangchuk', [('Cai', 10)], town='Lowell', country='Bhutan')
+            tutoring(cls.ana, date(2024, 1, 15), hours=2)
+            tutoring(cls.bo, date(2024, 2, 1), focus='Reading')
+            tutoring(cls.cai, date(2024, 3, 10), hours=Decimal('1.5'))
+            advocacy(cls.cai, date(2024, 3, 12))
+
+    def read_csv(self, text):
+        return list(csv.DictReader(io.StringIO(text)))
+
+    def test_csv_is_streamed_in_chunks(self):
+        chunks = list(csv_chunks(EXPORTS['students'], Student.objects.all(), chunk_size=1))
+        # The header with the first row, then a row per chunk, then what's left (nothing)
+        self.assertEqual(len(chunks), 4)
+        rows = self.read_csv(''.join(chunks))
+        self.assertEqual([row['first_name'] for row in rows], ['Ana', 'Bo', 'Cai'])
+        self.assertEqual((rows[2]['parent_last_name'], rows[2]['town_village']), ('Wangchuk', 'Lowell'))
+
+    def test_sessions_of_the_matching_students(self):
+        students = Student.objects.filter(town_village='Essex')
+        rows = self.read_csv(''.join(csv_chunks(EXPORTS['tutoring'], students)))
+        self.assertEqual([(row['student_first_name'], row['length_of_session']) for row in rows],
+                         [('Ana', '2.00'), ('Bo', '1.00')])
+        self.assertEqual(self.read_csv(''.join(csv_chunks(EXPORTS['advocacy'], students))), [])
+        parents = self.read_csv(''.join(csv_chunks(EXPORTS['parents'], students)))
+        self.assertEqual([row['last_name'] for row in parents], ['Rai'])
+
+    @unittest.skipUnless(parquet_available(), "needs pyarrow")
+    def test_parquet_row_groups(self):
+        data = b''.join(parquet_chunks(EXPORTS['tutoring'], Student.objects.all(), chunk_size=2))
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        self.assertEqual(parquet.num_row_groups, 2)
+        table = parquet.read()
+        self.assertEqual(table.column('length_of_session').to_pylist(), [Decimal('2.00'), Decimal('1.00'), Decimal('1.50')])
+        self.assertEqual(table.column('date_of_contact').to_pylist()[0], date(2024, 1, 15))
+        self.assertEqual(table.column('parent_last_name').to_pylist(), ['Rai', 'Rai', 'Wangchuk'])
+
+    def test_view_uses_the_search_filters(self):
+        response = logged_in_client(staff=True).get('/project/export/students.csv', {'country_of_origin': 'Bhutan'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="students.csv"')
+        rows = self.read_csv(b''.join(response.streaming_content).decode())
+        self.assertEqual([row['first_name'] for row in rows], ['Cai'])
+
+    def test_view_is_for_staff_only(self):
+        response = logged_in_client().get('/project/export/students.csv')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/admin/login/', response['Location'])
+
+    def test_unknown_export(self):
+        client = logged_in_client(staff=True)
+        self.assertEqual(client.get('/project/export/grades.csv').status_code, 404)
+        self.assertEqual(client.get('/project/export/students.xlsx').status_code, 404)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_data', 'advocacy', '--town-village', 'Lowell', stdout=out)
+        self.assertEqual([row['student_first_name'] for row in self.read_csv(out.getvalue())], ['Cai'])
+
+        if parquet_available():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'students.parquet')
+                call_command('export_data', 'students', '--format', 'parquet', '--output', path, stderr=io.StringIO())
+                self.assertEqual(pq.read_table(path).column('first_name').to_pylist(), ['Ana', 'Bo', 'Cai'])
@@ -0,0 +1,66 @@
+# File: test_facets.py
+# Description: The per-process cache of search and chart filter choices
+
+from unittest import mock
+from django.test import TestCase
+from project import facets
+from project.facets import facet_choices, facet_counts, invalidate_facets
+from project.models import Parent, Student
+from .helpers import family, logged_in_client
+
+
+class FacetCacheTests(TestCase):
+    """Facets are read once, then served from memory until a write or FACET_TTL retires them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rai, (cls.ana, cls.bo) = family('Asha Rai', [('Ana', 3), ('Bo', 7)])
+        family('Dorji Wangchuk', [('Cai', 10)], town='Lowell', country='Bhutan')
+
+    def setUp(self):
+        # The cache outlives each test's rolled back transaction
+        invalidate_facets()
+        self.addCleanup(invalidate_facets)
+
+    def test_counts_and_choices(self):
+        self.assertEqual(facet_counts(Student, 'town_village'), [('Essex', 2), ('Lowell', 1)])
+        self.assertEqual(facet_choices(Parent, 'country_of_origin'),
+                         [('', 'All'), ('Bhutan', 'Bhutan (1)'), ('Nepal', 'Nepal (1)')])
+        self.assertEqual(facet_choices(Student, 'current_grade', blank_label=None),
+                         [(3, '3 (1)'), (7, '7 (1)'), (10, '10 (1)')])
+
+    def test_cached_until_a_write(self):
+        facet_counts(Student, 'town_village')
+        with self.assertNumQueries(0):
+            facet_counts(Student, 'town_village')
+
+        # A save in this process invalidates straight away
+        self.bo.town_village = 'Lowell'
+        self.bo.save()
+        self.assertEqual(facet_counts(Student, 'town_village'), [('Essex', 1), ('Lowell', 2)])
+
+        self.ana.delete()
+        self.assertEqual(facet_counts(Student, 'town_village'), [('Lowell', 2)])
+
+    def test_writes_only_invalidate_their_model(self):
+        facet_counts(Student, 'town_village')
+        facet_counts(Parent, 'town_village')
+        self.rai.town_village = 'Lowell'
+        self.rai.save()
+        with self.assertNumQueries(0):
+            facet_counts(Student, 'town_village')
+        self.assertEqual(facet_counts(Parent, 'town_village'), [('Lowell', 2)])
+
+    def test_expires_after_ttl(self):
+        # A write in another process only shows once the entry expires
+        facet_counts(Student, 'country_of_origin')
+        Student.objects.filter(pk=self.ana.pk).update(country_of_origin='Congo')
+        self.assertEqual(facet_counts(Student, 'country_of_origin'), [('Bhutan', 1), ('Nepal', 2)])
+        with mock.patch.object(facets.time, 'monotonic', return_value=facets.time.monotonic() + facets.FACET_TTL + 1):
+            self.assertEqual(facet_counts(Student, 'country_of_origin'), [('Bhutan', 1), ('Congo', 1), ('Nepal', 1)])
+
+    def test_search_form_uses_the_cache(self):
+        logged_in_client().get('/project/search/')
+        with self.assertNumQueries(0):
+            for field in ['country_of_origin', 'current_grade', 'town_village']:
+                facet_choices(Student, field)
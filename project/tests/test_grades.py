@@ -0,0 +1,143 @@
+# File: test_grades.py
+# Description: Grade-at-service stamps on sessions, their backfill, and the yearly grade rollover
+
+from datetime import date
+from importlib import import_module
+from io import StringIO
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from project.grades import grade_at, school_year_of
+from project.models import Student, TutoringService, AdvocacyService, GradeRollover, MonthlyServiceRollup
+from .helpers import DerivedTablesMixin, advocacy, family, tutoring
+
+THIS_YEAR = school_year_of(date.today())
+
+
+class GradeAtTests(TestCase):
+    """School years start on July 1, and a student's grade drops by one per school year back."""
+
+    def test_school_year_of(self):
+        self.assertEqual(school_year_of(date(2024, 6, 30)), 2023)
+        self.assertEqual(school_year_of(date(2024, 7, 1)), 2024)
+
+    def test_grade_at(self):
+        today = date(2024, 10, 1)
+        self.assertEqual(grade_at(7, date(2024, 9, 1), today), 7)
+        self.assertEqual(grade_at(7, date(2024, 6, 30), today), 6)
+        self.assertEqual(grade_at(7, date(2021, 7, 1), today), 4)
+        self.assertIsNone(grade_at(None, date(2024, 9, 1), today))
+
+
+class StampingTests(TestCase):
+    """Saving a session stamps it with the school year and the student's grade then."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, (cls.ana, cls.bo) = family('Asha Rai', [('Ana', 10), ('Bo', 3)])
+
+    def test_new_session_is_stamped(self):
+        session = tutoring(self.ana, date(2024, 1, 15))
+        self.assertEqual(session.school_year, 2023)
+        self.assertEqual(session.grade_at_service, 10 - (THIS_YEAR - 2023))
+        session = advocacy(self.ana, date(2024, 9, 1))
+        self.assertEqual((session.school_year, session.grade_at_service), (2024, 10 - (THIS_YEAR - 2024)))
+
+    def test_unchanged_session_keeps_its_stamp(self):
+        session = tutoring(self.ana, date(2024, 1, 15))
+        Student.objects.filter(pk=self.ana.pk).update(current_grade=12)
+        session.refresh_from_db()
+        session.length_of_session = 3
+        session.save()
+        session.refresh_from_db()
+        self.assertEqual(session.grade_at_service, 10 - (THIS_YEAR - 2023))
+
+    def test_moved_session_is_restamped(self):
+        session = tutoring(self.ana, date(2024, 1, 15))
+        session.date_of_contact = date(2024, 9, 1)
+        session.save()
+        self.assertEqual((session.school_year, session.grade_at_service), (2024, 10 - (THIS_YEAR - 2024)))
+        session.student = self.bo
+        session.save()
+        self.assertEqual(session.grade_at_service, 3 - (THIS_YEAR - 2024))
+
+
+class BackfillGradesTests(TestCase):
+    """The backfill_grades command and migration 0014 stamp sessions saved before the columns existed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, (ana,) = family('Asha Rai', [('Ana', 10)])
+        cls.tutoring = tutoring(ana, date(2024, 1, 15))
+        cls.advocacy = advocacy(ana, date(2024, 9, 1))
+        cls.expected = {
+            cls.tutoring.pk: (2023, 10 - (THIS_YEAR - 2023)),
+            cls.advocacy.pk: (2024, 10 - (THIS_YEAR - 2024)),
+        }
+
+    def unstamp(self):
+        for model in (TutoringService, AdvocacyService):
+            model.objects.update(school_year=None, grade_at_service=None)
+
+    def stamps(self):
+        return {
+            pk: (school_year, grade)
+            for model in (TutoringService, AdvocacyService)
+            for pk, school_year, grade in model.objects.values_list('pk', 'school_year', 'grade_at_service')
+        }
+
+    def test_command_stamps_unstamped_sessions(self):
+        self.unstamp()
+        call_command('backfill_grades', stdout=StringIO())
+        self.assertEqual(self.stamps(), self.expected)
+
+    def test_command_leaves_stamped_sessions_unless_restamping(self):
+        TutoringService.objects.update(grade_at_service=1)
+        call_command('backfill_grades', stdout=StringIO())
+        self.assertEqual(TutoringService.objects.get().grade_at_service, 1)
+        call_command('backfill_grades', '--restamp', stdout=StringIO())
+        self.assertEqual(self.stamps(), self.expected)
+
+    def test_migration_stamps_existing_sessions(self):
+        self.unstamp()
+        import_module('project.migrations.0014_grade_at_service').backfill_grades(apps, None)
+        self.assertEqual(self.stamps(), self.expected)
+
+
+class RolloverTests(DerivedTablesMixin, TestCase):
+    """rollover_school_year moves K-12 students up a grade once per school year."""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            _, (cls.ana, cls.bo, cls.cai) = family('Asha Rai', [('Ana', 3), ('Bo', 12), ('Cai', 13)])
+            cls.session = tutoring(cls.ana, date(2024, 1, 15))
+
+    def test_promotes_k_through_12(self):
+        out = StringIO()
+        call_command('rollover_school_year', '--school-year', '2030', stdout=out)
+        self.assertIn('2 students promoted for 2030-2031', out.getvalue())
+        grades = dict(Student.objects.values_list('first_name', 'current_grade'))
+        self.assertEqual(grades, {'Ana': 4, 'Bo': 13, 'Cai': 13})
+        self.assertEqual(GradeRollover.objects.get().students, 2)
+
+    def test_sessions_keep_their_grade_and_the_cube_follows(self):
+        call_command('rollover_school_year', '--school-year', '2030', stdout=StringIO())
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.grade_at_service, 3 - (THIS_YEAR - 2023))
+        self.assertEqual(list(MonthlyServiceRollup.objects.values_list('school_level', flat=True)),
+                         ['Middle School'])
+        self.assertMatchesRebuild()
+
+    def test_refuses_the_same_year_twice(self):
+        call_command('rollover_school_year', '--school-year', '2030', stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, 'already rolled over for 2030-2031'):
+            call_command('rollover_school_year', '--school-year', '2030', stdout=StringIO())
+        self.assertEqual(Student.objects.get(pk=self.ana.pk).current_grade, 4)
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('rollover_school_year', '--school-year', '2030', '--dry-run', stdout=out)
+        self.assertIn('2 students would be promoted for 2030-2031', out.getvalue())
+        self.assertEqual(Student.objects.get(pk=self.ana.pk).current_grade, 3)
+        self.assertFalse(GradeRollover.objects.exists())
@@ -0,0 +1,407 @@
+# File: test_importer.py
+# Description: The forms importer (import_forms) and the derived tables it refreshes
+
+import csv
+import os
+import tempfile
+from datetime import date, datetime
+from io import StringIO
+from unittest import mock
+import pandas as pd
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+from project.form_parsing import (
+    ADVOCACY_CONTACT, INTAKE, REJECT_REASON, STUDENT_COLUMNS, TIMESTAMP_FORMAT, TUTORING_CONTACT, fingerprint_rows,
+    prepare_chunk,
+)
+from project.importer import FormsImporter, StudentResolver
+from project.models import Parent, Student, TutoringService, AdvocacyService, ServiceEvent, ImportSource, IngestedFile
+from .helpers import DerivedTablesMixin, derived_tables, family
+
+
+
+# Every column the importer reads from a forms export
+FORM_COLUMNS = [
+    'Timestamp', 'Email', 'Choose Form Type', 'Parent first name', 'Parent last name', 'Phone number', 'Address',
+    'Town/ Village', 'Country of origin', 'Student first name', 'Student last name', 'Date of birth', 'Current grade',
+    'Student #2 first name', 'Student #2 last name', 'Student #2 date of birth', 'Student #2 current grade',
+    'Student #3 first name', 'Student #3 last name', 'Student #3 date of birth', 'Student #3 current grade',
+    'Student first nameB', 'Student last nameB', 'Date of contactB', 'Location of contact', 'Length of session',
+    'Focus', 'Activity', 'School districtB',
+    'Student first nameC', 'Student last nameC', 'Date of contactC', 'Length of contactC', 'Description of advocacy',
+    'School districtC',
+]
+
+
+def intake_row(submitted, parent, children, town='Essex', country='Nepal'):
+    row = {
+        'Timestamp': submitted, 'Choose Form Type': INTAKE, 'Parent first name': parent[0], 'Parent last name': parent[1],
+        'Town/ Village': town, 'Country of origin': country,
+    }
+    for (first, last, grade), (first_key, last_key, birth_key, grade_key) in zip(children, STUDENT_COLUMNS):
+        row.update({first_key: first, last_key: last, birth_key: '01/02/2014', grade_key: grade})
+    return row
+
+
+def tutoring_row(submitted, student, day, hours='1.5', focus='Math', district='Essex'):
+    return {
+        'Timestamp': submitted, 'Choose Form Type': TUTORING_CONTACT, 'Student first nameB': student[0],
+        'Student last nameB': student[1], 'Date of contactB': day, 'Location of contact': 'Library',
+        'Length of session': hours, 'Focus': focus, 'School districtB': district,
+    }
+
+
+def advocacy_row(submitted, student, day, hours='1', district='Essex'):
+    return {
+        'Timestamp': submitted, 'Choose Form Type': ADVOCACY_CONTACT, 'Student first nameC': student[0],
+        'Student last nameC': student[1], 'Date of contactC': day, 'Length of contactC': hours,
+        'School districtC': district,
+    }
+
+
+def submitted_time(timestamp):
+    """A form Timestamp as the aware datetime the importer stores."""
+    return timezone.make_aware(datetime.strptime(timestamp, TIMESTAMP_FORMAT))
+
+
+
+class ExportFileMixin:
+    """A forms export in a temporary directory, and the rows a small one holds."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(directory.name, 'forms.csv')
+        self.rows = [
+            intake_row('01/05/2024 09:00:00', ('Asha', 'Rai'), [('Ana', 'Rai', '3'), ('Bo', 'Rai', 'K')]),
+            intake_row('01/06/2024 09:00:00', ('Dorji', 'Wangchuk'), [('Cai', 'Wangchuk', '10')], town='Lowell', country='Bhutan'),
+            tutoring_row('01/15/2024 10:00:00', ('Ana', 'Rai'), '01/15/2024'),
+            tutoring_row('01/15/2024 10:05:00', ('Bo', 'Rai'), '01/15/2024', focus='Reading'),
+            advocacy_row('01/20/2024 11:00:00', ('Cai', 'Wangchuk'), '01/19/2024', district='Lowell'),
+            tutoring_row('02/02/2024 10:00:00', ('Ana', 'Rai'), '02/01/2024', hours='2'),
+        ]
+
+    def write(self, rows, path=None):
+        with open(path or self.path, 'w', newline='', encoding='utf-8') as export:
+            writer = csv.DictWriter(export, FORM_COLUMNS, restval='')
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def run_import(self, path=None, **options):
+        return FormsImporter(**options).run(path or self.path)
+
+
+class ImportTests(ExportFileMixin, DerivedTablesMixin, TestCase):
+    """Chunked bulk imports, and the derived tables they refresh."""
+
+    def test_import(self):
+        self.write(self.rows)
+        stats = self.run_import(chunk_size=2)
+        self.assertEqual((stats.rows, stats.parents, stats.students, stats.tutoring, stats.advocacy), (6, 2, 3, 3, 1))
+        ana = Student.objects.get(first_name='Ana')
+        self.assertEqual((ana.parent.last_name, ana.current_grade, ana.country_of_origin), ('Rai', 3, 'Nepal'))
+        self.assertEqual(Student.objects.get(first_name='Bo').current_grade, 0)
+        self.assertEqual(sorted(TutoringService.objects.values_list('student__first_name', 'length_of_session')),
+                         [('Ana', 1.5), ('Ana', 2), ('Bo', 1.5)])
+        # The first service row decides a new student's district
+        self.assertEqual(Student.objects.get(first_name='Cai').town_village, 'Lowell')
+        self.assertEqual(ServiceEvent.objects.count(), 4)
+        self.assertMatchesRebuild()
+
+    def test_single_transaction_rolls_back_the_whole_file(self):
+        self.write(self.rows)
+        write_chunk = FormsImporter._write_chunk
+        chunks = []
+
+        def crash_on_second_chunk(importer, rows):
+            chunks.append(rows)
+            if len(chunks) == 2:
+                raise RuntimeError("killed")
+            write_chunk(importer, rows)
+
+        with mock.patch.object(FormsImporter, '_write_chunk', crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.run_import(chunk_size=2, single_transaction=True)
+        self.assertFalse(Parent.objects.exists())
+        self.assertFalse(Student.objects.exists())
+
+    def test_command(self):
+        self.write(self.rows)
+        out = StringIO()
+        call_command('import_forms', self.path, '--chunk-size', '4', stdout=out)
+        self.assertIn('2 parents, 3 students, 3 tutoring, 1 advocacy', out.getvalue())
+        self.assertEqual(AdvocacyService.objects.get().student.first_name, 'Cai')
+        self.assertMatchesRebuild()
+
+
+class StudentResolverTests(ExportFileMixin, TestCase):
+    """Contact rows are matched to students by name, in memory, as of their point in the file."""
+
+    def test_names_match_regardless_of_case_and_spacing(self):
+        _, (ana,) = family('Asha Rai', [('Ana', 3)])
+        resolver = StudentResolver().load()
+        self.assertEqual([known.pk for known in resolver.resolve('  ana ', 'RAI')], [ana.pk])
+        self.assertEqual(resolver.resolve('Ana', 'Wangchuk'), [])
+
+    def test_parent_name_tells_shared_names_apart(self):
+        _, (rai,) = family('Asha Rai', [('Ana', 3)])
+        _, (other,) = family('Mina Rai', [('Ana', 5)])
+        resolver = StudentResolver().load()
+        self.assertEqual(len(resolver.resolve('Ana', 'Rai')), 2)
+        self.assertEqual([known.pk for known in resolver.resolve('Ana', 'Rai', 'mina', 'rai')], [other.pk])
+
+    def test_unresolved_rows_are_skipped_and_reported(self):
+        family('Mina Rai', [('Ana', 5)])
+        self.write([
+            # Before the intake that adds the student: not found yet
+            tutoring_row('01/04/2024 10:00:00', ('Cai', 'Wangchuk'), '01/04/2024'),
+            tutoring_row('01/04/2024 10:30:00', ('bo', ' rai'), '01/04/2024'),
+        ] + self.rows)
+        report = os.path.join(self.directory, 'report.csv')
+        out = StringIO()
+        call_command('import_forms', self.path, '--report', report, stdout=out)
+        self.assertIn("4 contact rows didn't match exactly one student", out.getvalue())
+
+        with open(report, newline='', encoding='utf-8') as unresolved:
+            rows = [(row['row'], row['student'], row['problem']) for row in csv.DictReader(unresolved)]
+        self.assertEqual(rows, [
+            ('1', 'Cai Wangchuk', 'not found'), ('2', 'bo  rai', 'not found'),
+            # The Ana Rai from the file and the one already in the database
+            ('5', 'Ana Rai', 'ambiguous'), ('8', 'Ana Rai', 'ambiguous'),
+        ])
+        self.assertEqual(sorted(TutoringService.objects.values_list('student__first_name', flat=True)), ['Bo'])
+
+
+class FormParsingTests(ExportFileMixin, TestCase):
+    """Chunks are typed and validated column-wise; bad rows are rejected with a reason."""
+
+    def frame(self, rows):
+        return pd.DataFrame(rows, columns=FORM_COLUMNS, dtype=str).fillna('')
+
+    def test_typed_values(self):
+        clean, rejected = prepare_chunk(self.frame([
+            intake_row('01/05/2024 09:00:00', ('Asha', 'Rai'), [('Ana', 'Rai', 'K'), ('Bo', 'Rai', 'OS'), ('Cai', 'Rai', ' 7 ')]),
+            tutoring_row('01/15/2024 10:00:00', ('Ana', 'Rai'), '01/15/2024', hours='1.257'),
+        ]))
+        self.assertEqual(len(rejected), 0)
+        intake, tutoring = clean.to_dict('records')
+        self.assertEqual(intake['Timestamp'], date(2024, 1, 5))
+        self.assertEqual(intake['Date of birth'], date(2014, 1, 2))
+        self.assertEqual([intake[grade] for _, _, _, grade in STUDENT_COLUMNS], [0, 13, 7])
+        self.assertEqual(tutoring['Date of contactB'], date(2024, 1, 15))
+        self.assertEqual(tutoring['Length of session'], 1.26)
+
+    def test_bad_rows_are_rejected_with_a_reason(self):
+        rows = [
+            intake_row('soon', ('Asha', 'Rai'), [('Ana', 'Rai', '3')]),
+            intake_row('01/05/2024 09:00:00', ('Asha', 'Rai'), [('Ana', 'Rai', '3.5')]),
+            tutoring_row('01/15/2024 10:00:00', ('Ana', 'Rai'), '13/45/2024'),
+            advocacy_row('01/15/2024 10:00:00', ('Ana', 'Rai'), '01/15/2024', hours='150'),
+            tutoring_row('01/15/2024 10:00:00', ('Ana', 'Rai'), '01/15/2024', hours='an hour'),
+        ]
+        clean, rejected = prepare_chunk(self.frame(rows))
+        self.assertEqual(len(clean), 0)
+        self.assertEqual(list(rejected[REJECT_REASON]), [
+            'bad Timestamp', 'bad Current grade', 'bad Date of contactB', 'bad Length of contactC',
+            'bad Length of session',
+        ])
+        # Rejected rows keep their cells as they were in the file
+        self.assertEqual(list(rejected['Date of contactB'])[2], '13/45/2024')
+
+    def test_import_writes_rejects_file(self):
+        self.write(self.rows[:2] + [
+            tutoring_row('01/15/2024 10:00:00', ('Ana', 'Rai'), 'yesterday'),
+            {'Timestamp': '01/16/2024 10:00:00', 'Choose Form Type': 'Feedback'},
+        ] + self.rows[2:])
+        rejects = os.path.join(self.directory, 'rejects.csv')
+        stats = self.run_import(chunk_size=3, rejects_path=rejects)
+        self.assertEqual((stats.rejected, stats.skipped, stats.tutoring, stats.advocacy), (1, 1, 3, 1))
+        with open(rejects, newline='', encoding='utf-8') as rejected:
+            rows = list(csv.DictReader(rejected))
+        self.assertEqual([(row['Date of contactB'], row[REJECT_REASON]) for row in rows],
+                         [('yesterday', 'bad Date of contactB')])
+
+    def test_fingerprint_ignores_empty_cells_and_column_order(self):
+        row = tutoring_row('01/15/2024 10:00:00', ('Ana', 'Rai'), '01/15/2024')
+        fingerprint = fingerprint_rows(self.frame([row]))[0]
+        reordered = pd.DataFrame([row], columns=list(reversed(row)) + ['A new question'], dtype=str).fillna('')
+        self.assertEqual(fingerprint_rows(reordered)[0], fingerprint)
+        self.assertNotEqual(fingerprint_rows(self.frame([{**row, 'Length of session': '2'}]))[0], fingerprint)
+
+
+def crashing_write_chunk(crash_on):
+    """A FormsImporter._write_chunk that raises instead of writing chunk number crash_on (1-based)."""
+    write_chunk = FormsImporter._write_chunk
+    chunks = []
+
+    def write_or_crash(importer, rows):
+        chunks.append(rows)
+        if len(chunks) == crash_on:
+            raise RuntimeError("killed")
+        write_chunk(importer, rows)
+    return write_or_crash
+
+
+class ImportTrackingTests(ExportFileMixin, DerivedTablesMixin, TestCase):
+    """Reimports, --incremental runs and imports after a crash."""
+
+    def crash_import(self, path=None):
+        """Import the export two rows a chunk, stopping at the third chunk as a killed run would."""
+        with mock.patch.object(FormsImporter, '_write_chunk', crashing_write_chunk(3)):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, chunk_size=2)
+        self.assertEqual(ImportSource.objects.get(name='forms').checkpoint_row, 4)
+
+    def test_reimport_writes_nothing_new(self):
+        self.write(self.rows)
+        self.run_import()
+        before = derived_tables()
+        stats = self.run_import()
+        self.assertEqual((stats.parents, stats.students, stats.tutoring, stats.advocacy), (0, 0, 0, 0))
+        self.assertEqual(stats.already_imported, len(self.rows))
+        self.assertEqual(derived_tables(), before)
+
+    def test_rows_added_to_the_export(self):
+        self.write(self.rows)
+        self.run_import()
+        self.write(self.rows + [
+            advocacy_row('03/01/2024 10:00:00', ('Bo', 'Rai'), '01/31/2024'),
+            intake_row('03/02/2024 10:00:00', ('Lin', 'Zhou'), [('Wei', 'Zhou', '5')], town='', country='China'),
+            tutoring_row('03/03/2024 10:00:00', ('Wei', 'Zhou'), '03/03/2024', district='Salem'),
+        ])
+        stats = self.run_import()
+        self.assertEqual((stats.students, stats.tutoring, stats.advocacy), (1, 1, 1))
+        self.assertMatchesRebuild()
+
+    def test_incremental_retries_unresolved_rows(self):
+        self.write(self.rows[:4] + [tutoring_row('01/16/2024 10:00:00', ('Dawa', 'Sherpa'), '01/16/2024')] + self.rows[4:])
+        stats = self.run_import()
+        self.assertEqual([problem for _, _, _, problem, _ in stats.unresolved], ['not found'])
+        # The watermark stays at the row that didn't resolve, so the next run reads it again
+        source = ImportSource.objects.get(name='forms')
+        self.assertEqual(source.watermark, submitted_time('01/16/2024 10:00:00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(first_name='Dawa', last_name='Sherpa', parent=Parent.objects.get(first_name='Asha'),
+                                   town_village='Essex', current_grade=4)
+        out = StringIO()
+        call_command('import_forms', self.path, '--incremental', stdout=out)
+        self.assertIn('1 tutoring', out.getvalue())
+        self.assertTrue(TutoringService.objects.filter(student__first_name='Dawa').exists())
+        self.assertMatchesRebuild()
+
+    def test_incremental_skips_rows_before_the_watermark(self):
+        self.write(self.rows)
+        self.run_import()
+        late_entry = tutoring_row('01/10/2024 10:00:00', ('Cai', 'Wangchuk'), '01/09/2024', district='Lowell')
+        self.write(self.rows + [late_entry])
+
+        stats = self.run_import(incremental=True)
+        self.assertEqual(stats.tutoring, 0)
+        stats = self.run_import()
+        self.assertEqual(stats.tutoring, 1)
+        self.assertMatchesRebuild()
+
+    def test_resumed_import_rebuilds_derived_tables(self):
+        self.write(self.rows)
+        self.crash_import()
+
+        stats = self.run_import(chunk_size=2)
+        self.assertEqual((stats.tutoring, stats.advocacy), (1, 1))
+        self.assertEqual(ImportSource.objects.get(name='forms').checkpoint_row, 0)
+        self.assertEqual(ServiceEvent.objects.count(), 4)
+        self.assertMatchesRebuild()
+
+    def test_import_of_another_file_after_a_crash_rebuilds_derived_tables(self):
+        self.write(self.rows)
+        self.crash_import()
+
+        # The same export downloaded again under another name: the rows the
+        # crashed run committed are skipped by fingerprint, not by checkpoint
+        other_path = os.path.join(self.directory, 'forms-again.csv')
+        self.write(self.rows, other_path)
+        stats = self.run_import(other_path, chunk_size=2)
+        self.assertEqual((stats.already_imported, stats.tutoring, stats.advocacy), (4, 1, 1))
+        self.assertEqual(ImportSource.objects.get(name='forms').checkpoint_row, 0)
+        self.assertEqual(ServiceEvent.objects.count(), 4)
+        self.assertMatchesRebuild()
+
+
+class FastImportTests(ExportFileMixin, DerivedTablesMixin, TestCase):
+    """import_forms --fast (COPY on PostgreSQL, executemany on SQLite) writes what bulk_create would."""
+
+    def imported(self):
+        return {
+            'students': sorted(Student.objects.values_list(
+                'first_name', 'parent__last_name', 'current_grade', 'town_village', 'country_of_origin')),
+            'tutoring': sorted(TutoringService.objects.values_list(
+                'student__first_name', 'date_of_contact', 'length_of_session', 'session_focus', 'grade_at_service')),
+            'subjects': sorted(TutoringService.subjects.through.objects.values_list(
+                'tutoringservice__student__first_name', 'subject__name')),
+            'advocacy': sorted(AdvocacyService.objects.values_list(
+                'student__first_name', 'date_of_contact', 'length_of_contact')),
+        }
+
+    def test_same_data_as_bulk_create(self):
+        self.write(self.rows)
+        with transaction.atomic():
+            self.run_import()
+            expected = self.imported()
+            transaction.set_rollback(True)
+
+        stats = self.run_import(fast=True)
+        self.assertEqual((stats.parents, stats.students, stats.tutoring, stats.advocacy), (2, 3, 3, 1))
+        self.assertEqual(self.imported(), expected)
+        self.assertMatchesRebuild()
+
+    def test_ids_continue_after_a_fast_import(self):
+        family('Mina Rai', [('Ana', 5)])
+        self.write(self.rows)
+        self.run_import(fast=True)
+        # New rows written the ordinary way get the next ids (on PostgreSQL, from the reset sequences)
+        _, (student,) = family('Lin Zhou', [('Wei', 5)])
+        self.assertEqual(student.pk, Student.objects.exclude(pk=student.pk).order_by('-pk')[0].pk + 1)
+        self.assertEqual(Student.objects.count(), 5)
+
+
+class IngestWorkerTests(ExportFileMixin, DerivedTablesMixin, TestCase):
+    """ingest_worker imports each export dropped into its folder."""
+
+    def ingest(self):
+        out = StringIO()
+        # It would close the test's connection, which is inside the test transaction
+        with mock.patch('project.management.commands.ingest_worker.close_old_connections'):
+            call_command('ingest_worker', self.directory, '--once', '--settle', '0', '--parse-workers', '0',
+                         '--chunk-size', '2', stdout=out)
+        return out.getvalue()
+
+    def test_imports_each_file_once(self):
+        self.write(self.rows[:3], os.path.join(self.directory, 'a.csv'))
+        self.write(self.rows, os.path.join(self.directory, 'b.csv'))
+        self.ingest()
+        self.assertEqual(sorted(IngestedFile.objects.values_list('status', 'rows')),
+                         [(IngestedFile.DONE, 3), (IngestedFile.DONE, 6)])
+        self.assertEqual(ServiceEvent.objects.count(), 4)
+        self.ingest()
+        self.assertEqual(IngestedFile.objects.count(), 2)
+        self.assertMatchesRebuild()
+
+    def test_file_after_a_failed_one_rebuilds_derived_tables(self):
+        self.write(self.rows, os.path.join(self.directory, 'a.csv'))
+        # The next export repeats the rows the failed one committed, which are skipped by fingerprint
+        self.write(self.rows + [
+            tutoring_row('03/03/2024 10:00:00', ('Cai', 'Wangchuk'), '03/03/2024', district='Lowell'),
+        ], os.path.join(self.directory, 'b.csv'))
+        with mock.patch.object(FormsImporter, '_write_chunk', crashing_write_chunk(3)):
+            output = self.ingest()
+        self.assertIn('a.csv failed', output)
+        self.assertEqual(
+            list(IngestedFile.objects.order_by('path').values_list('status', flat=True)),
+            [IngestedFile.FAILED, IngestedFile.DONE],
+        )
+        self.assertEqual(ServiceEvent.objects.count(), 5)
+        self.assertMatchesRebuild()
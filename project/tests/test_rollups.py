@@ -0,0 +1,150 @@
+# File: test_rollups.py
+# Description: The service ledger, daily rollups, cube and served sets kept by the signal handlers, and the home page
+
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.test import TestCase
+from django.utils.timezone import now
+from project.caching import data_version
+from project.models import ServiceEvent
+from project.views import home_stats
+from .helpers import DerivedTablesMixin, advocacy, derived_tables, family, logged_in_client, tutoring
+
+
+class DerivedTablesTests(DerivedTablesMixin, TestCase):
+    """Writes through the ORM keep the ledger, rollups, cube and served sets equal to a rebuild."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Built by the signal handlers themselves, so the tables start out maintained
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.rai, (cls.ana, cls.bo) = family('Asha Rai', [('Ana', 3), ('Bo', 7)])
+            cls.wangchuk, (cls.cai,) = family('Dorji Wangchuk', [('Cai', 10)], town='Lowell', country='Bhutan')
+            cls.session = tutoring(cls.ana, date(2024, 1, 15))
+            tutoring(cls.ana, date(2024, 1, 31), hours=2)
+            tutoring(cls.bo, date(2024, 1, 15), focus='Reading')
+            tutoring(cls.cai, date(2024, 2, 10))
+            cls.advocacy = advocacy(cls.ana, date(2024, 1, 15))
+            advocacy(cls.cai, date(2024, 3, 5), hours=Decimal('0.5'))
+
+    def test_fixture_matches_rebuild(self):
+        self.assertEqual(ServiceEvent.objects.count(), 6)
+        self.assertMatchesRebuild()
+
+    def test_new_session(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tutoring(self.bo, date(2024, 2, 29), hours=3)
+            advocacy(self.cai, date(2024, 1, 15))
+        self.assertMatchesRebuild()
+
+    def test_session_moved_to_another_month_and_student(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.date_of_contact = date(2024, 3, 1)
+            self.session.student = self.cai
+            self.session.save()
+        self.assertMatchesRebuild()
+
+    def test_session_hours_changed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.advocacy.length_of_contact = 4
+            self.advocacy.save()
+        self.assertMatchesRebuild()
+
+    def test_session_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.delete()
+        self.assertMatchesRebuild()
+
+    def test_student_district_grade_and_country_changed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.town_village = 'Lowell'
+            self.ana.current_grade = 9
+            self.ana.country_of_origin = 'Congo'
+            self.ana.save()
+        self.assertMatchesRebuild()
+
+    def test_student_moved_to_another_parent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bo.parent = self.wangchuk
+            self.bo.save()
+        self.assertMatchesRebuild()
+
+    def test_parent_country_changed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rai.country_of_origin = 'Somalia'
+            self.rai.save()
+        self.assertMatchesRebuild()
+
+    def test_student_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.delete()
+        self.assertFalse(ServiceEvent.objects.filter(student_id=self.ana.pk).exists())
+        self.assertMatchesRebuild()
+
+    def test_parent_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rai.delete()
+        self.assertMatchesRebuild()
+
+    def test_several_writes_in_one_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                tutoring(self.cai, date(2024, 1, 15))
+                self.advocacy.delete()
+                self.bo.town_village = 'Lowell'
+                self.bo.save()
+        self.assertMatchesRebuild()
+
+    def test_rolled_back_write_changes_nothing(self):
+        before = derived_tables()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    tutoring(self.cai, date(2024, 6, 1), hours=5)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(derived_tables(), before)
+        self.assertMatchesRebuild()
+
+    def test_write_bumps_data_version(self):
+        version = data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            tutoring(self.bo, date(2024, 2, 1))
+        self.assertGreater(data_version(), version)
+
+
+class HomeStatsTests(TestCase):
+    """The home page's served counts and hours, read from the rollup tables."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = now().date()
+        with cls.captureOnCommitCallbacks(execute=True):
+            _, (ana, bo) = family('Asha Rai', [('Ana', 3), ('Bo', 7)])
+            _, (cai,) = family('Dorji Wangchuk', [('Cai', 10)], town='Lowell', country='Bhutan')
+            tutoring(ana, cls.today - timedelta(days=3), hours=2)
+            tutoring(ana, cls.today - timedelta(days=5))
+            advocacy(bo, cls.today - timedelta(days=40))
+            tutoring(cai, cls.today - timedelta(days=200), hours=Decimal('1.5'))
+            tutoring(cai, cls.today - timedelta(days=400), hours=8)
+
+    def test_served_counts_and_hours(self):
+        stats = home_stats(self.today)
+        self.assertEqual((stats['students_in_last_thirty_days'], stats['families_in_last_thirty_days']), (1, 1))
+        self.assertEqual((stats['students_in_last_six_months'], stats['families_in_last_six_months']), (2, 1))
+        self.assertEqual((stats['students_in_last_year'], stats['families_in_last_year']), (3, 2))
+        # Only the last 12 months count
+        self.assertEqual(stats['tutoring_hours'], Decimal('4.5'))
+        self.assertEqual(stats['advocacy_hours'], 1)
+        self.assertEqual([row['count'] for row in stats['students_by_town']], [2, 1])
+
+    def test_home_page(self):
+        response = logged_in_client().get('/project/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'In the last 1 year: 3')
+        self.assertContains(response, '4.5 Tutoring hours')
+
+    def test_home_page_needs_login(self):
+        self.assertRedirects(self.client.get('/project/'), '/project/login/?next=/project/', fetch_redirect_response=False)
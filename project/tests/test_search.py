@@ -0,0 +1,65 @@
+# File: test_search.py
+# Description: Name search for students and parents (FTS5 on SQLite, pg_trgm on PostgreSQL)
+
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import TestCase
+from project.models import Parent, Student
+from project.search import FTS_TRIGGERS, _backend_available, _fts_table, repair_name_search, search_by_name
+from .helpers import logged_in_client
+
+
+
+class NameSearchTests(TestCase):
+    """Every part of a query has to match, and the index follows renames, deletes and table rebuilds."""
+
+    @classmethod
+    def setUpTestData(cls):
+        parent = Parent.objects.create(first_name='Maria', last_name='Garcia')
+        cls.student = Student.objects.create(first_name='Ada', last_name='Quokka', parent=parent)
+        Student.objects.create(first_name='Ben', last_name='Garcia', parent=parent)
+
+    def setUp(self):
+        _backend_available.cache_clear()
+        self.addCleanup(_backend_available.cache_clear)
+
+    def found(self, search_name):
+        return set(search_by_name(Student.objects.all(), search_name).values_list('id', flat=True))
+
+    def test_every_part_of_the_name_must_match(self):
+        self.assertEqual(self.found('ada quokka'), {self.student.pk})
+        self.assertEqual(self.found('quokka ada'), {self.student.pk})
+        self.assertEqual(self.found('ben quokka'), set())
+
+    def test_renamed_and_deleted_students(self):
+        self.student.last_name = 'Wombat'
+        self.student.save()
+        self.assertEqual(self.found('wombat'), {self.student.pk})
+        self.assertEqual(self.found('quokka'), set())
+        self.student.delete()
+        self.assertEqual(self.found('wombat'), set())
+
+    def test_sqlite_triggers_restored_after_a_table_rebuild(self):
+        if connection.vendor != 'sqlite' or not _backend_available('sqlite', 'project_student'):
+            self.skipTest("needs the SQLite FTS5 name index")
+        # What Django's table rebuild during a migration does to them
+        fts = _fts_table('project_student')
+        with connection.cursor() as cursor:
+            for suffix in FTS_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER {fts}_{suffix}")
+        _backend_available.cache_clear()
+
+        # Without its triggers the index is stale, so search falls back to scanning
+        self.student.last_name = 'Wombat'
+        self.student.save()
+        self.assertFalse(_backend_available('sqlite', 'project_student'))
+        self.assertEqual(self.found('wombat'), {self.student.pk})
+
+        repair_name_search(using=DEFAULT_DB_ALIAS)
+        self.assertTrue(_backend_available('sqlite', 'project_student'))
+        self.assertEqual(self.found('wombat'), {self.student.pk})
+        self.assertEqual(self.found('quokka'), set())
+
+    def test_student_search_page(self):
+        response = logged_in_client().get('/project/search/', {'search_name': 'garcia'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([student.first_name for student in response.context['students']], ['Ben'])
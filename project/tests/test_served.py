@@ -0,0 +1,56 @@
+# File: test_served.py
+# Description: The daily served sets, and the distinct student and family counts unioned from them
+
+from datetime import date
+from django.test import TestCase
+from project.served import pack_ids, served_counts, served_total, union_ids, unpack_ids
+from .helpers import DerivedTablesMixin, advocacy, family, tutoring
+
+
+class PackedIdsTests(TestCase):
+    """Id sets are stored sorted and de-duplicated, and union back the same way."""
+
+    def test_pack_and_union(self):
+        self.assertEqual(list(unpack_ids(pack_ids([5, 3, 5, 2**40]))), [3, 5, 2**40])
+        self.assertEqual(pack_ids([]), b'')
+        self.assertEqual(list(union_ids([pack_ids([1, 4]), pack_ids([4, 2]), b''])), [1, 2, 4])
+
+
+class ServedCountsTests(DerivedTablesMixin, TestCase):
+    """Distinct students and families over a window, however many days and cells they show up in."""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            _, (cls.ana, cls.bo) = family('Asha Rai', [('Ana', 3), ('Bo', 10)])
+            _, (cls.cai,) = family('Dorji Wangchuk', [('Cai', 7)], town='Lowell', country='Bhutan')
+            tutoring(cls.ana, date(2024, 1, 10))
+            advocacy(cls.ana, date(2024, 1, 10))
+            tutoring(cls.ana, date(2024, 2, 1))
+            tutoring(cls.bo, date(2024, 2, 1))
+            tutoring(cls.cai, date(2024, 3, 5))
+
+    def test_total_counts_each_person_once(self):
+        self.assertEqual(served_total(date(2024, 1, 1)), {'students': 3, 'families': 2})
+        self.assertEqual(served_total(date(2024, 1, 1), date(2024, 2, 1)), {'students': 2, 'families': 1})
+        self.assertEqual(served_total(date(2025, 1, 1)), {'students': 0, 'families': 0})
+
+    def test_grouped_and_filtered(self):
+        self.assertEqual(served_counts(date(2024, 1, 1), group_by=['district']), {
+            ('Essex',): {'students': 2, 'families': 1},
+            ('Lowell',): {'students': 1, 'families': 1},
+        })
+        self.assertEqual(served_counts(date(2024, 1, 1), group_by=['school_level'], district=['Essex']), {
+            ('Elementary',): {'students': 1, 'families': 1},
+            ('High School',): {'students': 1, 'families': 1},
+        })
+
+    def test_edits_move_people_between_sets(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bo.town_village = 'Lowell'
+            self.bo.save()
+        self.assertEqual(served_counts(date(2024, 1, 1), group_by=['district']), {
+            ('Essex',): {'students': 1, 'families': 1},
+            ('Lowell',): {'students': 2, 'families': 2},
+        })
+        self.assertMatchesRebuild()
@@ -0,0 +1,29 @@
+# File: test_static.py
+# Description: plotly.js served as a content-hashed static file
+
+import re
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.test import TestCase
+from project.staticfiles import PLOTLY_SOURCE, plotly_js_name, plotly_js_path
+from .helpers import logged_in_client
+
+
+class PlotlyStaticFileTests(TestCase):
+    """The charts pages load the bundle from its hashed static URL instead of inlining it."""
+
+    def test_finder_exposes_hashed_bundle(self):
+        self.assertRegex(plotly_js_name(), settings.WHITENOISE_IMMUTABLE_FILE_TEST)
+        self.assertEqual(finders.find(plotly_js_path()), PLOTLY_SOURCE)
+        self.assertIsNone(finders.find('plotly/plotly.min.js'))
+
+    def test_charts_pages_reference_the_bundle(self):
+        client = logged_in_client()
+        with open(PLOTLY_SOURCE, encoding='utf-8') as bundle:
+            bundle_start = bundle.read(200)
+        for url in ['/project/charts/', '/project/charts/dashboard/']:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertContains(response, f'src="/static/{plotly_js_path()}"')
+                self.assertNotIn(bundle_start, response.content.decode())
+                self.assertEqual(len(re.findall(r'<script src="[^"]*plotly', response.content.decode())), 1)
@@ -0,0 +1,103 @@
+# File: test_subjects.py
+# Description: Subject rows parsed from the tutoring session focus, their backfill, and the search filter on them
+
+from datetime import date
+from importlib import import_module
+from io import StringIO
+from django.apps import apps
+from django.core.management import call_command
+from django.test import TestCase
+from project.facets import invalidate_facets
+from project.forms import StudentSearchForm
+from project.models import Subject, TutoringService
+from project.search import filter_students
+from project.subjects import SubjectLink, subject_names
+from .helpers import family, logged_in_client, tutoring
+
+
+def links():
+    return sorted(SubjectLink.objects.values_list('tutoringservice__session_focus', 'subject__name'))
+
+
+class SubjectNamesTests(TestCase):
+    """A session focus splits on slashes and commas into capitalized subjects, each once."""
+
+    def test_subject_names(self):
+        self.assertEqual(subject_names('math/reading, Science'), ['Math', 'Reading', 'Science'])
+        self.assertEqual(subject_names('MATH / math,, '), ['Math'])
+        self.assertEqual(subject_names(''), [])
+        self.assertEqual(subject_names(None), [])
+
+
+class SubjectLinkTests(TestCase):
+    """Saving a tutoring session links it to its subjects; the command and migration 0015 link older ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, (cls.ana, cls.bo) = family('Asha Rai', [('Ana', 3), ('Bo', 7)])
+        cls.session = tutoring(cls.ana, date(2024, 1, 15), focus='math/Reading')
+        tutoring(cls.bo, date(2024, 2, 1), focus='Science')
+        cls.expected = [('Science', 'Science'), ('math/Reading', 'Math'), ('math/Reading', 'Reading')]
+
+    def test_saving_links_subjects(self):
+        self.assertEqual(links(), self.expected)
+        self.session.session_focus = 'Science'
+        self.session.save()
+        self.assertEqual(links(), [('Science', 'Science'), ('Science', 'Science')])
+
+    def test_command_links_unlinked_sessions(self):
+        SubjectLink.objects.filter(tutoringservice=self.session).delete()
+        out = StringIO()
+        call_command('backfill_subjects', stdout=out)
+        self.assertIn('2 subject links written', out.getvalue())
+        self.assertEqual(links(), self.expected)
+
+    def test_command_relinks_everything(self):
+        TutoringService.objects.filter(pk=self.session.pk).update(session_focus='Art')
+        call_command('backfill_subjects', '--relink', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(links(), [('Art', 'Art'), ('Science', 'Science')])
+
+    def test_migration_links_existing_sessions(self):
+        SubjectLink.objects.all().delete()
+        Subject.objects.all().delete()
+        import_module('project.migrations.0015_subject').backfill_subjects(apps, None)
+        self.assertEqual(links(), self.expected)
+
+    def test_search_filter(self):
+        self.assertEqual([student.first_name for student in filter_students({'subject': 'Reading'})], ['Ana'])
+        response = logged_in_client().get('/project/search/', {'subject': 'Science'})
+        self.assertContains(response, 'Bo')
+        self.assertNotContains(response, 'Ana')
+
+
+class SubjectChoicesTests(TestCase):
+    """The search form's subject choices come from the facet cache and follow new and removed subjects."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, (cls.ana,) = family('Asha Rai', [('Ana', 3)])
+        tutoring(cls.ana, date(2024, 1, 15), focus='math/Reading')
+
+    def setUp(self):
+        invalidate_facets()
+        self.addCleanup(invalidate_facets)
+
+    def subject_choices(self):
+        return StudentSearchForm().fields['subject'].choices
+
+    def test_form_is_built_from_the_cache(self):
+        self.assertEqual(self.subject_choices(), [('', 'All'), ('Math', 'Math'), ('Reading', 'Reading')])
+        with self.assertNumQueries(0):
+            StudentSearchForm()
+
+    def test_new_subject_shows_up(self):
+        self.subject_choices()
+        tutoring(self.ana, date(2024, 2, 1), focus='Art')
+        self.assertEqual(self.subject_choices(), [('', 'All'), ('Art', 'Art'), ('Math', 'Math'), ('Reading', 'Reading')])
+
+    def test_saved_and_deleted_subjects(self):
+        self.subject_choices()
+        Subject.objects.create(name='Chemistry')
+        self.assertIn(('Chemistry', 'Chemistry'), self.subject_choices())
+        Subject.objects.get(name='Math').delete()
+        self.assertEqual(self.subject_choices(), [('', 'All'), ('Chemistry', 'Chemistry'), ('Reading', 'Reading')])
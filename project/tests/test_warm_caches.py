@@ -0,0 +1,72 @@
+# File: test_warm_caches.py
+# Description: The warm_caches command, which precomputes the home page statistics and charts into the cache
+
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TransactionTestCase
+from django.utils.timezone import now
+from project.caching import TIME_RANGES, chart_cache_key, home_cache_key
+from project.charts import CHART_TYPES, chart_data
+from project.management.commands import warm_caches
+from project.views import home_stats
+from .helpers import advocacy, family, tutoring
+
+# Every chart for each time range, unfiltered and for each of the fixture's two districts
+CHART_ENTRIES = (1 + len(TIME_RANGES)) * 3 * len(CHART_TYPES)
+
+
+class WarmCachesTests(TransactionTestCase):
+    """Every chart for each time range and district, and the home page when the cache is shared."""
+
+    # Committed data, so the command's worker threads can see it on their own connections
+    def setUp(self):
+        today = now().date()
+        _, (self.ana,) = family('Asha Rai', [('Ana', 3)])
+        _, (cai,) = family('Dorji Wangchuk', [('Cai', 10)], town='Lowell', country='Bhutan')
+        tutoring(self.ana, today - timedelta(days=3), hours=2)
+        tutoring(cai, today - timedelta(days=100))
+        advocacy(cai, today - timedelta(days=300))
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def warm(self, *args):
+        out = StringIO()
+        call_command('warm_caches', *args, '--workers', '2', stdout=out)
+        return out.getvalue()
+
+    def test_fills_every_chart(self):
+        output = self.warm()
+        today = date.today()
+        self.assertIn(f"{CHART_ENTRIES} entries cached", output)
+        for time_range in ('all',) + TIME_RANGES:
+            for towns in [[], ['Essex'], ['Lowell']]:
+                for chart_type in CHART_TYPES:
+                    with self.subTest(chart=chart_type, time_range=time_range, towns=towns):
+                        self.assertEqual(cache.get(chart_cache_key(chart_type, towns, [], time_range, today)),
+                                         chart_data(chart_type, towns, [], time_range, today))
+
+    def test_home_only_when_the_cache_is_shared(self):
+        output = self.warm()
+        self.assertIn("the web workers won't see these entries", output)
+        self.assertIsNone(cache.get(home_cache_key(now().date())))
+
+        with mock.patch.object(warm_caches, 'cache_is_shared', return_value=True):
+            output = self.warm()
+        self.assertIn("1 entries cached", output)
+        self.assertEqual(cache.get(home_cache_key(now().date())), home_stats(now().date()))
+
+    def test_skips_cached_entries_until_the_data_changes(self):
+        self.warm()
+        self.assertIn("Everything is already cached", self.warm())
+        self.assertIn(f"{CHART_ENTRIES} entries cached", self.warm('--force'))
+
+        # A write bumps the data version, so every entry is warmed again
+        tutoring(self.ana, now().date() - timedelta(days=1))
+        self.assertIn(f"{CHART_ENTRIES} entries cached", self.warm())
+
+    def test_needs_a_worker(self):
+        with self.assertRaisesMessage(CommandError, "--workers must be at least 1"):
+            call_command('warm_caches', '--workers', '0', stdout=StringIO())
@@ -1,16 +1,28 @@
 # File: urls.py
 # Author: Nathaniel Clizbe (clizbe@bu.edu), 12/10/2024
 # Description: URLS for the final project website (to navigate between pages and perform actions)
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from .views import HomePageView, StudentSearchView, StudentDetailView, ParentSearchView, ParentDetailView, StudentUpdateView, ParentUpdateView, add_advocacy_service, add_tutoring_service, IntakeView, charts_view, DeleteServiceView, DeleteAdvocacyServiceView, StudentDeleteView, ParentDeleteView
+from .views import HomePageView, StudentSearchView, StudentDetailView, ParentSearchView, ParentDetailView, StudentUpdateView, ParentUpdateView, add_advocacy_service, add_tutoring_service, IntakeView, charts_view, chart_dashboard, chart_data_api, export_view, DeleteServiceView, DeleteAdvocacyServiceView, StudentDeleteView, ParentDeleteView
+
+# Under ASGI the read-heavy pages can use their async versions (see ASYNC_VIEWS in settings.py)
+if settings.ASYNC_VIEWS:
+    from . import async_views
+    home_view, charts_page = async_views.home, async_views.charts
+    student_search_view, student_detail_view = async_views.student_search, async_views.student_detail
+    parent_search_view, parent_detail_view = async_views.parent_search, async_views.parent_detail
+else:
+    home_view, charts_page = HomePageView.as_view(), charts_view
+    student_search_view, student_detail_view = StudentSearchView.as_view(), StudentDetailView.as_view()
+    parent_search_view, parent_detail_view = ParentSearchView.as_view(), ParentDetailView.as_view()
 
 urlpatterns = [
-    path("", HomePageView.as_view(), name="home"),
-    path('search/', StudentSearchView.as_view(), name='student_search'),
-    path('students/<int:pk>/', StudentDetailView.as_view(), name='student_detail'),
-    path('parent_search/', ParentSearchView.as_view(), name='parent_search'),
-    path('parent/<int:pk>/', ParentDetailView.as_view(), name='parent_detail'),
+    path("", home_view, name="home"),
+    path('search/', student_search_view, name='student_search'),
+    path('students/<int:pk>/', student_detail_view, name='student_detail'),
+    path('parent_search/', parent_search_view, name='parent_search'),
+    path('parent/<int:pk>/', parent_detail_view, name='parent_detail'),
     path('student/<int:pk>/update/', StudentUpdateView.as_view(), name='student_update'),
     path('parent/<int:pk>/update/', ParentUpdateView.as_view(), name='parent_update'),
     path('student/<int:pk>/add_tutoring_service/', add_tutoring_service, name='add_tutoring_service'),
@@ -18,7 +30,10 @@ urlpatterns = [
     path("login/", auth_views.LoginView.as_view(template_name="project/login.html"), name="login"),
     path("logout/", auth_views.LogoutView.as_view(), name="logout"),
     path('intake/', IntakeView.as_view(), name='intake'),
-    path('charts/', charts_view, name='charts'),
+    path('charts/', charts_page, name='charts'),
+    path('charts/dashboard/', chart_dashboard, name='chart_dashboard'),
+    path('api/charts/<str:chart_type>/', chart_data_api, name='chart_data_api'),
+    path('export/<str:export_name>.<str:export_format>', export_view, name='export'),
     path('delete_service/<int:pk>/', DeleteServiceView.as_view(), name='delete_service'),
     path('delete_adv_service/<int:pk>/', DeleteAdvocacyServiceView.as_view(), name='delete_adv_service'),
     path(
@@ -3,24 +3,32 @@
 # Description: Views for final project (so a user can view things)
 
 from django.shortcuts import render
+from django.core.cache import cache
 from django.shortcuts import redirect, get_object_or_404
 from django.views.decorators.csrf import csrf_protect
-from django.db.models import Case, When, Value, CharField
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from django.views import View
 from django.views.generic import ListView, DetailView, TemplateView, UpdateView, DeleteView
-from django.db.models import Count, Q, Sum, F, FloatField, IntegerField
-from .models import Student, Parent, TutoringService, AdvocacyService
-from datetime import timedelta, date, datetime
+from django.db.models import Count, Q, Sum
+from .models import Student, Parent, TutoringService, AdvocacyService, DailyServiceRollup
+from datetime import timedelta, date
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
 from django.utils.timezone import now
+from django.utils.dateparse import parse_date
+from .search import filter_parents, filter_students
+from .pagination import KeysetPaginationMixin
+from .caching import CHART_BROWSER_MAX_AGE, CHART_CACHE_TIMEOUT, cache_is_shared, chart_cache_key, data_version, home_cache_key
+from .charts import CHART_TYPES, chart_data, dashboard_data
+from .served import served_total
+from .exports import EXPORTS, EXPORT_FORMATS, export_chunks, parquet_available
+from .staticfiles import plotly_js_path
 from .forms import ParentSearchForm, StudentUpdateForm, StudentSearchForm, ParentUpdateForm, StudentForm, ParentForm, ChartsFilterForm
-import plotly.express as px
-from collections import Counter, defaultdict
-import re
-from django.db.models.functions import ExtractYear, ExtractMonth, ExtractDay
-import pandas as pd
 
 # Create your views here.
 
@@ -48,10 +56,74 @@ GRADE_LABELS = {
 
 def families_served_count(last_n_days=30):
     start_date = timezone.now().date() - timedelta(days=last_n_days)
-    return Parent.objects.filter(
-        Q(children__tutoring_sessions__date_of_contact__gte=start_date) |
-        Q(children__advocacy_sessions__date_of_contact__gte=start_date)
-    ).distinct().count()
+    return served_total(start_date)['families']
+
+def home_stats(today):
+    """
+    The home page statistics, as plain lists and numbers so they can be cached.
+
+    The served and hours windows are relative to today.
+    """
+    stats = {}
+
+    # Statistics: Number of students grouped by various fields
+    stats["students_by_town"] = list(
+        Student.objects.values("town_village")
+        .annotate(count=Count("id"))
+        .order_by("-count")
+    )
+    stats["students_by_country"] = list(
+        Student.objects.values("country_of_origin")
+        .annotate(count=Count("id"))
+        .order_by("-count")
+    )
+
+    grade_counts = (
+        Student.objects.values("current_grade")
+        .annotate(count=Count("id"))
+        .order_by("current_grade")
+    )
+
+    # Map internal int grades to readable labels
+    stats["students_by_grade"] = [
+        {
+            "grade": GRADE_LABELS.get(entry["current_grade"], str(entry["current_grade"])),
+            "count": entry["count"],
+        }
+        for entry in grade_counts
+    ]
+
+    stats["parents_by_town"] = list(Parent.objects.values("town_village").annotate(count=Count("id")))
+    stats["parents_by_country"] = list(
+        Parent.objects.values("country_of_origin")
+        .annotate(count=Count("id"))
+        .order_by("-count")
+    )
+
+    ## STUFF FOR TIME FILTERING
+    thirty_days_ago = today - timedelta(days=30)
+    six_months_ago = today - timedelta(days=6 * 30)  # Approx. 6 months
+    one_year_ago = today - timedelta(days=365)
+
+    # Students/families served are unions of the per-day served sets;
+    # service hours are summed from the daily rollup table
+    for window, start_date in [
+        ("last_thirty_days", thirty_days_ago), ("last_six_months", six_months_ago), ("last_year", one_year_ago),
+    ]:
+        served = served_total(start_date)
+        stats[f"students_in_{window}"] = served["students"]
+        stats[f"families_in_{window}"] = served["families"]
+
+    hours = DailyServiceRollup.objects.filter(date__gte=one_year_ago).aggregate(
+        tutoring_hours=Sum("hours", filter=Q(service_type=DailyServiceRollup.TUTORING)),
+        advocacy_hours=Sum("hours", filter=Q(service_type=DailyServiceRollup.ADVOCACY)),
+    )
+
+    # New statistic: Total service hours (last 12 months)
+    stats["tutoring_hours"] = hours["tutoring_hours"] or 0
+    stats["advocacy_hours"] = hours["advocacy_hours"] or 0
+
+    return stats
 
 class HomePageView(LoginRequiredMixin, TemplateView):
     template_name = "project/home.html"
@@ -60,135 +132,28 @@ class HomePageView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         today = now().date()
 
-        # Statistics: Number of students grouped by various fields
-        context["students_by_town"] = (
-            Student.objects.values("town_village")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
-        context["students_by_country"] = (
-            Student.objects.values("country_of_origin")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
-
-        grade_counts = (
-            Student.objects.values("current_grade")
-            .annotate(count=Count("id"))
-            .order_by("current_grade")
-        )
-
-        # Map internal int grades to readable labels
-        context["students_by_grade"] = [
-            {
-                "grade": GRADE_LABELS.get(entry["current_grade"], str(entry["current_grade"])),
-                "count": entry["count"],
-            }
-            for entry in grade_counts
-        ]
-
-        context["parents_by_town"] = Parent.objects.values("town_village").annotate(count=Count("id"))
-        context["parents_by_country"] = (
-            Parent.objects.values("country_of_origin")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
-
-        ## STUFF FOR TIME FILTERING
-        thirty_days_ago = today - timedelta(days=30)
-        six_months_ago = today - timedelta(days=6 * 30)  # Approx. 6 months
-        one_year_ago = today - timedelta(days=365)
-
-        # Students who received any service in the time range
-        context["students_in_last_thirty_days"] = Student.objects.filter(
-            Q(tutoring_sessions__date_of_contact__gte=thirty_days_ago)
-            | Q(advocacy_sessions__date_of_contact__gte=thirty_days_ago)
-        ).distinct().count()
-
-        context["students_in_last_six_months"] = Student.objects.filter(
-            Q(tutoring_sessions__date_of_contact__gte=six_months_ago)
-            | Q(advocacy_sessions__date_of_contact__gte=six_months_ago)
-        ).distinct().count()
-
-        context["students_in_last_year"] = Student.objects.filter(
-            Q(tutoring_sessions__date_of_contact__gte=one_year_ago)
-            | Q(advocacy_sessions__date_of_contact__gte=one_year_ago)
-        ).distinct().count()
-
-        # Families served (NEW) — uses the helper to ensure a parent is counted
-        context["families_in_last_thirty_days"] = families_served_count(30)
-        context["families_in_last_six_months"] = families_served_count(6 * 30)
-        context["families_in_last_year"] = families_served_count(365)
-
-        # New statistic: Total service hours (last 12 months)
-        tutoring_data = TutoringService.objects
-        advocacy_data = AdvocacyService.objects
-        tutoring_data = tutoring_data.filter(date_of_contact__gte=one_year_ago)
-        advocacy_data = advocacy_data.filter(date_of_contact__gte=one_year_ago)
-        tutoring_hours = tutoring_data.aggregate(total_hours=Sum("length_of_session"))["total_hours"] or 0
-        advocacy_hours = advocacy_data.aggregate(total_hours=Sum("length_of_contact"))["total_hours"] or 0
-        context["tutoring_hours"] = tutoring_hours
-        context["advocacy_hours"] = advocacy_hours
-
+        if not cache_is_shared():
+            context.update(home_stats(today))
+            return context
+
+        # Shared by every visit on the same day until the data changes (see warm_caches)
+        key = home_cache_key(today)
+        stats = cache.get(key)
+        if stats is None:
+            stats = home_stats(today)
+            cache.set(key, stats, CHART_CACHE_TIMEOUT)
+        context.update(stats)
         return context
 
-class StudentSearchView(LoginRequiredMixin, ListView):
+class StudentSearchView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Student
     template_name = "project/student_search.html"
     context_object_name = "students"
     paginate_by = 50
 
     def get_queryset(self):
-        queryset = Student.objects.all()
-
-        # Get search and filter parameters from GET request
-        search_name = self.request.GET.get("search_name", "")
-        town_filter = self.request.GET.get("town_village", "")
-        country_filter = self.request.GET.get("country_of_origin", "")
-        grade_filter = self.request.GET.get("current_grade", "")
-        #district_filter = self.request.GET.get("school_district", "")
-        time_period = self.request.GET.get("time_period", "")
-
-        # Apply search by name (case-insensitive)
-        if search_name:
-            name_parts = search_name.split()  # Split input into parts
-            if len(name_parts) == 1:
-                queryset = queryset.filter(
-                Q(first_name__icontains=search_name) | Q(last_name__icontains=search_name)
-            )
-            elif len(name_parts) > 1:
-                queryset = queryset.filter(
-                Q(first_name__icontains=name_parts[0]) & Q(last_name__icontains=" ".join(name_parts[1:]))
-        )
-        
-        # Apply filters for town, country, grade, and school district
-        if town_filter:
-            queryset = queryset.filter(town_village=town_filter)
-        if country_filter:
-            queryset = queryset.filter(country_of_origin=country_filter)
-        if grade_filter:
-            queryset = queryset.filter(current_grade=grade_filter)
-
-        # Time period filter
-        if time_period:
-            today = now().date()
-            if time_period == '2_weeks':
-                cutoff_date = today - timedelta(weeks=2)
-            elif time_period == '6_months':
-                cutoff_date = today - timedelta(weeks=26)
-            elif time_period == '1_year':
-                cutoff_date = today - timedelta(weeks=52)
-            else:
-                cutoff_date = None
-            
-            if cutoff_date:
-                queryset = queryset.filter(
-                    Q(tutoring_sessions__date_of_contact__gte=cutoff_date) |
-                    Q(advocacy_sessions__date_of_contact__gte=cutoff_date)
-                ).distinct()
-    
-
-        return queryset
+        # Name search plus the town, country, grade and time period filters (see search.py)
+        return filter_students(self.request.GET)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -220,42 +185,15 @@ class StudentDetailView(LoginRequiredMixin, DetailView):
 
         return context
 
-class ParentSearchView(LoginRequiredMixin, ListView):
+class ParentSearchView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Parent
     template_name = "project/parent_search.html"
     context_object_name = "parents"
     paginate_by = 10 
 
     def get_queryset(self):
-        queryset = Parent.objects.all()
-
-        # Get search and filter parameters from GET request
-        search_name = self.request.GET.get("search_name", "")
-        town_filter = self.request.GET.get("town_village", "")
-        country_filter = self.request.GET.get("country_of_origin", "")
-
-        # Apply search by name (case-insensitive)
-        if search_name:
-            name_parts = search_name.split()  # Splitting input into parts
-            if len(name_parts) == 1:
-                queryset = queryset.filter(
-                Q(first_name__icontains=search_name) | Q(last_name__icontains=search_name)
-            )
-            elif len(name_parts) > 1:
-                print("hit it")
-                queryset = queryset.filter(
-                Q(first_name__icontains=name_parts[0]) & Q(last_name__icontains=" ".join(name_parts[1:]))
-        )
-
-        # Apply filter for town/village
-        if town_filter:
-            queryset = queryset.filter(town_village=town_filter)
-
-        #Apply filter for country of origin
-        if country_filter:
-            queryset = queryset.filter(country_of_origin=country_filter)
-
-        return queryset
+        # Name search plus the town and country filters (see search.py)
+        return filter_parents(self.request.GET)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -374,308 +312,113 @@ def add_advocacy_service(request, pk):
         )
     return redirect('student_detail', pk=pk)
 
+def _date_param(request, name):
+    """A YYYY-MM-DD query parameter as a date, or None when missing or malformed."""
+    try:
+        return parse_date(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+def _chart_filters(request):
+    """(towns, levels, time range, start date, end date) from a charts page / chart API query string."""
+    return (
+        request.GET.getlist('town_village'),
+        request.GET.getlist('school_level'),
+        request.GET.get('time_range', 'all'),
+        _date_param(request, 'start_date'),
+        _date_param(request, 'end_date'),
+    )
+
+def _chart_etag(request, chart_type):
+    towns, levels, time_range, start_date, end_date = _chart_filters(request)
+    return chart_cache_key(chart_type, towns, levels, time_range, date.today(), start_date, end_date)
+
+@login_required
+@condition(etag_func=_chart_etag)
+def chart_data_api(request, chart_type):
+    """JSON series for one chart, filtered the same way as the charts page."""
+    if chart_type not in CHART_TYPES:
+        return JsonResponse({'error': f"Unknown chart type: {chart_type}"}, status=404)
+
+    towns, levels, time_range, start_date, end_date = _chart_filters(request)
+    # Identical filter sets on the same day share one result until the data changes
+    key = chart_cache_key(chart_type, towns, levels, time_range, date.today(), start_date, end_date)
+    payload = cache.get(key)
+    if payload is None:
+        payload = chart_data(chart_type, towns, levels, time_range, date.today(), start_date, end_date)
+        cache.set(key, payload, CHART_CACHE_TIMEOUT)
+
+    response = JsonResponse(payload)
+    # The browser may reuse a result for this exact query string; the ETag covers the data version
+    patch_cache_control(response, private=True, max_age=CHART_BROWSER_MAX_AGE)
+    return response
+
 def charts_view(request):
     form = ChartsFilterForm(request.GET or None)
-    town_filter = request.GET.getlist('town_village')
-    level_filter = request.GET.getlist('school_level')
-    time_filter = request.GET.get('time_range', 'all')
     selected_chart = request.GET.get('chart_type', 'service_by_town')
+    if selected_chart not in CHART_TYPES:
+        selected_chart = 'service_by_town'
 
+    # The chart itself is drawn in the browser from the chart data API
+    context = {
+        'form': form,
+        'selected_chart': selected_chart,
+        'chart_types': CHART_TYPES,
+        'chart_data_url': reverse('chart_data_api', args=[selected_chart]) + '?' + request.GET.urlencode(),
+        'dashboard_url': reverse('chart_dashboard') + '?' + request.GET.urlencode(),
+        'plotly_js': plotly_js_path(),
+    }
+    return render(request, 'project/charts.html', context)
 
-    # Determine the time range
+@login_required
+def chart_dashboard(request):
+    """Every chart for one filter set, computed in this one request."""
+    form = ChartsFilterForm(request.GET or None)
+    towns, levels, time_range, start_date, end_date = _chart_filters(request)
     today = date.today()
-    if time_filter == '30days':
-        start_date = today - timedelta(days=30)
-        time_title = " - Over the Last 30 Days"
-    elif time_filter == '6months':
-        start_date = today - timedelta(days=6*30)
-        time_title = " - Over the Last 6 Months"
-    elif time_filter == '1year':
-        start_date = today - timedelta(days=365)
-        time_title = " - Over the Last 1 year"
-    else:
-        start_date = datetime(1970, 1, 1)
-        time_title = ""
-
-    # Annotate school levels dynamically
-    students = Student.objects.annotate(
-        school_level=Case(
-            When(current_grade__gte=9, then=Value('High School')),
-            When(current_grade__lt=9, current_grade__gte=4, then=Value('Middle School')),
-            When(current_grade__lt=4, then=Value('Elementary')),
-            default=Value('Unknown'),
-            output_field=CharField()
-        )
-    )
-
-    # Apply filters
-    if town_filter:
-        students = students.filter(town_village__in=town_filter)
-    if level_filter:
-        students = students.filter(school_level__in=level_filter)
-
-    # Filter services by time range
-    tutoring_sessions = students.prefetch_related('tutoring_sessions')
-    advocacy_sessions = students.prefetch_related('advocacy_sessions')
-    # For Tutoring/Advocacy Service Objects
-    tutoring_data = TutoringService.objects.filter(student__in=students)
-    advocacy_data = AdvocacyService.objects.filter(student__in=students)
-    #Apply time filter to service data
-    if start_date:
-        tutoring_sessions = tutoring_sessions.filter(tutoring_sessions__date_of_contact__gte=start_date)
-        advocacy_sessions = advocacy_sessions.filter(advocacy_sessions__date_of_contact__gte=start_date)
-        tutoring_data = tutoring_data.filter(date_of_contact__gte=start_date)
-        advocacy_data = advocacy_data.filter(date_of_contact__gte=start_date)
-
-
-    # 1. Service Hours by Town/Village (Bar Graph)
-    if selected_chart == 'service_by_town':
-        tutoring_by_town = (
-        tutoring_data
-        .values('student__town_village')
-        .annotate(hours=Sum('length_of_session'))
-        )
-
-        advocacy_by_town = (
-        advocacy_data
-        .values('student__town_village')
-        .annotate(hours=Sum('length_of_contact'))
-        )
-
-        service_totals = defaultdict(float)
-        for row in tutoring_by_town:
-            town = row['student__town_village'] or 'Unknown'
-            service_totals[town] += float(row['hours'] or 0)
-
-        for row in advocacy_by_town:
-            town = row['student__town_village'] or 'Unknown'
-            service_totals[town] += float(row['hours'] or 0)
-        
-        town_villages = sorted(service_totals.keys())
-        service_hours = [service_totals[town] for town in town_villages]
-
-        fig1 = px.bar(
-            x=town_villages,
-            y=service_hours,
-            labels={'x': 'District', 'y': 'Service Hours'},
-            title='Service Hours by School District' + time_title
-        )
-        chart_html = fig1.to_html(full_html=False)
-
-    # 2. Service Hours by School Level (Pie Chart)
-    elif selected_chart == 'service_by_level':
-        level_data = students.annotate(
-            total_service_hours=Sum(
-                Case(
-                    When(tutoring_sessions__date_of_contact__gte=start_date, then=F('tutoring_sessions__length_of_session')),
-                    When(advocacy_sessions__date_of_contact__gte=start_date, then=F('advocacy_sessions__length_of_contact')),
-                    default=0,
-                    output_field=FloatField(),
-                )
-            )
-        ).values('school_level', 'total_service_hours')
-
-        levels = [entry['school_level'] for entry in level_data]
-        level_hours = [entry['total_service_hours'] for entry in level_data]
-
-        fig2 = px.pie(
-            names=levels,
-            values=level_hours,
-            title='Service Hours by School Level' + time_title
-        )
-        chart_html = fig2.to_html(full_html=False)
-
-    # 3. Clients by Country of Origin (Pie Chart)
-    elif selected_chart == 'clients_by_country':
-        client_data = students.filter(
-            Q(tutoring_sessions__date_of_contact__gte=start_date) | Q(advocacy_sessions__date_of_contact__gte=start_date)
-        ).distinct().values('country_of_origin').annotate(count=Count('id', distinct=True))
-
-        client_countries = [entry['country_of_origin'] for entry in client_data]
-        client_counts = [entry['count'] for entry in client_data]
-
-        fig3 = px.pie(
-            names=client_countries,
-            values=client_counts,
-            title='Clients by Country of Origin' + time_title
-        )
-        chart_html = fig3.to_html(full_html=False)
-
-    # 4. Parents by Country of Origin (Pie Chart)
-    elif selected_chart == 'parents_by_country':
-        parent_ids = students.filter(
-            Q(tutoring_sessions__date_of_contact__gte=start_date) | Q(advocacy_sessions__date_of_contact__gte=start_date)
-        ).distinct().values_list('parent_id', flat=True)
-
-        parent_data = Parent.objects.filter(id__in=parent_ids).values('country_of_origin').annotate(count=Count('id'))
 
-        parent_countries = [entry['country_of_origin'] for entry in parent_data]
-        parent_counts = [entry['count'] for entry in parent_data]
-
-        fig4 = px.pie(
-            names=parent_countries,
-            values=parent_counts,
-            title='Parents by Country of Origin' + time_title
-        )
-        chart_html = fig4.to_html(full_html=False)
-
-    # 5. Number of tutoring sessions by SUBJECT
-    elif selected_chart == 'sessions_by_subject':
-        raw_subjects = tutoring_data.values_list('session_focus', flat=True)
-
-        subject_counter = Counter()
-        for entry in raw_subjects:
-            if entry:
-                subjects = re.split(r'[/,]\s*', entry)
-                cleaned = [s.strip().capitalize() for s in subjects if s.strip()]
-                subject_counter.update(cleaned)
-
-        session_subjects = list(subject_counter.keys())
-        subject_counts = list(subject_counter.values())
-
-        fig5 = px.bar(
-            x=session_subjects,
-            y=subject_counts,
-            labels={'x': 'Subject', 'y': 'Number of Tutoring Sessions'},
-            title='Number of Tutoring Sessions by Subject' + time_title
-        )
-        chart_html = fig5.to_html(full_html=False)
-
-    # 6. Number of tutoring sessions by school district
-    elif selected_chart == 'tutoring_sessions_by_district':
-        tutoring_data = students.annotate(
-        tutoring_session_count=Count(
-            'tutoring_sessions',
-            filter=Q(tutoring_sessions__date_of_contact__gte=start_date)
-        )
-        ).values('town_village', 'tutoring_session_count').order_by('town_village')
-       
-        town_villages = [entry['town_village'] for entry in tutoring_data]
-        tutoring_session_count = [entry['tutoring_session_count'] for entry in tutoring_data]
-
-        fig6 = px.bar(
-            x=town_villages,
-            y=tutoring_session_count,
-            labels={'x': 'District', 'y': 'Tutoring Sessions'},
-            title='Tutoring Sessions by School District' + time_title
-        )
-        chart_html = fig6.to_html(full_html=False)
-
-    # 7. Number of advocacy sessions by school district
-    elif selected_chart == 'advocacy_sessions_by_district':
-        advocacy_data = students.annotate(
-        advocacy_session_count=Count(
-            'advocacy_sessions',
-            filter=Q(advocacy_sessions__date_of_contact__gte=start_date)
-        )
-        ).values('town_village', 'advocacy_session_count').order_by('town_village')
-       
-        town_villages = [entry['town_village'] for entry in advocacy_data]
-        advocacy_session_count = [entry['advocacy_session_count'] for entry in advocacy_data]
-
-        fig7 = px.bar(
-            x=town_villages,
-            y=advocacy_session_count,
-            labels={'x': 'District', 'y': 'Advocacy Sessions'},
-            title='Advocacy Sessions by School District' + time_title
-        )
-        chart_html = fig7.to_html(full_html=False)
-
-
-    # 8. Number of students by interval of number of hours served
-    elif selected_chart == 'students_by_service_interval':
-        students_with_hours = Student.objects.annotate(
-        total_hours=Sum(
-            Case(
-                When(tutoring_sessions__date_of_contact__gte=start_date, then=F('tutoring_sessions__length_of_session')),
-                When(advocacy_sessions__date_of_contact__gte=start_date, then=F('advocacy_sessions__length_of_contact')),
-                default=0,
-                output_field=FloatField()
-            )
-        )
-        )
-        binned_data = students_with_hours.aggregate(
-        under_5=Count('id', filter=Q(total_hours__lt=5)),
-        between_5_10=Count('id', filter=Q(total_hours__gte=5, total_hours__lt=10)),
-        between_10_20=Count('id', filter=Q(total_hours__gte=10, total_hours__lt=20)),
-        over_20=Count('id', filter=Q(total_hours__gte=20)))
-
-        chart_data = [
-            {'range': '0–5 hrs', 'count': binned_data['under_5']},
-            {'range': '5–10 hrs', 'count': binned_data['between_5_10']},
-            {'range': '10–20 hrs', 'count': binned_data['between_10_20']},
-            {'range': '20+ hrs', 'count': binned_data['over_20']},
-        ]
-
-        # Create bar chart
-        fig8 = px.bar(
-            chart_data,
-            x='range',
-            y='count',
-            title='Number of Students by Total Hours Served' + time_title,
-            labels={'range': 'Hours Served', 'count': 'Number of Students'}
-        )
-
-        chart_html = fig8.to_html(full_html=False)
-    
-    # 9. Tutoring hours by student grade (at service time)
-    elif selected_chart == 'tutoring_hours_by_grade':
-        before_july_today = 1 if (today.month < 7 or (today.month == 7 and today.day < 1)) else 0
-        tutoring_data_with_grades = tutoring_data.annotate(
-        # Full years difference
-        years_diff=ExtractYear(Value(today)) - ExtractYear('date_of_contact'),
-
-        # 1 if the session happened before July 1 of its year, else 0
-        before_july_session=Case(
-            When(
-                Q(date_of_contact__month__lt=7) |
-                Q(date_of_contact__month=7, date_of_contact__day__lt=1),
-                then=Value(1)
-            ),
-            default=Value(0),
-            output_field=IntegerField()
-        ),
-
-        # Now count the number of July 1 boundaries crossed
-        num_july_firsts=(
-            F('years_diff') +
-            F('before_july_session') -
-            Value(before_july_today)
-        ),
-
-        # And finally compute the grade at service time
-        grade_at_service_time=F('student__current_grade') - F('num_july_firsts')
-        )
-        # Aggregate
-        grade_data = tutoring_data_with_grades.values('grade_at_service_time').annotate(
-            total_hours=Sum('length_of_session')
-        ).order_by('grade_at_service_time')
-
-        grades = [entry['grade_at_service_time'] for entry in grade_data]
-        grade_hours = [entry['total_hours'] for entry in grade_data]
-
-        df = pd.DataFrame({
-            'Grade': grades,
-            'Total Hours': grade_hours
-        })
-        df['Grade'] = pd.to_numeric(df['Grade'], errors='coerce')
-        df = df.sort_values(by='Grade')
-        print(df)
-
-        fig9 = px.bar(
-            df,
-            x='Grade',
-            y='Total Hours',
-            orientation = 'v',
-            labels={'Grade': 'Student Grade', 'Total Hours': 'Total Tutoring Hours'},
-            title='Tutoring Hours By Grade' + time_title
-        )
-        chart_html = fig9.to_html(full_html=False)
+    # Charts already cached for these filters are reused; the rest are computed concurrently
+    version = data_version()
+    keys = {
+        chart_type: chart_cache_key(chart_type, towns, levels, time_range, today, start_date, end_date, version)
+        for chart_type in CHART_TYPES
+    }
+    cached = cache.get_many(keys.values())
+    payloads = {chart_type: cached[key] for chart_type, key in keys.items() if key in cached}
+    missing = [chart_type for chart_type in CHART_TYPES if chart_type not in payloads]
+    if missing:
+        computed = dashboard_data(missing, towns, levels, time_range, today, start_date, end_date)
+        cache.set_many({keys[chart_type]: payload for chart_type, payload in computed.items()}, CHART_CACHE_TIMEOUT)
+        payloads.update(computed)
 
-    # Convert plots to HTML
     context = {
         'form': form,
-        'selected_chart': selected_chart,
-        'chart_html': chart_html,
+        'charts': [payloads[chart_type] for chart_type in CHART_TYPES],
+        'plotly_js': plotly_js_path(),
     }
-    return render(request, 'project/charts.html', context)
\ No newline at end of file
+    return render(request, 'project/chart_dashboard.html', context)
+
+
+@staff_member_required
+def export_view(request, export_name, export_format):
+    """
+    Stream students, parents, tutoring or advocacy sessions as CSV or Parquet.
+
+    Takes the same GET filters as the student search page; the export covers
+    the matching students (or their parents / sessions). Rows are read with
+    a chunked iterator and written out as they arrive, so memory use doesn't
+    grow with the table.
+    """
+    export = EXPORTS.get(export_name)
+    if export is None or export_format not in EXPORT_FORMATS:
+        raise Http404("Unknown export")
+    if export_format == 'parquet' and not parquet_available():
+        return HttpResponse("Parquet export needs pyarrow installed on the server.", status=501, content_type='text/plain')
+
+    students = filter_students(request.GET)
+    response = StreamingHttpResponse(
+        export_chunks(export, students, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_name}.{export_format}"'
+    return response